@@ -0,0 +1,232 @@
+# analysis_worker.py
+# Runs the expensive audio analysis beside the pygame loop
+
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from settings import ANALYSIS_RATE, SILENCE_DB
+from frame_profiler import profiled
+
+# Everything a scene needs from one analysis pass. A new snapshot is built for
+# every pass and swapped in with a single assignment, so readers always see a
+# complete, consistent result without taking a lock.
+AnalysisSnapshot = namedtuple("AnalysisSnapshot", [
+    "seq",            # recording.seq of the newest chunk that was analysed
+    "analysisStart",  # time.perf_counter() when the pass started
+    "time",           # time.perf_counter() when the snapshot was published
+    "pitch",          # pitch in Hz from the analyzer's pitchMode, nan when unvoiced
+    "voicedProb",     # voicing probability of that pitch
+    "strongestNote",  # display string, e.g. "A4 (Prob: 0.93)"
+    "noteIndex",      # semitones above minNote of the last voiced pitch
+    "noteNames",      # note name of every spectrum bin
+    "noteFreqs",      # centre frequency of every spectrum bin
+    "spectrum",       # A-weighted dB magnitude of every spectrum bin
+    # one entry (row) per input channel; the fields above are channel 0's
+    "pitches",
+    "voicedProbs",
+    "noteIndices",
+    "spectra",
+    "levels",         # RMS dBFS of the newest chunk
+    "onsets",         # onsets heard so far (see EnergyGate)
+])
+
+
+def emptySnapshot(analyzer):
+    freqs = analyzer.note_freqs
+    channels = getattr(analyzer, "channels", 1)
+    now = time.perf_counter()
+    spectra = np.full((channels, len(freqs)), SILENCE_DB)
+    return AnalysisSnapshot(-1, now, now, float("nan"), 0.0,
+                            "No strong note", 0, analyzer.note_names, freqs, spectra[0],
+                            np.full(channels, np.nan), np.zeros(channels),
+                            np.zeros(channels, dtype=int), spectra,
+                            np.full(channels, SILENCE_DB), np.zeros(channels, dtype=np.int64))
+
+
+class AnalysisWorker:
+    """
+    Background thread that analyses the analyzer's recording whenever a
+    chunk gets past its energy gate, at most `rate` times a second, and
+    sleeps through silence. Scenes read `worker.snapshot`, which is always
+    the latest finished result, or the note events built from it.
+
+    noteEvents: optional NoteEventTracker, fed every published snapshot.
+    recorder: optional SessionRecorder, logs every published snapshot.
+    profiler: optional FrameProfiler, times every pass.
+    """
+    def __init__(self, analyzer, rate=ANALYSIS_RATE):
+        self.analyzer = analyzer
+        self.rate = rate
+        self.snapshot = emptySnapshot(analyzer)
+        self.noteEvents = None
+        self.recorder = None
+        self.profiler = None
+
+        # Profiling counters
+        self.analyses = 0   # passes that published a snapshot
+        self.dropped = 0    # ticks missed because a pass overran its period
+        self.stale = 0      # wake-ups with no new audio to analyse
+        self.torn = 0       # passes redone because their window was overwritten
+        self.gated = 0      # passes that skipped pitch estimation in silence
+        self.lastDuration = 0.0
+        self.busyTime = 0.0  # seconds spent analysing, for the QualityScheduler
+        self._window = None  # copy of the window for passes that outlast the ring's slack
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="AnalysisWorker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.analyzer.chunkReady.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def setRate(self, rate):
+        self.rate = rate
+
+    def _run(self):
+        analyzer = self.analyzer
+        nextTick = time.perf_counter()
+        pending = False
+        while not self._stop.is_set():
+            # 1. Sleep until the gate lets a chunk through; in silence nothing
+            #    wakes this thread. A chunk that came too soon after the last
+            #    pass waits out the rest of the period.
+            timeout = max(nextTick - time.perf_counter(), 0.0) if pending else None
+            if analyzer.chunkReady.wait(timeout):
+                analyzer.chunkReady.clear()
+                pending = True
+            if self._stop.is_set() or not pending:
+                continue
+
+            # 2. At most `rate` passes a second, except while a note is
+            #    starting: those are analysed as soon as the audio arrives
+            now = time.perf_counter()
+            if now < nextTick and not self._attacking():
+                continue
+            pending = False
+            if analyzer.recording.seq == self.snapshot.seq:
+                self.stale += 1
+                continue
+
+            period = 1.0 / self.rate
+            nextTick = now + period
+            self.analyzeOnce()
+            # A pass that ran long swallows the ticks it overlapped
+            self.dropped += int(self.lastDuration / period)
+
+    def _attacking(self):
+        """A new onset, or sound past the gate that isn't a recognised note yet."""
+        gate = self.analyzer.gate
+        return bool((gate.onsets != self.snapshot.onsets).any()
+                    or (gate.open & np.isnan(self.snapshot.pitches)).any())
+
+    @profiled("analysis")
+    def analyzeOnce(self):
+        """
+        Runs one full analysis pass and publishes the result. A zero-copy
+        pass whose window was overwritten while it ran is thrown away and run
+        again on a copy of the newest window, so a torn result is never
+        published.
+        """
+        start = time.perf_counter()
+        analyzer = self.analyzer
+        with analyzer.lock:
+            # Only long enough to pick up the current range: adjustRange swaps
+            # in a whole new config and never modifies one in place, so the
+            # pass below can run on it while the main thread changes range
+            config = analyzer.config
+        # read once so a mode change can't land halfway through the pass
+        mode = analyzer.activePitchMode
+        # pyin takes several times longer than the ring's slack lasts, and the
+        # streaming tracker can't be stepped twice over the same chunks by a
+        # retry, so both analyse a copy; piptrack uses the zero-copy view
+        copyWindow = mode != "piptrack"
+        while True:
+            # one window shared by every stage of this pass
+            # (samples,) or (channels, samples); every stage takes either
+            seq, wav = analyzer.recording.read()
+            if copyWindow:
+                wav = self._copyWindow(wav)
+            # The view is only safe while fewer than recording.slackChunks
+            # more chunks arrive; a copy only has to outlast the copying
+            if copyWindow and not analyzer.recording.isIntact(seq):
+                self.torn += 1
+                continue
+            result = self._analyze(wav, config, mode)
+            if copyWindow or analyzer.recording.isIntact(seq):
+                break
+            self.torn += 1
+            copyWindow = True
+        pitches, probs, noteIndices, spectra, levels, onsets, gated = result
+        self.gated += gated
+        pitch, prob = float(pitches[0]), float(probs[0])
+        strongestNote = analyzer.describePitch(pitch, prob)
+
+        end = time.perf_counter()
+        self.analyses += 1
+        self.lastDuration = end - start
+        self.busyTime += self.lastDuration
+        return self.publish(AnalysisSnapshot(seq, start, end, pitch, prob, strongestNote,
+                                             int(noteIndices[0]), config.note_names, config.note_freqs,
+                                             spectra[0], pitches, probs, noteIndices, spectra,
+                                             levels, onsets))
+
+    def _copyWindow(self, wav):
+        # one buffer reused by every copied pass; snapshots never keep it
+        if self._window is None or self._window.shape != wav.shape or self._window.dtype != wav.dtype:
+            self._window = np.empty_like(wav)
+        np.copyto(self._window, wav)
+        return self._window
+
+    def _analyze(self, wav, config, mode):
+        analyzer = self.analyzer
+        # the callback swaps these arrays whole, read each once
+        gate = analyzer.gate
+        sounding, levels, onsets = gate.open, gate.levels, gate.onsets
+        if sounding.any():
+            pitches, probs = analyzer.getPitches(wav, config, mode)
+            # channels under the gate stay quiet
+            pitches = np.where(sounding, pitches, np.nan)
+            probs = np.where(sounding, probs, 0.0)
+        else:
+            pitches, probs = analyzer.skipPitches()
+        # hold the last note through unvoiced passes so the paddle stays put
+        noteIndices = np.where(np.isnan(pitches), self.snapshot.noteIndices,
+                               analyzer.pitchesToNoteIndices(pitches, config))
+        freqs = config.note_freqs
+        if analyzer.spectrumWanted:
+            spectra = np.atleast_2d(analyzer.getSpectrumMagnitudes(wav, config))
+        elif self.snapshot.spectra.shape[1] == len(freqs):
+            spectra = self.snapshot.spectra
+        else:
+            spectra = np.full((len(pitches), len(freqs)), SILENCE_DB)
+        return pitches, probs, noteIndices, spectra, levels, onsets, not sounding.any()
+
+    def publish(self, snapshot):
+        """Makes a finished pass visible to readers."""
+        self.snapshot = snapshot
+        if self.recorder is not None:
+            self.recorder.recordAnalysis(snapshot, self.analyzer)
+        if self.noteEvents is not None:
+            self.noteEvents.update(snapshot)
+        return snapshot
+
+    def getStats(self):
+        return {
+            "analyses": self.analyses,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "torn": self.torn,
+            "gated": self.gated,
+            "lastDuration": self.lastDuration,
+        }
@@ -1,35 +1,72 @@
 import numpy as np
-import sounddevice as sd
 import librosa
 import math
+import threading
+
+from settings import GATE_RANGE_DB, PITCH_MODE
+from cqt_engine import ConstantQEngine
+from energy_gate import EnergyGate
+from frame_profiler import profiled
+from ring_buffer import CircularBuffer, SAMPLE_DTYPE
+from pitch_tracker import StreamingPitchTracker
+from audio_sources import SoundDeviceSource
+from range_tables import loadRangeTables, AnalysisConfig, ConfigCache
 
 
-class CircularBuffer:
-    def __init__(self, chunkSize, numChunks):
-        self.chunkSize = chunkSize
-        self.numChunks = numChunks
-        self.buffer = np.zeros((numChunks, chunkSize))
-        self.index = 0
-        self.full = False
-    def add_chunk(self, chunk):
-        self.buffer[self.index] = chunk
-        self.index = (self.index + 1) % self.numChunks
-        if self.index == 0:
-            self.full = True
-    def getFlat(self):
-        # will be incorect until buffer is full
-        # Buffer is full; the 'oldest' chunk is at the current self.index
-        # Use np.roll to move the oldest data to the front, then flatten
-        return np.roll(self.buffer, -self.index, axis=0).flatten()
-    
 class LibrosaAudioAnalyzer:
-    def __init__(self):
+    # Selectable pitch estimators, see getPitch()
+    PITCH_MODES = ("pyin", "piptrack", "streaming")
+    # the same, cheapest first
+    PITCH_MODE_COST = ("streaming", "piptrack", "pyin")
+
+    def __init__(self, source=None, recording=None, channels=1, recorder=None, dtype=None):
+        """
+        source: an AudioSource (see audio_sources.py) to analyse. Defaults to
+        the live microphone; file replay and synthetic sources feed the exact
+        same _audio_callback path.
+        recording: the CircularBuffer to capture into, e.g. a shared-memory
+        one (see dsp_process.py). Defaults to a private 10-chunk ring.
+        channels: input channels to analyse, one instrument or player each.
+        Every channel gets its own ring lane and results, all computed in one
+        batched pass (see getPitches and getSpectrumMagnitudes).
+        recorder: optional SessionRecorder (see session_log.py), logs every
+        chunk from the first one on.
+        dtype: sample type of the ring, the CQT and the streaming tracker,
+        SAMPLE_DTYPE (see SINGLE_PRECISION) by default and the recording's
+        own when one is passed in.
+        """
         # Configuration
         self.RATE = 44100
         self.CHUNK = 1024  # Increased for better CQT resolution
         self.sensitivity = -10 
+        self.pitchMode = PITCH_MODE
+        self.channels = channels
+        # optional LatencyTracer, timestamps every captured chunk
+        self.tracer = None
+        self.recorder = recorder
+        # optional FrameProfiler, times the analysis entry points
+        self.profiler = None
+        # held while changing the range or pitch mode; the analysis worker
+        # only takes it to pick up the current config, never for a whole pass
+        self.lock = threading.RLock()
         
-        self.recording = CircularBuffer(self.CHUNK, 10)
+        if recording is None:
+            recording = CircularBuffer(self.CHUNK, 10, channels=channels,
+                                       dtype=SAMPLE_DTYPE if dtype is None else dtype)
+        self.recording = recording
+        self.dtype = recording.buffer.dtype
+        # Level gate run on every chunk; chunkReady is set when one gets past
+        # it, and is what the analysis worker sleeps on
+        self.gate = EnergyGate(channels)
+        self.chunkReady = threading.Event()
+        # the CQT spectrum is only computed while a scene shows it
+        self.spectrumWanted = False
+        # quality limits set by the QualityScheduler, see setQuality
+        self.pitchModeCap = None
+        self.windowChunks = None
+        self.spectrumStep = 1
+        # per-range note tables, kernels and trackers, see adjustRange
+        self.configCache = ConfigCache()
 
         # Define range: C2 to C7 (60 notes / 5 octaves)
         self.fmin = librosa.note_to_hz('C2')
@@ -43,38 +80,71 @@ class LibrosaAudioAnalyzer:
         self.adjustRange('C2', 'C7')
         #self.adjustRange('B4', 'C7')
 
-        self.current_audio = np.zeros(self.CHUNK)
-        self.stream = sd.InputStream(
-            channels=1, samplerate=self.RATE, 
-            blocksize=self.CHUNK, callback=self._audio_callback
-        )
-        self.stream.start()
+        if source is None:
+            source = SoundDeviceSource(self.RATE, self.CHUNK, channels=channels)
+        self.source = source
+        if recorder is not None:
+            recorder.open(self)
+        self.source.start(self._audio_callback)
 
 
+    @profiled("range")
     def adjustRange(self, minNote, maxNote):
         """
         Adjusts the frequency range of the spectrum and pitch tracking.
         Example: analyzer.adjustRange('C2', 'C6')
         """
+        with self.lock:
+            self._adjustRange(minNote, maxNote)
+
+    def _adjustRange(self, minNote, maxNote):
+        # Sweeping back and forth through ranges is a dictionary lookup; only
+        # ranges that aren't cached are built
+        key = (minNote, maxNote, self.RATE, self.CHUNK, self.dtype.str)
+        config = self.configCache.get(key, lambda: self._buildConfig(minNote, maxNote))
+
+        # the worker analyses with this object, not the attributes below
+        self.config = config
+        self.minNote = config.minNote
+        self.maxNote = config.maxNote
+        self.fmin = config.fmin
+        self.n_bins = config.n_bins
+        self.note_names = config.note_names
+        self.note_freqs = config.note_freqs
+        self.a_weighting = config.a_weighting
+        self.cqt = config.cqt
+        self.pitchTracker = config.pitchTracker
+        # a cached tracker still holds the state from when it was last used
+        self.pitchTracker.requestReset()
+
+    def _buildConfig(self, minNote, maxNote):
         # 1. Convert note names to MIDI numbers to calculate range size
-        
         midi_min = librosa.note_to_midi(minNote)
         midi_max = librosa.note_to_midi(maxNote)
         midi_max = min(midi_max, librosa.note_to_midi(self.maxNoteAllowed))
-        self.minNote = minNote
-        self.maxNote = librosa.midi_to_note(midi_max)
         # 2. Update core range parameters
-        self.fmin = librosa.note_to_hz(minNote)
-        self.n_bins = int(midi_max - midi_min) + 1  # Total semi-tones in range
-        
-        # 3. Re-compute note names for the new range
-        self.note_names = [librosa.midi_to_note(m,unicode=False) for m in range(midi_min, midi_max + 1)]
-        
-        # 4. Re-compute A-weighting for the specific frequencies in this range
-        self.note_freqs = librosa.cqt_frequencies(self.n_bins, fmin=self.fmin)
-        self.a_weighting = librosa.A_weighting(self.note_freqs)
+        fmin = librosa.note_to_hz(minNote)
+        n_bins = int(midi_max - midi_min) + 1  # Total semi-tones in range
+        windowLength = self.CHUNK * self.recording.numChunks
+
+        # 3. Note names, frequencies, A-weighting and CQT kernels for the new
+        #    range, from the on-disk cache when this range was seen before
+        tables = loadRangeTables(midi_min, midi_max, self.RATE, windowLength)
+        # in the sample type, so adding it doesn't promote the spectrum
+        tables = dict(tables, a_weighting=tables["a_weighting"].astype(self.dtype))
+
+        # 4. Constant-Q engine around the cached kernel bank
+        cqt = ConstantQEngine(self.RATE, fmin, n_bins, windowLength,
+                              kernels=tables["cqt_kernels"], dtype=self.dtype)
 
-        print(f"Adjusted range: {minNote} to {maxNote}, Total Notes: {self.n_bins} fmin ={self.note_freqs[0]} fmax={self.note_freqs[-1]}")
+        # 5. The streaming tracker's pitch bins depend on the range too
+        note_freqs = tables["note_freqs"]
+        pitchTracker = StreamingPitchTracker(self.RATE, self.CHUNK, note_freqs[0], note_freqs[-1],
+                                             channels=self.channels, dtype=self.dtype)
+
+        print(f"Adjusted range: {minNote} to {maxNote}, Total Notes: {n_bins} fmin ={note_freqs[0]} fmax={note_freqs[-1]}")
+        return AnalysisConfig(minNote, librosa.midi_to_note(midi_max), midi_min, midi_max,
+                              fmin, tables, cqt, pitchTracker)
 
 
     def getNumOctives(self):
@@ -83,27 +153,153 @@ class LibrosaAudioAnalyzer:
 
 
     def _audio_callback(self, indata, frames, time, status):
-        # sounddevice gives us a numpy array directly
-        self.recording.add_chunk(indata[:, 0])
-        self.current_audio = indata[:, 0]
+        # sounddevice gives us a numpy array directly; it reuses that memory
+        # for the next block, so only the ring buffer's copy is kept
+        if self.tracer is not None:
+            self.tracer.markCapture(self.recording.seq, frames, self.RATE, time)
+        if self.recorder is not None:
+            self.recorder.recordChunk(self.recording.seq, indata, self.sensitivity)
+        self.recording.add_chunk(indata[:, 0] if self.channels == 1 else indata[:, :self.channels])
+        if self.gate.process(indata[:, :self.channels], self.sensitivity - GATE_RANGE_DB) or self.spectrumWanted:
+            self.chunkReady.set()
 
     def getStrongestNote(self):
-        
-        f0, voiced_flag, voiced_probs = self.getNoteIndexPyin()
-        
-        # 3. Apply A-Weighting
+        pitch, prob = self.summarizePitch(*self.getNoteIndexPyin(self._firstChannel()))
+        return self.describePitch(pitch, prob)
+
+    def summarizePitch(self, f0, voiced_flag, voiced_probs):
+        """
+        Reduces pyin output to a single (pitch_hz, voiced_probability) pair.
+        Returns (nan, 0.0) when nothing in the window was voiced.
+        """
         if voiced_flag.any():
             # Find the average pitch of voiced frames, ignoring NaNs
             valid_pitches = f0[voiced_flag]
             if len(valid_pitches) > 0:
-                actual_pitch = np.median(valid_pitches)
+                return float(np.median(valid_pitches)), float(np.mean(voiced_probs[voiced_flag]))
+        return float("nan"), 0.0
 
-                
-                # 4. Convert Frequency to Note Name
-                note_name = librosa.hz_to_note(actual_pitch, unicode=False)
-                return f"{note_name} (Prob: {np.mean(voiced_probs[voiced_flag]):.2f})"
-        
-        return "No strong note"
+    def getPitch(self, wav=None):
+        """
+        Current (pitch_hz, voiced_probability) of the first channel from the
+        selected pitchMode:
+          pyin      - librosa.pyin over the whole window (accurate, ~230 ms latency)
+          piptrack  - strongest piptrack peak of the newest chunk (no voicing model)
+          streaming - StreamingPitchTracker, one estimate per new chunk (~46 ms)
+        """
+        pitches, probs = self.getPitches(wav)
+        return float(pitches[0]), float(probs[0])
+
+    @profiled("pitch")
+    def getPitches(self, wav=None, config=None, mode=None):
+        """
+        (pitches_hz, voiced_probabilities), one entry per channel. Each mode
+        runs once over all channels: librosa and the streaming tracker both
+        take a (channels, samples) batch.
+        config: the AnalysisConfig to analyse with, the current one by default.
+        mode: the pitch mode to use, activePitchMode by default.
+        """
+        if config is None:
+            config = self.config
+        if mode is None:
+            mode = self.activePitchMode
+        if mode == "streaming":
+            tracker = config.pitchTracker
+            tracker.update(self.recording)
+            return tracker.pitches, tracker.voicedProbs
+        if mode == "piptrack":
+            pitches, magnitudes, _ = self.getNoteIndex(None if wav is None else wav[..., -self.CHUNK:], config)
+            # strongest peak of each channel
+            pitches = pitches.reshape(self.channels, -1)
+            magnitudes = magnitudes.reshape(self.channels, -1)
+            index = magnitudes.argmax(axis=1)
+            rows = np.arange(self.channels)
+            voiced = magnitudes[rows, index] > 0
+            return np.where(voiced, pitches[rows, index], np.nan), voiced.astype(float)
+        if wav is None:
+            wav = self.recording.getFlat()
+        if self.windowChunks is not None:
+            # pyin's cost grows with the window; the newest chunks matter most
+            wav = wav[..., -self.windowChunks * self.CHUNK:]
+        f0, voiced_flag, voiced_probs = (np.atleast_2d(a) for a in self.getNoteIndexPyin(wav, config))
+        summaries = [self.summarizePitch(*row) for row in zip(f0, voiced_flag, voiced_probs)]
+        pitches, probs = zip(*summaries)
+        return np.array(pitches), np.array(probs)
+
+    def warmUp(self):
+        """
+        Runs the pitch estimator and the spectrum once. librosa imports and
+        JIT-compiles lazily, which takes seconds; with the energy gate the
+        first real pass would only come with the first note played.
+        """
+        with self.lock:
+            wav = self.recording.getFlat()
+            self.getPitches(wav)
+            self.getSpectrumMagnitudes(wav)
+
+    def skipPitches(self):
+        """getPitches for a window the energy gate kept shut: nothing voiced."""
+        # The streaming tracker catches up on the next sound, from the last
+        # few chunks the ring still holds, so it still sees the silence first
+        return np.full(self.channels, np.nan), np.zeros(self.channels)
+
+    def setSpectrumWanted(self, wanted):
+        self.spectrumWanted = wanted
+
+    @property
+    def activePitchMode(self):
+        """pitchMode, or the quality cap when that is cheaper."""
+        cap = self.pitchModeCap
+        if cap is not None and self.PITCH_MODE_COST.index(cap) < self.PITCH_MODE_COST.index(self.pitchMode):
+            return cap
+        return self.pitchMode
+
+    def setQuality(self, pitchModeCap=None, windowChunks=None, spectrumStep=1):
+        """
+        Cheaper analysis for a machine that can't keep up (see QualityScheduler).
+        pitchModeCap: used instead of any costlier pitchMode; None for no cap
+        windowChunks: newest chunks pyin analyses; None for the whole window
+        spectrumStep: compute every n-th spectrum bin (see ConstantQEngine.transform)
+        Plain assignments without the lock, so a long pyin pass can't stall
+        the frame that changes tier; the next pass picks them up.
+        """
+        self.pitchModeCap = pitchModeCap
+        self.windowChunks = windowChunks
+        self.spectrumStep = spectrumStep
+
+    def setPitchMode(self, mode):
+        if mode not in self.PITCH_MODES:
+            raise ValueError(f"Unknown pitch mode {mode!r}, expected one of {self.PITCH_MODES}")
+        with self.lock:
+            self.pitchMode = mode
+            self.pitchTracker.requestReset()
+
+    def cyclePitchMode(self):
+        index = self.PITCH_MODES.index(self.pitchMode)
+        self.setPitchMode(self.PITCH_MODES[(index + 1) % len(self.PITCH_MODES)])
+
+    def pitchToNoteIndex(self, pitch):
+        """Semitones between minNote and the nearest note to `pitch`."""
+        return int(round(12 * np.log2(pitch / self.fmin)))
+
+    def pitchesToNoteIndices(self, pitches, config=None):
+        """pitchToNoteIndex for an array of pitches; nan gives -1."""
+        fmin = self.fmin if config is None else config.fmin
+        with np.errstate(divide="ignore", invalid="ignore"):
+            index = np.rint(12 * np.log2(np.asarray(pitches) / fmin))
+        return np.where(np.isnan(index), -1, index).astype(int)
+
+    def _firstChannel(self):
+        # the single-channel reference paths look at the first channel only
+        wav = self.recording.getFlat()
+        return wav if self.channels == 1 else wav[0]
+
+    def describePitch(self, pitch, prob):
+        if np.isnan(pitch):
+            return "No strong note"
+        # Convert Frequency to Note Name
+        note_name = librosa.hz_to_note(pitch, unicode=False)
+        return f"{note_name} (Prob: {prob:.2f})"
 
     def update(self):
         pass  # No internal state to update; analysis is done on-the-fly
@@ -119,9 +315,37 @@ class LibrosaAudioAnalyzer:
         Returns a list of (note_name, magnitude) tuples.
         Uses Constant-Q Transform to map energy directly to musical notes.
         """
+        # Returns: [('C2', -10.5), ('C#2', -15.2), ...]
+        return zip(self.note_freqs, self.getSpectrumMagnitudes(self._firstChannel()))
+
+    @profiled("spectrum")
+    def getSpectrumMagnitudes(self, wav=None, config=None):
+        """
+        A-weighted dB magnitude for every note in the current range, shape
+        (n_bins,) or (channels, n_bins) for a multi-channel window.
+        config: the AnalysisConfig to analyse with, the current one by default.
+        """
+        if wav is None:
+            wav = self.recording.getFlat()
+        if config is None:
+            config = self.config
         # 1. Compute CQT Magnitude (Frequency bins are musical notes)
-        # We use a small hop_length to get a single frame of data
-        wav = self.recording.getFlat()
+        # One matrix product against the precomputed kernel bank
+        note_magnitudes = config.cqt.transform(wav, self.spectrumStep)
+
+        # 2. Convert to dB and Apply A-Weighting. librosa's 80 dB floor is
+        #    taken below each channel's own peak, not the loudest channel's
+        mag_db = librosa.amplitude_to_db(note_magnitudes, ref=1.0, top_db=None)
+        mag_db = np.maximum(mag_db, mag_db.max(axis=-1, keepdims=True) - 80.0)
+        return mag_db + config.a_weighting
+
+    def getSpectrumLibrosa(self):
+        """
+        Reference spectrum straight from librosa.cqt, kept to validate the
+        ConstantQEngine against (see its docstring for the tolerance).
+        """
+        wav = self._firstChannel()
+        # We use a huge hop_length to get a single frame of data
         cqt = np.abs(librosa.cqt(
             wav, 
             sr=self.RATE, 
@@ -129,16 +353,8 @@ class LibrosaAudioAnalyzer:
             n_bins=self.n_bins,
             hop_length=len(wav)+ 1 
         ))
-        
-        # Flatten to get the 1D magnitude array
-        note_magnitudes = cqt.flatten()
-
-        # 2. Convert to dB and Apply A-Weighting
-        mag_db = librosa.amplitude_to_db(note_magnitudes, ref=1.0)
-        weighted_mag = mag_db + self.a_weighting
-
-        # Returns: [('C2', -10.5), ('C#2', -15.2), ...]
-        return zip(self.note_freqs, weighted_mag)
+        mag_db = librosa.amplitude_to_db(cqt.flatten(), ref=1.0)
+        return mag_db + self.a_weighting
 
     def adjust_sensitivity(self, increase=True):
         """Increase or decrease the dB threshold."""
@@ -160,31 +376,36 @@ class LibrosaAudioAnalyzer:
         self.adjustRange(minNote, maxNote)       
 
 
-    def getNoteIndexPyin(self):
-        f0, voiced_flag, voiced_probs = librosa.pyin(self.recording.getFlat(),
+    def getNoteIndexPyin(self, wav=None, config=None):
+        if wav is None:
+            wav = self.recording.getFlat()
+        note_freqs = self.note_freqs if config is None else config.note_freqs
+        f0, voiced_flag, voiced_probs = librosa.pyin(wav,
                                              sr=self.RATE,
-                                             fmin=self.note_freqs[0], 
-                                             fmax=self.note_freqs[-1])
+                                             fmin=note_freqs[0], 
+                                             fmax=note_freqs[-1])
         return f0, voiced_flag, voiced_probs
     
-    def getNoteIndex(self):       
+    def getNoteIndex(self, wav=None, config=None):       
         """
         Returns the index of the strongest note in the current spectrum.
         """
+        if wav is None:
+            wav = self.recording.getLatest(self.CHUNK)
+        note_freqs = self.note_freqs if config is None else config.note_freqs
         # 1. Compute Pitch and Magnitudes using piptrack
         # Piptrack is more accurate than raw FFT for musical notes
         pitches, magnitudes = librosa.piptrack(
-            y=self.current_audio, 
+            y=wav, 
             sr=self.RATE, 
-            fmin=self.note_freqs[0], 
-            fmax=self.note_freqs[-1]
+            fmin=note_freqs[0], 
+            fmax=note_freqs[-1]
         )
 
         # 2. Find the strongest peak in the current frame
         return pitches, magnitudes, magnitudes.argmax()
 
     def __del__(self):
-        self.stream.stop()
-        self.stream.close()
+        self.source.close()
 
     
@@ -0,0 +1,215 @@
+# audio_sources.py
+# Interchangeable audio inputs for LibrosaAudioAnalyzer
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import numpy as np
+
+# Mirrors the fields of the `time` struct sounddevice passes to callbacks.
+# For generated sources the clock is the stream position in seconds.
+BlockTime = namedtuple("BlockTime", ["inputBufferAdcTime", "currentTime", "outputBufferDacTime"])
+
+
+class AudioSource(ABC):
+    """
+    Something that delivers fixed-size blocks of float32 audio by calling
+    callback(indata, frames, time, status) with indata shaped (frames, channels),
+    exactly like a sounddevice InputStream callback.
+    """
+    def __init__(self, samplerate, blocksize, channels=1):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+
+    @abstractmethod
+    def start(self, callback):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.stop()
+
+
+class SoundDeviceSource(AudioSource):
+    """Live microphone input."""
+    def __init__(self, samplerate, blocksize, channels=1, device=None):
+        super().__init__(samplerate, blocksize, channels)
+        self.device = device
+        self.stream = None
+
+    def start(self, callback):
+        # imported here so the other sources work without PortAudio installed
+        import sounddevice as sd
+        self.stream = sd.InputStream(
+            device=self.device, channels=self.channels, samplerate=self.samplerate,
+            blocksize=self.blocksize, callback=callback
+        )
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class BlockSource(AudioSource):
+    """
+    Base for sources generated in Python. Subclasses implement blocks(), a
+    generator of (frames, channels) float32 arrays.
+
+    start() plays the blocks from a thread at `speed` times real time
+    (speed=None means as fast as the callback keeps up). With speed=0 start()
+    does nothing and blocks are only delivered by pump(), which feeds them
+    synchronously for deterministic tests and benchmarks.
+    """
+    def __init__(self, samplerate, blocksize, channels=1, speed=1.0):
+        super().__init__(samplerate, blocksize, channels)
+        self.speed = speed
+        self.blocksDelivered = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._blocks = None
+
+    @abstractmethod
+    def blocks(self):
+        pass
+
+    def _nextBlock(self):
+        if self._blocks is None:
+            self._blocks = iter(self.blocks())
+        return next(self._blocks, None)
+
+    def _deliver(self, callback, block):
+        # timestamps on the stream's own clock, like PortAudio's
+        adc = self.blocksDelivered * self.blocksize / self.samplerate
+        now = adc + self.blocksize / self.samplerate
+        callback(block, self.blocksize, BlockTime(adc, now, 0.0), None)
+        self.blocksDelivered += 1
+
+    def pump(self, callback, numBlocks=None):
+        """Delivers up to numBlocks blocks right now. Returns how many were sent."""
+        sent = 0
+        while numBlocks is None or sent < numBlocks:
+            block = self._nextBlock()
+            if block is None:
+                break
+            self._deliver(callback, block)
+            sent += 1
+        return sent
+
+    def start(self, callback):
+        if self.speed == 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback,),
+                                        name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def _run(self, callback):
+        period = None if self.speed is None else self.blocksize / self.samplerate / self.speed
+        nextTime = time.perf_counter()
+        while not self._stop.is_set():
+            block = self._nextBlock()
+            if block is None:
+                break
+            if period is not None:
+                delay = nextTime - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+                nextTime += period
+            self._deliver(callback, block)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+class FileSource(BlockSource):
+    """Replays a WAV/FLAC (anything soundfile reads) in blocks."""
+    def __init__(self, path, samplerate, blocksize, channels=1, speed=1.0, loop=False):
+        super().__init__(samplerate, blocksize, channels, speed)
+        import soundfile as sf
+        self.path = path
+        self.loop = loop
+        info = sf.info(path)
+        if info.samplerate != samplerate:
+            raise ValueError(f"{path} is {info.samplerate} Hz but the analyzer runs at "
+                             f"{samplerate} Hz; resample the file first")
+
+    def blocks(self):
+        import soundfile as sf
+        while True:
+            with sf.SoundFile(self.path) as f:
+                for block in f.blocks(blocksize=self.blocksize, dtype="float32",
+                                      always_2d=True, fill_value=0.0):
+                    yield self._matchChannels(block)
+            if not self.loop:
+                return
+
+    def _matchChannels(self, block):
+        # keep the first `channels` channels, repeating the last one if short
+        picks = np.minimum(np.arange(self.channels), block.shape[1] - 1)
+        return np.ascontiguousarray(block[:, picks])
+
+
+class SyntheticSource(BlockSource):
+    """
+    Generated test signals:
+      tone  - a sine at freqs[0]
+      chord - equal-amplitude sines at every frequency in freqs
+      sweep - a log sine sweep from freqs[0] to freqs[1] over sweepTime seconds
+      noise - white noise
+    `noise` adds that much white noise to any kind. duration=None runs forever.
+    """
+    KINDS = ("tone", "chord", "sweep", "noise")
+
+    def __init__(self, samplerate, blocksize, kind="tone", freqs=(440.0,),
+                 amplitude=0.5, noise=0.0, sweepTime=10.0, duration=None,
+                 channels=1, speed=1.0, seed=0):
+        super().__init__(samplerate, blocksize, channels, speed)
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown signal kind {kind!r}, expected one of {self.KINDS}")
+        self.kind = kind
+        self.freqs = np.atleast_1d(np.asarray(freqs, dtype=np.float64))
+        self.amplitude = amplitude
+        self.noise = noise
+        self.sweepTime = sweepTime
+        self.duration = duration
+        self.rng = np.random.default_rng(seed)
+
+    def _signal(self, t):
+        if self.kind == "noise":
+            return self.amplitude * self.rng.standard_normal(len(t))
+        if self.kind == "sweep":
+            f0, f1 = self.freqs[0], self.freqs[-1]
+            k = np.log(f1 / f0) / self.sweepTime
+            # phase of an exponential sweep, restarting every sweepTime seconds
+            tt = np.mod(t, self.sweepTime)
+            return self.amplitude * np.sin(2 * np.pi * f0 * (np.exp(k * tt) - 1) / k)
+        freqs = self.freqs[:1] if self.kind == "tone" else self.freqs
+        phases = 2 * np.pi * np.outer(t, freqs)
+        return self.amplitude * np.sin(phases).sum(axis=1) / len(freqs)
+
+    def blocks(self):
+        total = None if self.duration is None else int(self.duration * self.samplerate)
+        start = 0
+        while total is None or start < total:
+            t = (start + np.arange(self.blocksize)) / self.samplerate
+            block = self._signal(t)
+            if self.noise:
+                block = block + self.noise * self.rng.standard_normal(self.blocksize)
+            block = np.repeat(block[:, None], self.channels, axis=1).astype(np.float32)
+            yield block
+            start += self.blocksize
@@ -0,0 +1,523 @@
+# benchmark.py
+# Timing and allocation benchmarks for the analyzer and game loop hot paths
+#
+# python benchmark.py --out bench.json
+# python benchmark.py --out new.json --compare bench.json
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Scenes are timed headlessly
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+
+from audio_sources import SyntheticSource, FileSource
+
+RATE = 44100
+CHUNK = 1024
+
+# Signals every analyzer benchmark is run against
+SIGNALS = {
+    "tone": dict(kind="tone", freqs=[440.0], noise=0.01),
+    "chord": dict(kind="chord", freqs=[261.63, 329.63, 392.0], noise=0.01),
+    "sweep": dict(kind="sweep", freqs=[80.0, 1600.0], sweepTime=2.0),
+    "noise": dict(kind="noise", amplitude=0.1),
+}
+
+# adjustRange settings, from the default 5 octaves down to one
+RANGES = [("C2", "C7"), ("C3", "C6"), ("E2", "E4"), ("C4", "C5")]
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1e3
+    return {
+        "calls": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def measure(fn, repeat, warmup=2, between=None):
+    """
+    Times `repeat` calls of fn(), then runs a few more under tracemalloc to
+    record bytes allocated per call. `between()` runs untimed before each call
+    (used to push fresh audio in).
+    """
+    for _ in range(warmup):
+        if between:
+            between()
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        if between:
+            between()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    result = percentiles(samples)
+
+    # Allocations are measured separately: tracemalloc slows everything down
+    allocCalls = min(repeat, 5)
+    tracemalloc.start()
+    peak = 0
+    allocated = 0
+    for _ in range(allocCalls):
+        if between:
+            between()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        after, callPeak = tracemalloc.get_traced_memory()
+        peak = max(peak, callPeak - before)
+        allocated += max(after - before, 0)
+    tracemalloc.stop()
+    result["alloc_peak_bytes"] = int(peak)
+    result["alloc_retained_bytes"] = int(allocated / allocCalls)
+    return result
+
+
+def makeAnalyzer(signal=None, wav=None, channels=1, dtype=None):
+    from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+    # speed=0: nothing plays by itself, the benchmark pumps blocks in
+    if wav is not None:
+        source = FileSource(wav, RATE, CHUNK, channels=channels, speed=0, loop=True)
+    else:
+        source = SyntheticSource(RATE, CHUNK, channels=channels, speed=0, **SIGNALS[signal or "tone"])
+    analyzer = LibrosaAudioAnalyzer(source, channels=channels, dtype=dtype)
+    source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    return analyzer, source
+
+
+def benchAnalyzer(results, signals, ranges, repeat, wav=None):
+    inputs = [(name, None) for name in signals]
+    if wav is not None:
+        inputs.append(("recorded", wav))
+
+    for signalName, path in inputs:
+        analyzer, source = makeAnalyzer(signalName if path is None else None, path)
+        newChunk = lambda: source.pump(analyzer._audio_callback, 1)
+        for minNote, maxNote in ranges:
+            analyzer.adjustRange(minNote, maxNote)
+            key = f"{signalName}/{minNote}-{maxNote}"
+
+            results[f"getSpectrum/{key}"] = measure(
+                lambda: list(analyzer.getSpectrum()), repeat, between=newChunk)
+            results[f"getNoteIndex/{key}"] = measure(
+                analyzer.getNoteIndex, repeat, between=newChunk)
+            # pyin is two orders of magnitude slower than everything else
+            results[f"getStrongestNote/{key}"] = measure(
+                analyzer.getStrongestNote, max(3, repeat // 20), warmup=1, between=newChunk)
+            for mode in analyzer.PITCH_MODES:
+                if mode == "pyin":
+                    continue
+                analyzer.setPitchMode(mode)
+                results[f"getPitch[{mode}]/{key}"] = measure(
+                    analyzer.getPitch, repeat, between=newChunk)
+            analyzer.setPitchMode("pyin")
+        analyzer.source.close()
+
+
+def benchChannels(results, repeat, counts=(1, 2, 4, 8)):
+    """How the analysis pass scales with input channels (streaming pitch)."""
+    from analysis_worker import AnalysisWorker
+    for channels in counts:
+        analyzer, source = makeAnalyzer(channels=channels)
+        analyzer.setPitchMode("streaming")
+        worker = AnalysisWorker(analyzer)
+        newChunk = lambda: source.pump(analyzer._audio_callback, 1)
+        key = f"{channels}ch"
+        results[f"channels/getPitches/{key}"] = measure(analyzer.getPitches, repeat, between=newChunk)
+        results[f"channels/getSpectrumMagnitudes/{key}"] = measure(
+            analyzer.getSpectrumMagnitudes, repeat, between=newChunk)
+        results[f"channels/analyzeOnce/{key}"] = measure(worker.analyzeOnce, repeat, between=newChunk)
+        source.close()
+    base = results["channels/analyzeOnce/1ch"]["p50_ms"]
+    for channels in counts:
+        p50 = results[f"channels/analyzeOnce/{channels}ch"]["p50_ms"]
+        print(f"analyzeOnce x{channels} channels: {p50:.3f} ms, {p50 / base:.2f}x one channel")
+
+
+def benchPrecision(results, repeat):
+    """
+    The float32 pipeline (SINGLE_PRECISION) against float64 on the same
+    input: the bytes a spectrum pass and a tracker step read, and the time
+    per analysis. That no stage is promoted back to float64 and that the
+    results match within tolerance is tests/test_precision.py's job.
+    """
+    from analysis_worker import AnalysisWorker
+
+    # Memory read per pass and time per analysis, per precision
+    for dtype in (np.float64, np.float32):
+        name = np.dtype(dtype).name
+        analyzer, source = makeAnalyzer("chord", dtype=dtype)
+        worker = AnalysisWorker(analyzer)
+        newChunk = lambda: source.pump(analyzer._audio_callback, 1)
+        tracker = analyzer.pitchTracker
+        spectrumBytes = analyzer.recording.getFlat().nbytes + analyzer.cqt.kernels.nbytes
+        trackerBytes = tracker.frameLength * analyzer.dtype.itemsize + tracker.state.nbytes
+        print(f"{name}: spectrum pass reads {spectrumBytes / 1024:.0f} KiB, "
+              f"tracker step {trackerBytes / 1024:.1f} KiB, ring holds {analyzer.recording.buffer.nbytes / 1024:.0f} KiB")
+
+        results[f"precision/capture[{name}]"] = measure(newChunk, repeat * 10)
+        result = measure(analyzer.getSpectrumMagnitudes, repeat, between=newChunk)
+        result["bytes_read"] = spectrumBytes
+        results[f"precision/getSpectrumMagnitudes[{name}]"] = result
+        analyzer.spectrumWanted = True
+        for mode in ("streaming", "pyin"):
+            analyzer.setPitchMode(mode)
+            calls = repeat if mode == "streaming" else max(3, repeat // 20)
+            results[f"precision/analyzeOnce[{mode}, {name}]"] = measure(
+                worker.analyzeOnce, calls, warmup=1, between=newChunk)
+        source.close()
+    for label in ("getSpectrumMagnitudes[{}]", "analyzeOnce[streaming, {}]", "analyzeOnce[pyin, {}]"):
+        single = results["precision/" + label.format("float32")]["p50_ms"]
+        double = results["precision/" + label.format("float64")]["p50_ms"]
+        print(f"{label.format('float32')}: {single:.3f} ms, float64 {double:.3f} ms ({double / single:.2f}x)")
+
+
+def benchRangeChanges(results, repeat):
+    analyzer, _ = makeAnalyzer()
+    cache = analyzer.configCache
+    # miss: the in-memory config is rebuilt (tables still come from disk)
+    results["adjustRange[miss]"] = measure(
+        lambda: analyzer.adjustRange("C3", "C6"), repeat, between=cache.clear)
+    # hit: what an arrow key in the tuning screen costs once a range was seen
+    results["adjustRange[hit]"] = measure(lambda: analyzer.adjustRange("C3", "C6"), repeat)
+    results["adjustSpectrum[sweep]"] = measure(
+        lambda: [analyzer.adjustSpectrum(noteShift=shift) for shift in (1, 1, -1, -1)], repeat)
+    print("config cache:", cache.getStats())
+    analyzer.source.close()
+
+
+def benchRingBuffer(results, repeat):
+    from ring_buffer import CircularBuffer
+    buffer = CircularBuffer(CHUNK, 10)
+    chunk = np.random.default_rng(0).standard_normal(CHUNK)
+    results["CircularBuffer.add_chunk"] = measure(lambda: buffer.add_chunk(chunk), repeat * 10)
+    results["CircularBuffer.getFlat"] = measure(buffer.getFlat, repeat * 10)
+
+
+def benchScenes(results, repeat):
+    import pygame
+    from game import Game
+
+    source = SyntheticSource(RATE, CHUNK, speed=0, **SIGNALS["tone"])
+    game = Game(source, fastStartup=False)
+    # scenes only read the worker's snapshot; stop the thread so it can't
+    # steal time from the frames being measured, and publish one result
+    game.analysis_worker.stop()
+    source.pump(game.audio_analyzer._audio_callback, game.audio_analyzer.recording.numChunks)
+    game.analysis_worker.analyzeOnce()
+
+    gameScreen = game.scenes["game"]
+    results["GameScreen.update"] = measure(lambda: gameScreen.update(1 / 60.0), repeat * 5)
+    results["GameScreen.draw"] = measure(gameScreen.draw, repeat * 5)
+    results["TuningScreen.draw"] = measure(game.scenes["tuning"].draw, repeat * 5)
+    results["TitleScreen.draw"] = measure(game.scenes["title"].draw, repeat * 5)
+    print("text cache:", gameScreen.textCache.getStats())
+
+    # What a change of scene would stall for without the preload, and what
+    # it costs with the scene ready
+    for name in ("game", "tuning"):
+        results[f"SceneRegistry.build[{name}]"] = measure(game.scenes.factories[name], repeat)
+    results["Game.change_scene[ready]"] = measure(
+        lambda: (game.change_scene("tuning"), game.change_scene("title")), repeat * 5)
+
+    # A frame should cost the same with 60 bricks as with thousands
+    gameScreen.lives = 10 ** 6  # keep the ball in play
+    for rows, cols in ((0, 0), (6, 10), (20, 40), (40, 80), (60, 120)):
+        gameScreen.load_level(rows, cols)
+        gameScreen.reset_ball()
+        results[f"GameScreen.frame[{rows * cols} bricks]"] = measure(
+            lambda: (gameScreen.update(1 / 60.0), gameScreen.draw()), repeat * 5)
+
+    # A burst of hits landing in one step
+    field = gameScreen.bricks
+    rng = np.random.default_rng(0)
+    def queueHits():
+        if field.remaining < 64:
+            field.reset()
+        field.pending.extend(rng.choice(np.nonzero(field.alive)[0], 64, replace=False).tolist())
+    results["BrickField.flushHits[64 hits]"] = measure(field.flushHits, repeat * 5, between=queueHits)
+
+    # The bar renderer's cost should stay flat as the bin count grows: a new
+    # spectrum every call repaints every bar, a held one repaints nothing
+    from spectrum_view import SpectrumRenderer
+    rng = np.random.default_rng(0)
+    for binsPerOctave in (12, 48, 96):
+        freqs = 65.4 * 2.0 ** (np.arange(5 * binsPerOctave + 1) / binsPerOctave)
+        spectra = rng.uniform(-60, 0, (2, len(freqs)))
+        renderer = SpectrumRenderer(800, 400, pygame.font.Font(None, 36))
+        frame = [0]
+        def renderNext():
+            frame[0] ^= 1
+            renderer.render(freqs, spectra[frame[0]], -50, -10)
+        results[f"SpectrumRenderer.render[{len(freqs)} bins]"] = measure(renderNext, repeat * 5)
+        results[f"SpectrumRenderer.render[{len(freqs)} bins, held]"] = measure(
+            lambda: renderer.render(freqs, spectra[0], -50, -10), repeat * 5)
+
+    # The waterfall paints one new row a spectrum, however much history it holds
+    from spectrum_view import Waterfall
+    snapshot = game.analysis_worker.snapshot
+    waterfall = Waterfall(800, 400)
+    for _ in range(waterfall.capacity):
+        waterfall.push(snapshot._replace(seq=-1))
+    surface = pygame.Surface((800, 400))
+    results[f"Waterfall.push+draw[{waterfall.capacity} spectra]"] = measure(
+        lambda: (waterfall.push(snapshot._replace(seq=-1)),
+                 waterfall.draw(surface, (0, 0), snapshot.noteFreqs, -50, -10)), repeat * 5)
+    results["Waterfall.draw[repaint]"] = measure(
+        lambda: waterfall.draw(surface, (0, 0), snapshot.noteFreqs, -50, -10), repeat,
+        between=lambda: setattr(waterfall, "_paintKey", None))
+    game.audio_analyzer.source.close()
+    pygame.quit()
+
+
+def benchProfiler(results, repeat, calls=1000):
+    """
+    Cost of the FrameProfiler hooks, `calls` of them per sample, disabled and
+    enabled, and of a streaming analysis pass without a profiler, with a
+    disabled one and with an enabled one.
+    """
+    from frame_profiler import FrameProfiler
+    from analysis_worker import AnalysisWorker
+
+    for enabled in (False, True):
+        profiler = FrameProfiler(enabled=enabled)
+        state = "on" if enabled else "off"
+
+        def laps():
+            for _ in range(calls):
+                profiler.lap("update")
+
+        def spans():
+            for _ in range(calls):
+                with profiler.span("physics"):
+                    pass
+
+        results[f"FrameProfiler.lap[{state}, {calls} calls]"] = measure(laps, repeat)
+        results[f"FrameProfiler.span[{state}, {calls} calls]"] = measure(spans, repeat)
+
+    analyzer, source = makeAnalyzer("tone")
+    analyzer.setPitchMode("streaming")
+    worker = AnalysisWorker(analyzer)
+    for label, profiler in (("none", None), ("off", FrameProfiler(enabled=False)),
+                            ("on", FrameProfiler(enabled=True))):
+        analyzer.profiler = worker.profiler = profiler
+        results[f"analyzeOnce[streaming, profiler {label}]"] = measure(
+            worker.analyzeOnce, repeat * 5, between=lambda: source.pump(analyzer._audio_callback, 1))
+    source.close()
+
+
+def benchJitter(results, seconds):
+    """
+    Frame-to-frame intervals of the tuning screen at FPS while pyin analyses
+    a real-time chord: with the analysis in a thread, in a child process, and
+    in a thread under the QualityScheduler (adaptive).
+    """
+    import functools
+    import pygame
+    from game import Game
+    from settings import FPS
+
+    for mode in ("thread", "process", "adaptive"):
+        if mode == "process":
+            source = functools.partial(SyntheticSource, RATE, CHUNK, **SIGNALS["chord"])
+        else:
+            source = SyntheticSource(RATE, CHUNK, **SIGNALS["chord"])
+        game = Game(source, fastStartup=False, dspProcess=mode == "process",
+                    autoQuality=mode == "adaptive")
+        game.change_scene("tuning")
+        scene = game.current_scene
+        clock = pygame.time.Clock()
+        intervals = []
+        last = time.perf_counter()
+        end = last + seconds
+        while last < end:
+            dt = clock.tick(FPS) / 1000.0
+            frameStart = time.perf_counter()
+            game.audio_analyzer.update()
+            pygame.event.pump()
+            scene.update(dt)
+            scene.draw()
+            pygame.display.flip()
+            now = time.perf_counter()
+            intervals.append(now - last)
+            last = now
+            if game.quality is not None:
+                game.quality.markFrame(now - frameStart)
+        game.analysis_worker.stop()
+        if mode != "process":
+            game.audio_analyzer.source.close()
+        pygame.quit()
+
+        result = percentiles(intervals[FPS:])  # the first second settles
+        ms = np.asarray(intervals[FPS:]) * 1e3
+        result["std_ms"] = float(ms.std())
+        result["late_frames"] = int((ms > 1.5e3 / FPS).sum())
+        if game.quality is not None:
+            result["quality"] = game.quality.getStats()
+            print("quality scheduler:", result["quality"])
+        results[f"frameInterval[{mode}]"] = result
+
+
+class Bursts(SyntheticSource):
+    """A tone for `onTime` of every second, silence in between. Notes when each burst began."""
+    def __init__(self, onTime=0.4, **kwargs):
+        super().__init__(RATE, CHUNK, **kwargs)
+        self.onTime = onTime
+        self.burstTimes = []
+
+    def _signal(self, t):
+        return np.where(np.mod(t, 1.0) < self.onTime, super()._signal(t), 0.0)
+
+    def _deliver(self, callback, block):
+        if block.any() and np.mod(self.blocksDelivered * CHUNK / RATE, 1.0) < CHUNK / RATE:
+            self.burstTimes.append(time.perf_counter())
+        super()._deliver(callback, block)
+
+
+def benchIdle(results, seconds):
+    """
+    In real time, per pitch mode: capture plus analysis CPU in silence
+    (idle[mode], CPU ms per 100 ms, i.e. percent of a core) and the time
+    from a note's first chunk to its NOTE_ON event (noteOnLatency[mode]).
+    """
+    from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+    from analysis_worker import AnalysisWorker
+    from note_events import NoteEventTracker, NOTE_ON
+
+    for mode in ("pyin", "streaming"):
+        # 1. Silence: the gate should keep the worker asleep
+        source = SyntheticSource(RATE, CHUNK, kind="noise", amplitude=0.0)
+        analyzer = LibrosaAudioAnalyzer(source)
+        analyzer.setPitchMode(mode)
+        worker = AnalysisWorker(analyzer)
+        worker.start()
+        time.sleep(0.5)
+        samples = []
+        for _ in range(int(seconds * 10)):
+            cpu = time.process_time()
+            time.sleep(0.1)
+            samples.append(time.process_time() - cpu)
+        worker.stop()
+        source.close()
+        results[f"idle[{mode}]"] = percentiles(samples)
+
+        # 2. One burst a second: how soon its NOTE_ON is posted
+        source = Bursts(kind="tone", freqs=[440.0])
+        analyzer = LibrosaAudioAnalyzer(source)
+        analyzer.setPitchMode(mode)
+        worker = AnalysisWorker(analyzer)
+        noteOns = []
+        worker.noteEvents = NoteEventTracker(
+            lambda event: noteOns.append(time.perf_counter()) if event.type == NOTE_ON else None)
+        worker.start()
+        time.sleep(seconds)
+        worker.stop()
+        source.close()
+        # the first burst finds the tracker fresh
+        latencies = [min((t for t in noteOns if t > start), default=np.nan) - start
+                     for start in source.burstTimes[1:-1]]
+        results[f"noteOnLatency[{mode}]"] = percentiles(np.array(latencies)[~np.isnan(latencies)])
+
+
+def compare(results, baselinePath, threshold):
+    """Prints p50/p95 ratios against a previous run. Returns the regressions."""
+    with open(baselinePath) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\n{'benchmark':<44}{'p50 old':>10}{'p50 new':>10}{'ratio':>8}")
+    for name, new in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratio = new["p50_ms"] / old["p50_ms"] if old["p50_ms"] > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<44}{old['p50_ms']:>10.3f}{new['p50_ms']:>10.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analyzer and game loop hot paths.")
+    parser.add_argument("--out", default="bench.json", help="where to write the results (JSON)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative p50 slowdown reported as a regression (default 0.2)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per benchmark")
+    parser.add_argument("--wav", help="also benchmark on this recording (must be 44.1 kHz)")
+    parser.add_argument("--quick", action="store_true", help="one signal, two ranges")
+    parser.add_argument("--only", choices=["analyzer", "ranges", "ring", "scenes", "channels", "profiler",
+                                           "precision", "jitter", "idle"],
+                        action="append",
+                        help="run only these groups (repeatable); jitter and idle only run when asked for")
+    parser.add_argument("--jitter-seconds", type=float, default=10.0,
+                        help="real time per mode in the jitter and idle groups (default 10)")
+    args = parser.parse_args(argv)
+
+    signals = ["tone"] if args.quick else list(SIGNALS)
+    ranges = RANGES[:2] if args.quick else RANGES
+    groups = args.only or ["analyzer", "ranges", "ring", "scenes", "channels", "profiler", "precision"]
+
+    results = {}
+    if "ring" in groups:
+        benchRingBuffer(results, args.repeat)
+    if "analyzer" in groups:
+        benchAnalyzer(results, signals, ranges, args.repeat, args.wav)
+    if "ranges" in groups:
+        benchRangeChanges(results, args.repeat)
+    if "scenes" in groups:
+        benchScenes(results, args.repeat)
+    if "channels" in groups:
+        benchChannels(results, args.repeat)
+    if "profiler" in groups:
+        benchProfiler(results, args.repeat)
+    if "precision" in groups:
+        benchPrecision(results, args.repeat)
+    if "jitter" in groups:
+        benchJitter(results, args.jitter_seconds)
+    if "idle" in groups:
+        benchIdle(results, args.jitter_seconds)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    for name, r in sorted(results.items()):
+        print(f"{name:<44} p50 {r['p50_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms  "
+              f"p99 {r['p99_ms']:8.3f} ms  peak {r.get('alloc_peak_bytes', 0) / 1024:8.1f} KiB")
+    print(f"\nwrote {args.out}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# bricks.py
+# Array-backed brick field with batched collision handling and rendering
+
+import numpy as np
+import pygame
+import pymunk
+
+from settings import *
+
+# One colour per row, repeating
+ROW_COLOURS = np.array([
+    (220, 60, 60),
+    (230, 150, 50),
+    (230, 220, 60),
+    (80, 200, 90),
+    (70, 140, 230),
+    (160, 90, 220),
+], dtype=np.uint8)
+
+
+class BrickField:
+    """
+    Every brick of a level, stored as rows of NumPy arrays instead of one
+    Python object per brick.
+
+    The physics side is one static pymunk box per brick. Collisions only
+    queue the brick's index; flushHits() applies all of them after the
+    physics step and removes the broken shapes in one call, so nothing is
+    removed from the space while it is stepping.
+
+    The drawing side is a screen-sized surface with every brick already on
+    it. Breaking a brick repaints just that brick's rect, and draw() is a
+    single blit whatever the brick count.
+    """
+    def __init__(self, space, rows, cols, area=BRICK_AREA, gap=BRICK_GAP, hp=BRICK_HP):
+        self.space = space
+        self.rows = rows
+        self.cols = cols
+        self.maxHp = hp
+        count = rows * cols
+
+        # 1. Grid layout: one row of each array per brick
+        x0, y0, width, height = area
+        brickW = width / max(cols, 1)
+        brickH = height / max(rows, 1)
+        row, col = np.divmod(np.arange(count), max(cols, 1))
+        self.rects = np.empty((count, 4), dtype=np.int32)
+        self.rects[:, 0] = x0 + col * brickW
+        self.rects[:, 1] = y0 + row * brickH
+        self.rects[:, 2] = max(int(brickW) - gap, 1)
+        self.rects[:, 3] = max(int(brickH) - gap, 1)
+        self.colours = ROW_COLOURS[row % len(ROW_COLOURS)]
+        self.alive = np.ones(count, dtype=bool)
+        self.hp = np.full(count, hp, dtype=np.int16)
+        self.remaining = count
+
+        # 2. Physics: every box hangs off one static body
+        self.body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.shapes = []
+        for i, (x, y, w, h) in enumerate(self.rects.tolist()):
+            shape = pymunk.Poly(self.body, [(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+            shape.elasticity = 1.0
+            shape.collision_type = BRICK_COLLISION_TYPE
+            shape.brickIndex = i
+            self.shapes.append(shape)
+        space.add(self.body, *self.shapes)
+        self.pending = []
+        self._addHandler(space)
+
+        # 3. Cached background with every brick painted once
+        self.surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        self.surface.fill(BLACK)
+        self._paint(np.arange(count))
+
+    def _addHandler(self, space):
+        if hasattr(space, "on_collision"):
+            # pymunk 7
+            space.on_collision(BALL_COLLISION_TYPE, BRICK_COLLISION_TYPE, begin=self._onHit)
+        else:
+            handler = space.add_collision_handler(BALL_COLLISION_TYPE, BRICK_COLLISION_TYPE)
+            handler.begin = self._onHit
+
+    def _onHit(self, arbiter, space, data):
+        # called mid-step: only remember which brick it was
+        self.pending.append(arbiter.shapes[1].brickIndex)
+        return True  # pymunk < 7 needs True to keep the bounce
+
+    def _paint(self, indices):
+        """Redraws the given bricks on the background: dimmer when damaged, gone when broken."""
+        shade = self.hp[indices] / self.maxHp
+        colours = (self.colours[indices] * shade[:, None]).astype(np.uint8)
+        for i, colour, alive in zip(indices.tolist(), colours.tolist(), self.alive[indices].tolist()):
+            self.surface.fill(colour if alive else BLACK, self.rects[i].tolist())
+
+    def flushHits(self):
+        """Applies the hits queued during the last step. Returns how many bricks broke."""
+        if not self.pending:
+            return 0
+        hit = np.unique(self.pending)
+        self.pending.clear()
+        hit = hit[self.alive[hit]]
+        self.hp[hit] -= 1
+
+        broken = hit[self.hp[hit] <= 0]
+        if len(broken):
+            self.alive[broken] = False
+            self.space.remove(*[self.shapes[i] for i in broken.tolist()])
+            self.remaining -= len(broken)
+        self._paint(hit)
+        return len(broken)
+
+    def reset(self):
+        """Puts every brick back at full strength."""
+        dead = np.nonzero(~self.alive)[0]
+        if len(dead):
+            self.space.add(*[self.shapes[i] for i in dead.tolist()])
+        self.alive[:] = True
+        self.hp[:] = self.maxHp
+        self.remaining = len(self.alive)
+        self.pending.clear()
+        self.surface.fill(BLACK)
+        self._paint(np.arange(len(self.alive)))
+
+    def remove(self):
+        """Takes the whole field out of the space."""
+        self.space.remove(self.body, *[self.shapes[i] for i in np.nonzero(self.alive)[0].tolist()])
+        self.pending.clear()
+
+    def draw(self, screen):
+        # the background doubles as the screen clear
+        screen.blit(self.surface, (0, 0))
@@ -0,0 +1,524 @@
+# dsp_process.py
+# Audio capture and analysis in a child process, shared with the game through
+# shared memory
+
+import multiprocessing
+import queue
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from settings import *
+from analysis_worker import AnalysisSnapshot, AnalysisWorker
+from ring_buffer import CircularBuffer, SAMPLE_DTYPE
+
+# Ring geometry, as LibrosaAudioAnalyzer records it
+RATE = 44100
+CHUNK = 1024
+NUM_CHUNKS = 10
+
+# Analyzer methods the game may call through the proxy
+COMMANDS = ("adjustRange", "adjustSpectrum", "adjust_sensitivity", "setPitchMode", "cyclePitchMode",
+            "setSpectrumWanted", "setQuality")
+# and AnalysisWorker methods
+WORKER_COMMANDS = ("setRate",)
+
+HEADER_DTYPE = np.dtype([
+    ("latest", np.int64),       # number of results published so far
+    ("heartbeat", np.float64),  # time.perf_counter() of the child's last loop
+    ("pid", np.int64),
+    ("busyTime", np.float64),   # the worker's busyTime
+])
+
+# One published AnalysisSnapshot. begin/end bracket every write (a seqlock):
+# a reader that copies the slot and sees begin == end got a whole result.
+RESULT_DTYPE = np.dtype([
+    ("begin", np.int64),
+    ("seq", np.int64),
+    ("analysisStart", np.float64),
+    ("time", np.float64),
+    ("pitch", np.float64),
+    ("voicedProb", np.float64),
+    ("strongestNote", "S48"),
+    ("noteIndex", np.int64),
+    ("level", np.float64),
+    ("onsets", np.int64),
+    ("capture", np.float64),    # ADC time of chunk seq - 1, for the LatencyTracer
+    ("nBins", np.int64),
+    ("noteNames", "S8", (DSP_MAX_BINS,)),
+    ("noteFreqs", np.float64, (DSP_MAX_BINS,)),
+    ("spectrum", np.float64, (DSP_MAX_BINS,)),
+    ("end", np.int64),
+])
+
+# Analyzer settings the proxy reports back, written after every command
+STATE_DTYPE = np.dtype([
+    ("begin", np.int64),
+    ("minNote", "S8"),
+    ("maxNote", "S8"),
+    ("pitchMode", "S16"),
+    ("activePitchMode", "S16"),
+    ("sensitivity", np.float64),
+    ("spectrumWanted", np.bool_),
+    ("end", np.int64),
+])
+
+
+def openSharedMemory(name, size):
+    """Creates a block when name is None, otherwise attaches to an existing one."""
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=size)
+    try:
+        # the creating process alone owns (and unlinks) the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers every attach with the resource tracker,
+        # which then reports the block as leaked (and unlinks it) when the
+        # attaching process exits. Unregistering afterwards would also drop
+        # the creator's entry when the tracker is shared, as it is with a
+        # spawned child, so the attach is never registered: track=False
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedCircularBuffer(CircularBuffer):
+    """
+    CircularBuffer whose samples and seq counter live in shared memory, so
+    the audio callback in one process can fill it while others read it.
+    Same layout and single producer / single consumer protocol.
+    """
+    def __init__(self, chunkSize, numChunks, slackChunks=4, name=None, channels=1, dtype=SAMPLE_DTYPE):
+        self._shmName = name
+        super().__init__(chunkSize, numChunks, slackChunks, channels, dtype)
+
+    def _allocate(self, shape, dtype):
+        # seq, then the samples; a new block is all zeros, and one attached to
+        # (by a restarted child too) keeps the count it has
+        self.shm = openSharedMemory(self._shmName, 8 + np.dtype(dtype).itemsize * int(np.prod(shape)))
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=8)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self._seq[0])
+
+    @seq.setter
+    def seq(self, value):
+        self._seq[0] = value
+
+    def close(self):
+        del self._seq, self.buffer
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a view is still out there; the mapping goes when it does
+
+
+class ResultBlock:
+    """
+    Shared memory the child publishes into: a header, a ring of
+    DSP_RESULT_SLOTS results and the analyzer settings.
+
+    The child writes result n into slot n % DSP_RESULT_SLOTS and then sets
+    header.latest = n. Readers copy the newest slot and retry if its seqlock
+    shows it was rewritten meanwhile, so nothing is ever pickled and neither
+    side waits for the other.
+    """
+    def __init__(self, name=None):
+        size = HEADER_DTYPE.itemsize + DSP_RESULT_SLOTS * RESULT_DTYPE.itemsize + STATE_DTYPE.itemsize
+        self.shm = openSharedMemory(name, size)
+        buf = self.shm.buf
+        # [0] of a one-element array is a writable view of the record
+        self.header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buf)[0]
+        self.slots = np.ndarray((DSP_RESULT_SLOTS,), dtype=RESULT_DTYPE, buffer=buf,
+                                offset=HEADER_DTYPE.itemsize)
+        self.state = np.ndarray((1,), dtype=STATE_DTYPE, buffer=buf,
+                                offset=HEADER_DTYPE.itemsize + self.slots.nbytes)[0]
+        self.tornReads = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # child side
+
+    def beat(self):
+        self.header["heartbeat"] = time.perf_counter()
+
+    def writeResult(self, snapshot, capture):
+        n = int(self.header["latest"]) + 1
+        slot = self.slots[n % DSP_RESULT_SLOTS]
+        nBins = min(len(snapshot.noteFreqs), DSP_MAX_BINS)
+        slot["begin"] = n
+        slot["seq"] = snapshot.seq
+        slot["analysisStart"] = snapshot.analysisStart
+        slot["time"] = snapshot.time
+        slot["pitch"] = snapshot.pitch
+        slot["voicedProb"] = snapshot.voicedProb
+        slot["strongestNote"] = snapshot.strongestNote.encode()
+        slot["noteIndex"] = snapshot.noteIndex
+        slot["level"] = snapshot.levels[0]
+        slot["onsets"] = snapshot.onsets[0]
+        slot["capture"] = capture
+        slot["nBins"] = nBins
+        slot["noteNames"][:nBins] = [name.encode() for name in snapshot.noteNames[:nBins]]
+        slot["noteFreqs"][:nBins] = snapshot.noteFreqs[:nBins]
+        slot["spectrum"][:nBins] = snapshot.spectrum[:nBins]
+        slot["end"] = n
+        self.header["latest"] = n
+
+    def writeState(self, analyzer):
+        n = int(self.state["end"]) + 1
+        self.state["begin"] = n
+        self.state["minNote"] = analyzer.minNote.encode()
+        self.state["maxNote"] = analyzer.maxNote.encode()
+        self.state["pitchMode"] = analyzer.pitchMode.encode()
+        self.state["activePitchMode"] = analyzer.activePitchMode.encode()
+        self.state["sensitivity"] = analyzer.sensitivity
+        self.state["spectrumWanted"] = analyzer.spectrumWanted
+        self.state["end"] = n
+
+    # game side
+
+    def readLatest(self):
+        """(n, copy of result n), or (0, None) before anything was published."""
+        while True:
+            n = int(self.header["latest"])
+            if n == 0:
+                return 0, None
+            slot = self.slots[n % DSP_RESULT_SLOTS]
+            end = int(slot["end"])
+            copy = slot.copy()
+            if int(slot["begin"]) == end == n:
+                return n, copy
+            self.tornReads += 1
+
+    def readState(self):
+        while True:
+            end = int(self.state["end"])
+            copy = self.state.copy()
+            if int(self.state["begin"]) == end:
+                return copy
+            self.tornReads += 1
+
+    def close(self):
+        del self.header, self.slots, self.state
+        self.shm.close()
+
+
+class SharedAnalysisWorker(AnalysisWorker):
+    """AnalysisWorker that also publishes every result into a ResultBlock."""
+    def __init__(self, analyzer, results):
+        super().__init__(analyzer)
+        self.results = results
+
+    def publish(self, snapshot):
+        tracer = self.analyzer.tracer
+        capture = float("nan")
+        if tracer is not None and snapshot.seq > 0:
+            capture = tracer.captureTimes[(snapshot.seq - 1) % tracer.capacity]
+        self.results.writeResult(snapshot, capture)
+        self.results.header["busyTime"] = self.busyTime
+        return super().publish(snapshot)
+
+
+def _dspMain(sampleName, resultName, sourceFactory, minNote, maxNote, pitchMode, sensitivity,
+             spectrumWanted, commands, ready):
+    """Child process: captures into the shared ring and analyses it until told to stop."""
+    # librosa is imported here only, never by the game process
+    from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+    from latency_trace import LatencyTracer
+
+    recording = SharedCircularBuffer(CHUNK, NUM_CHUNKS, name=sampleName)
+    results = ResultBlock(resultName)
+    results.header["pid"] = multiprocessing.current_process().pid
+
+    # 1. Analyzer in the state the game last saw
+    source = sourceFactory() if sourceFactory is not None else None
+    analyzer = LibrosaAudioAnalyzer(source, recording=recording)
+    if analyzer.CHUNK != CHUNK or analyzer.RATE != RATE:
+        raise ValueError("dsp_process ring geometry doesn't match LibrosaAudioAnalyzer")
+    analyzer.adjustRange(minNote, maxNote)
+    analyzer.setPitchMode(pitchMode)
+    analyzer.sensitivity = sensitivity
+    analyzer.spectrumWanted = spectrumWanted
+    analyzer.tracer = LatencyTracer()
+
+    # 2. Warm up and publish one pass before reporting ready, so there is a
+    #    valid result to read
+    analyzer.warmUp()
+    worker = SharedAnalysisWorker(analyzer, results)
+    results.writeState(analyzer)
+    worker.analyzeOnce()
+    results.beat()
+    worker.start()
+    ready.set()
+
+    # 3. Apply commands; exit with the game even if it never says stop
+    parent = multiprocessing.parent_process()
+    try:
+        while parent is None or parent.is_alive():
+            results.beat()
+            try:
+                name, args = commands.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if name == "stop":
+                break
+            if name in COMMANDS:
+                getattr(analyzer, name)(*args)
+                results.writeState(analyzer)
+            elif name in WORKER_COMMANDS:
+                getattr(worker, name)(*args)
+    finally:
+        worker.stop()
+        analyzer.source.close()
+        recording.close()
+        results.close()
+
+
+class DspProcessClient:
+    """
+    Game-side proxy for an analyzer running in a child process.
+
+    Stands in for both Game.audio_analyzer (commands are forwarded to the
+    child) and Game.analysis_worker (`snapshot` is the latest result the
+    child published). Game.run calls update() every frame, which restarts
+    the child if it died or stopped sending heartbeats and feeds new results
+    to `noteEvents`, an optional NoteEventTracker.
+
+    sourceFactory: picklable callable returning the AudioSource to capture,
+    e.g. functools.partial(SyntheticSource, 44100, 1024). None is the mic.
+    Captures and analyses one channel.
+    """
+    def __init__(self, sourceFactory=None, minNote="C2", maxNote="C7", pitchMode=PITCH_MODE, sensitivity=-10,
+                 spectrumWanted=False):
+        self.sourceFactory = sourceFactory
+        self._context = multiprocessing.get_context("spawn")
+        # owned by this process, which unlinks them in stop()
+        self.recording = SharedCircularBuffer(CHUNK, NUM_CHUNKS)
+        self.results = ResultBlock()
+        self._initial = (minNote, maxNote, pitchMode, sensitivity, spectrumWanted)
+        self.noteEvents = None
+        # last quality and rate asked for, sent again to a restarted child
+        self._quality = None
+        self._rate = None
+        self.process = None
+        self.commands = None
+        self.ready = None
+        self.restarts = 0
+        self.tracer = None
+        self.RATE = RATE
+        self.CHUNK = CHUNK
+
+        self._n = -1
+        self._snapshot = None
+        self._names = {}
+        self._stateEnd = -1
+        self._state = None
+
+    # lifecycle
+
+    def _spawn(self):
+        if int(self.results.state["end"]) > 0:
+            # a restart: carry on with the settings the last child had
+            state = self.results.readState()
+            settings = (state["minNote"].decode(), state["maxNote"].decode(),
+                        state["pitchMode"].decode(), float(state["sensitivity"]),
+                        bool(state["spectrumWanted"]))
+        else:
+            settings = self._initial
+        # a fresh queue: one held by a killed child can be left locked
+        self.commands = self._context.Queue()
+        if self._quality is not None:
+            self.commands.put(("setQuality", self._quality))
+        if self._rate is not None:
+            self.commands.put(("setRate", self._rate))
+        self.ready = self._context.Event()
+        self.process = self._context.Process(
+            target=_dspMain, name="DspProcess", daemon=True,
+            args=(self.recording.name, self.results.name, self.sourceFactory, *settings,
+                  self.commands, self.ready))
+        self.process.start()
+
+    def start(self, timeout=DSP_START_TIMEOUT):
+        """Starts the child and waits until its first result is readable."""
+        self._spawn()
+        deadline = time.perf_counter() + timeout
+        while not self.ready.wait(0.1):
+            if not self.process.is_alive():
+                raise RuntimeError(f"DSP process exited during start-up (code {self.process.exitcode})")
+            if time.perf_counter() > deadline:
+                self.process.kill()
+                raise RuntimeError(f"DSP process not ready after {timeout:.0f} s")
+
+    def _kill(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+    def update(self):
+        """Restarts the child if it crashed or hung. Called once per frame."""
+        if self.noteEvents is not None and self.snapshot is not None:
+            self.noteEvents.update(self.snapshot)
+        if self.process is None or not self.ready.is_set():
+            if self.process is not None and not self.process.is_alive():
+                self._restart(f"exited during start-up (code {self.process.exitcode})")
+            return
+        if not self.process.is_alive():
+            self._restart(f"exited (code {self.process.exitcode})")
+        elif time.perf_counter() - float(self.results.header["heartbeat"]) > DSP_HEARTBEAT_TIMEOUT:
+            self._restart("stopped responding")
+
+    def _restart(self, reason):
+        self._kill()
+        self.restarts += 1
+        if self.restarts > DSP_MAX_RESTARTS:
+            print(f"DSP process {reason}; gave up after {DSP_MAX_RESTARTS} restarts")
+            self.process = None
+            return
+        print(f"DSP process {reason}; restarting ({self.restarts}/{DSP_MAX_RESTARTS})")
+        # the game keeps showing the last result until the new child is ready
+        self._spawn()
+
+    def stop(self):
+        """Shuts the child down and frees the shared memory."""
+        if self.process is not None:
+            self.commands.put(("stop", ()))
+            self.process.join(timeout=5.0)
+            self._kill()
+            self.process = None
+        self.recording.close()
+        self.recording.shm.unlink()
+        self.results.close()
+        self.results.shm.unlink()
+
+    # analysis_worker side
+
+    @property
+    def snapshot(self):
+        # nothing new: one integer read
+        if int(self.results.header["latest"]) == self._n:
+            return self._snapshot
+        n, slot = self.results.readLatest()
+        if n == self._n or slot is None:
+            return self._snapshot
+        self._n = n
+        nBins = int(slot["nBins"])
+        freqs = slot["noteFreqs"][:nBins]
+        # the names only change with the range
+        key = (nBins, float(freqs[0]) if nBins else 0.0)
+        names = self._names.get(key)
+        if names is None:
+            names = np.array([name.decode() for name in slot["noteNames"][:nBins]])
+            self._names[key] = names
+
+        seq = int(slot["seq"])
+        if self.tracer is not None and seq > 0:
+            # both processes share time.perf_counter's clock
+            self.tracer.captureTimes[(seq - 1) % self.tracer.capacity] = slot["capture"]
+        pitch, prob, noteIndex = float(slot["pitch"]), float(slot["voicedProb"]), int(slot["noteIndex"])
+        spectrum = slot["spectrum"][:nBins]
+        self._snapshot = AnalysisSnapshot(
+            seq, float(slot["analysisStart"]), float(slot["time"]), pitch, prob,
+            slot["strongestNote"].decode(), noteIndex, names, freqs, spectrum,
+            np.array([pitch]), np.array([prob]), np.array([noteIndex]), spectrum[None],
+            np.array([float(slot["level"])]), np.array([int(slot["onsets"])]))
+        return self._snapshot
+
+    def getStats(self):
+        return {
+            "published": int(self.results.header["latest"]),
+            "restarts": self.restarts,
+            "tornReads": self.results.tornReads,
+            "pid": int(self.results.header["pid"]),
+            "lastDuration": self.lastDuration,
+        }
+
+    @property
+    def lastDuration(self):
+        return self.snapshot.time - self.snapshot.analysisStart
+
+    @property
+    def busyTime(self):
+        return float(self.results.header["busyTime"])
+
+    def setRate(self, rate):
+        self._rate = (rate,)
+        self._send("setRate", rate)
+
+    # audio_analyzer side
+
+    def _send(self, name, *args):
+        if self.commands is not None:
+            self.commands.put((name, args))
+
+    def _readState(self):
+        end = int(self.results.state["end"])
+        if end != self._stateEnd:
+            self._stateEnd = end
+            self._state = self.results.readState()
+        return self._state
+
+    def adjustRange(self, minNote, maxNote):
+        self._send("adjustRange", minNote, maxNote)
+
+    def adjustSpectrum(self, noteShift=0, rangeShift=0):
+        self._send("adjustSpectrum", noteShift, rangeShift)
+
+    def adjust_sensitivity(self, increase=True):
+        self._send("adjust_sensitivity", increase)
+
+    def setPitchMode(self, mode):
+        self._send("setPitchMode", mode)
+
+    def cyclePitchMode(self):
+        self._send("cyclePitchMode")
+
+    def setSpectrumWanted(self, wanted):
+        self._send("setSpectrumWanted", wanted)
+
+    def setQuality(self, pitchModeCap=None, windowChunks=None, spectrumStep=1):
+        self._quality = (pitchModeCap, windowChunks, spectrumStep)
+        self._send("setQuality", *self._quality)
+
+    @property
+    def pitchMode(self):
+        return self._readState()["pitchMode"].decode()
+
+    @property
+    def activePitchMode(self):
+        return self._readState()["activePitchMode"].decode()
+
+    @property
+    def minNote(self):
+        return self._readState()["minNote"].decode()
+
+    @property
+    def maxNote(self):
+        return self._readState()["maxNote"].decode()
+
+    def getSensitivity(self):
+        return float(self._readState()["sensitivity"])
+
+    def getSampleRate(self):
+        return self.RATE
+
+    @property
+    def note_names(self):
+        return self.snapshot.noteNames
+
+    @property
+    def note_freqs(self):
+        return self.snapshot.noteFreqs
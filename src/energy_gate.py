@@ -0,0 +1,55 @@
+# energy_gate.py
+# Per-chunk level gate and onset detector, cheap enough for the audio callback
+
+import numpy as np
+
+from settings import *
+
+
+class EnergyGate:
+    """
+    RMS level, open/closed state and onset count of every input channel,
+    updated by the audio callback for each chunk. A chunk costs a few
+    microseconds, so the gate decides when pitch estimation has to run.
+
+    A channel opens when a chunk's level reaches the threshold and closes
+    once it has stayed GATE_HYSTERESIS_DB below it for GATE_HOLD_CHUNKS
+    chunks, so a decaying note doesn't chatter. An onset is a jump of
+    ONSET_RISE_DB over an envelope that falls by ONSET_DECAY_DB a chunk.
+
+    process() swaps in new arrays instead of writing into the old ones, so
+    a reader on another thread always sees whole results.
+    """
+    def __init__(self, channels=1):
+        self.channels = channels
+        self.levels = np.full(channels, SILENCE_DB)  # RMS dBFS of the newest chunk
+        self.open = np.zeros(channels, dtype=bool)
+        # onsets so far; readers compare counts instead of clearing flags
+        self.onsets = np.zeros(channels, dtype=np.int64)
+        self.envelope = np.full(channels, SILENCE_DB)
+        self.quiet = np.zeros(channels, dtype=np.int64)  # chunks under the closing level
+
+    def process(self, chunk, thresholdDb):
+        """
+        chunk: (frames, channels) samples. Returns True when the chunk is
+        worth analysing: a channel is open or has just closed.
+        """
+        # 1. Level of every channel
+        power = np.einsum("ij,ij->j", chunk, chunk, dtype=np.float64) / len(chunk)
+        levels = 10 * np.log10(np.maximum(power, 10 ** (SILENCE_DB / 10)))
+
+        # 2. Onsets: a sudden rise over the decaying envelope
+        onset = (levels >= thresholdDb) & (levels - self.envelope >= ONSET_RISE_DB)
+        self.envelope = np.maximum(levels, self.envelope - ONSET_DECAY_DB)
+        if onset.any():
+            self.onsets = self.onsets + onset
+
+        # 3. Open at the threshold, close after a while below the hysteresis
+        wasOpen = self.open
+        self.quiet = np.where(levels < thresholdDb - GATE_HYSTERESIS_DB, self.quiet + 1, 0)
+        self.open = (levels >= thresholdDb) | (wasOpen & (self.quiet < GATE_HOLD_CHUNKS))
+        self.levels = levels
+        return bool(self.open.any() or wasOpen.any())
+
+    def reset(self):
+        self.__init__(self.channels)
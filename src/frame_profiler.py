@@ -0,0 +1,319 @@
+# frame_profiler.py
+# Per-frame timing of the game loop's stages and the analyzer, plus
+# on-demand cProfile / sampling captures
+
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pygame
+
+from scenes import Scene
+from settings import *
+
+# Bar colours of the stacked frame graph, by stage
+STAGE_COLOURS = {
+    "wait": (70, 70, 70),
+    "events": (80, 200, 255),
+    "update": (120, 230, 120),
+    "draw": (255, 200, 60),
+    "overlays": (230, 110, 230),
+    "flip": (255, 130, 90),
+}
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# handed out while profiling is off, so a span costs no allocation
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def profiled(name):
+    """
+    Times a method as span `name` of its object's `profiler` attribute
+    (a FrameProfiler or None), e.g. the analyzer's entry points.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None or not profiler.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                profiler.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class StackSampler:
+    """
+    Sampling profiler: a thread records every other thread's Python stack
+    each `interval` seconds. Unlike cProfile it sees the analysis worker and
+    loader threads too, and slows nothing down between samples.
+    """
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        """Folded stacks, one "thread;outer;...;inner count" per line (flamegraph.pl, speedscope)."""
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class FrameProfiler:
+    """
+    Where each frame's time goes, per scene and stage.
+
+    Game.run calls lap(stage) after each stage of the frame (the time since
+    the previous lap) and endFrame() after the flip; spans (span() or the
+    @profiled decorator) time nested work from any thread, such as physics
+    or an analysis pass. Times add up per (scene, stage) over the frame and
+    the totals go into a ring of the last `capacity` frames, which
+    percentiles() and the overlay read.
+
+    Every entry point returns straight away while `enabled` is False, and
+    span() hands out a shared no-op, so a disabled profiler costs one
+    attribute check per call. Showing the overlay (PROFILE_HUD_KEY) enables
+    it; PROFILE_CAPTURE_KEY profiles the next PROFILE_CAPTURE_FRAMES frames
+    to PROFILE_DIR with cProfile (main thread) or the StackSampler (all
+    threads), see PROFILE_CAPTURE_MODE.
+    """
+    def __init__(self, capacity=PROFILE_FRAMES, enabled=PROFILING):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.startEnabled = enabled
+        self.scene = "title"
+        self.names = []    # "scene.stage" of every column
+        self.laps = []     # True for columns timed by lap(), i.e. on the main thread
+        self.columns = {}  # (scene, stage) -> column
+        self.samples = np.full((capacity, PROFILE_MAX_STAGES), np.nan)  # ms
+        self.frames = 0
+        self._current = np.zeros(PROFILE_MAX_STAGES)
+        self._ran = np.zeros(PROFILE_MAX_STAGES, dtype=bool)
+        self._lock = threading.Lock()
+        self._lapStart = time.perf_counter()
+
+        self.capturing = 0  # frames left to capture
+        self._capture = None
+        self._capturePath = None
+
+        self.showHud = False
+        self.font = None
+        self._lines = []  # rendered percentile table
+        self._statsFrame = -1
+        self._statsScene = None
+
+    def setEnabled(self, enabled):
+        if enabled and not self.enabled:
+            # the first lap shouldn't include the time spent disabled
+            self._lapStart = time.perf_counter()
+        self.enabled = enabled
+
+    def _column(self, stage, isLap):
+        key = (self.scene, stage)
+        column = self.columns.get(key)
+        if column is None:
+            with self._lock:
+                column = self.columns.get(key)
+                if column is None:
+                    if len(self.names) == PROFILE_MAX_STAGES:
+                        return None
+                    column = len(self.names)
+                    self.names.append(f"{self.scene}.{stage}")
+                    self.laps.append(isLap)
+                    self.columns[key] = column
+        return column
+
+    def add(self, stage, seconds, isLap=False):
+        """Adds `seconds` to `stage` in the current frame (any thread)."""
+        if not self.enabled:
+            return
+        column = self._column(stage, isLap)
+        if column is None:
+            return
+        with self._lock:
+            self._current[column] += seconds
+            self._ran[column] = True
+
+    def lap(self, stage):
+        """Ends a stage of the frame: the time since the previous lap."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.add(stage, now - self._lapStart, isLap=True)
+        self._lapStart = now
+
+    def span(self, stage):
+        """`with profiler.span("physics"):` adds the block's time to `stage`."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, stage)
+
+    def endFrame(self):
+        """Called once per frame, after the flip."""
+        if self.capturing:
+            self.capturing -= 1
+            if not self.capturing:
+                self._finishCapture()
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples[self.frames % self.capacity] = np.where(self._ran, self._current * 1e3, np.nan)
+            self._current[:] = 0.0
+            self._ran[:] = False
+        self.frames += 1
+
+    def percentiles(self):
+        """{"scene.stage": (p50, p95, p99)} in ms over the frames the stage ran in."""
+        filled = self.samples[:min(self.frames, self.capacity), :len(self.names)]
+        stats = {}
+        for column, name in enumerate(self.names):
+            values = filled[:, column]
+            values = values[~np.isnan(values)]
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                stats[name] = (float(p50), float(p95), float(p99))
+        return stats
+
+    def startCapture(self, frames=PROFILE_CAPTURE_FRAMES, mode=PROFILE_CAPTURE_MODE):
+        if self.capturing:
+            return
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if mode == "sampling":
+            self._capture = StackSampler()
+            self._capturePath = os.path.join(PROFILE_DIR, f"frames-{stamp}.folded")
+            self._capture.start()
+        else:
+            self._capture = cProfile.Profile()
+            self._capturePath = os.path.join(PROFILE_DIR, f"frames-{stamp}.prof")
+            self._capture.enable()
+        self.capturing = frames
+        print(f"Profiling the next {frames} frames ({mode})")
+
+    def _finishCapture(self):
+        capture, path = self._capture, self._capturePath
+        self._capture = None
+        if isinstance(capture, StackSampler):
+            capture.stop()
+            capture.write(path)
+        else:
+            capture.disable()
+            capture.dump_stats(path)
+        print(f"Wrote {path}")
+
+    def handle_events(self, events):
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                if event.key == PROFILE_HUD_KEY:
+                    self.showHud = not self.showHud
+                    self.setEnabled(self.showHud or self.startEnabled)
+                elif event.key == PROFILE_CAPTURE_KEY:
+                    self.startCapture()
+
+    def draw(self, screen):
+        if not self.showHud:
+            return
+        if self.font is None:
+            self.font = Scene.textCache.font(20)
+        # the table is recomputed and rendered a few times a second only
+        if self.frames - self._statsFrame >= FPS // 4 or self._statsScene != self.scene:
+            self._lines = self._renderTable()
+            self._statsFrame = self.frames
+            self._statsScene = self.scene
+
+        # 1. Stacked bars of the current scene's stages, newest on the right
+        graphWidth, graphHeight = PROFILE_GRAPH_FRAMES * 2, 100
+        x0, y0 = 10, SCREEN_HEIGHT // 2 - graphHeight
+        screen.fill(BLACK, (x0 - 5, y0 - 5, graphWidth + 10, graphHeight + 10))
+        scale = graphHeight / (2e3 / FPS)  # the graph is two frame budgets tall
+        stages = [column for column, name in enumerate(self.names)
+                  if self.laps[column] and name.startswith(self.scene + ".")]
+        colours = [STAGE_COLOURS.get(self.names[column].split(".", 1)[1], WHITE) for column in stages]
+        count = min(self.frames, self.capacity, PROFILE_GRAPH_FRAMES)
+        rows = (self.frames - count + np.arange(count)) % self.capacity
+        # bar tops of every stage, stacked from the bottom of the graph
+        tops = y0 + graphHeight - np.minimum(
+            np.cumsum(np.nan_to_num(self.samples[rows][:, stages]), axis=1) * scale, graphHeight).astype(int)
+        for i in range(count):
+            bottom = y0 + graphHeight
+            for top, colour in zip(tops[i].tolist(), colours):
+                if top < bottom:
+                    screen.fill(colour, (x0 + 2 * i, top, 2, bottom - top))
+                    bottom = top
+        budget = y0 + graphHeight - int(1e3 / FPS * scale)
+        pygame.draw.line(screen, RED, (x0, budget), (x0 + graphWidth, budget))
+
+        # 2. Percentiles of every stage of this scene, and the spans
+        y = y0 + graphHeight + 10
+        screen.fill(BLACK, (x0 - 5, y - 3, 230, 16 * len(self._lines) + 6))
+        for text in self._lines:
+            screen.blit(text, (x0, y))
+            y += 16
+
+    def _renderTable(self):
+        lines = [(f"{'ms':<22}{'p50':>6}{'p95':>7}{'p99':>7}", YELLOW)]
+        for name, (p50, p95, p99) in self.percentiles().items():
+            if name.startswith(self.scene + "."):
+                stage = name.split(".", 1)[1]
+                lines.append((f"{stage:<22}{p50:6.1f}{p95:7.1f}{p99:7.1f}", STAGE_COLOURS.get(stage, YELLOW)))
+        return [Scene.textCache.renderUncached(line, self.font, colour) for line, colour in lines]
@@ -1,51 +1,219 @@
 # game.py
 # Main game class that manages scenes
 
-import pygame
+from startup_timer import StartupTimer
+import os
+import threading
+import time
 import pygame
 from settings import *
+from scenes import Scene
 from title_screen import TitleScreen
 from game_screen import GameScreen
 from tuning_screen import TuningScreen
-from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+from analysis_worker import AnalysisWorker
+from note_events import NoteEventTracker
+from quality_scheduler import QualityScheduler
+from latency_trace import LatencyTracer
+from frame_profiler import FrameProfiler
+from scene_registry import SceneRegistry
+from session_log import SessionRecorder
 
 class Game:
-    def __init__(self):
+    def __init__(self, source=None, fastStartup=FAST_STARTUP, dspProcess=DSP_PROCESS,
+                 autoQuality=AUTO_QUALITY, record=RECORD_SESSIONS):
+        """
+        source: optional AudioSource, the microphone when omitted. With
+        dspProcess it is built in the child, so pass a picklable factory
+        instead, e.g. functools.partial(SyntheticSource, 44100, 1024).
+        fastStartup: show the title screen straight away and load librosa and
+        the analyzer on a background thread (see loaded / waitUntilLoaded).
+        dspProcess: capture and analyse in a child process (see dsp_process.py).
+        autoQuality: trade analysis quality for frame rate (see quality_scheduler.py).
+        record: log the session under RECORD_DIR for replay (see session_log.py).
+        """
+        self.startup = StartupTimer()
         pygame.init()
+        # fonts cached by an earlier Game are invalid after its pygame.quit()
+        Scene.textCache.clear()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Music Arkanoid")
+        self.startup.mark("window open")
 
         self.clock = pygame.time.Clock()
         self.running = True
-                
-        self.audio_analyzer = LibrosaAudioAnalyzer()
-        
-        self.scenes = {
-            "title": TitleScreen(self.screen, self),
-            "game": GameScreen(self.screen, self),
-            "tuning": TuningScreen(self.screen, self)
-        }
+
+        # Follows each played note from the mic block to the flipped frame
+        self.latency_tracer = LatencyTracer()
+        # Times every stage of the frame (see frame_profiler.py)
+        self.profiler = FrameProfiler()
+
+        # The title screen needs no audio, the other scenes are registered
+        # once the analyzer is ready and built when first needed
+        self.audio_analyzer = None
+        self.analysis_worker = None
+        self.scenes = SceneRegistry()
+        self.scenes.register("title", lambda: TitleScreen(self.screen, self), next=("game", "tuning"))
+        self.scene_name = "title"
         self.current_scene = self.scenes["title"]
+        self.current_scene.on_enter()
+        self.startup.mark("title scene built")
+
+        self.dspProcess = dspProcess
+        self.autoQuality = autoQuality
+        self.quality = None
+        self.recorder = None
+        if record:
+            if dspProcess:
+                # the audio callback runs in the child
+                print("Session recording needs the analyzer in this process, not recording")
+            else:
+                self.recorder = SessionRecorder(os.path.join(RECORD_DIR, time.strftime("%Y%m%d-%H%M%S")),
+                                                level=BRICK_LEVEL)
+        self.loaded = False
+        self._firstFrameShown = False
+        self._analyzerReady = threading.Event()
+        self._loadError = None
+        if fastStartup:
+            threading.Thread(target=self._loadAnalyzer, args=(source,),
+                             name="AudioLoader", daemon=True).start()
+        else:
+            self._loadAnalyzer(source)
+            self._finishLoading()
+
+    def _loadAnalyzer(self, source):
+        # Runs on the loader thread: the heavy DSP imports and the first
+        # adjustRange happen here
+        try:
+            if self.dspProcess:
+                # librosa is only imported by the child
+                from dsp_process import DspProcessClient
+                analyzer = DspProcessClient(source)
+                analyzer.start()
+            else:
+                from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+                self.startup.mark("DSP modules imported")
+                analyzer = LibrosaAudioAnalyzer(source, channels=INPUT_CHANNELS, recorder=self.recorder)
+                analyzer.warmUp()
+            analyzer.tracer = self.latency_tracer
+            analyzer.profiler = self.profiler
+            self.audio_analyzer = analyzer
+            self.startup.mark("audio analyzer ready")
+        except Exception as e:
+            self._loadError = e
+        self._analyzerReady.set()
+
+    def _finishLoading(self):
+        # Main thread: pygame objects are only created here
+        if self._loadError is not None:
+            raise self._loadError
+        # Pitch and spectrum analysis runs off the render thread; scenes read
+        # analysis_worker.snapshot instead of calling the analyzer directly
+        if self.dspProcess:
+            # the child analyses; its proxy serves the snapshots too
+            self.analysis_worker = self.audio_analyzer
+        else:
+            self.analysis_worker = AnalysisWorker(self.audio_analyzer)
+            self.analysis_worker.recorder = self.recorder
+            self.analysis_worker.profiler = self.profiler
+            self.analysis_worker.start()
+        # played notes reach the scenes as NOTE_ON / NOTE_OFF / PITCH_CHANGE events
+        self.analysis_worker.noteEvents = NoteEventTracker(pygame.event.post)
+        if self.autoQuality:
+            self.quality = QualityScheduler(self.audio_analyzer, self.analysis_worker)
+
+        self.scenes.register("game", self._buildGameScreen, next=("title",))
+        self.scenes.register("tuning", lambda: TuningScreen(self.screen, self), next=("title",))
+        # built in the background from here on, while the title screen runs
+        self.scenes.enter(self.scene_name)
+        self.loaded = True
+        self.startup.mark("audio scenes registered")
+        self._reportStartup()
+
+    def _buildGameScreen(self):
+        scene = GameScreen(self.screen, self)
+        if self.recorder is not None:
+            self.recorder.meta.setdefault("lives", scene.lives)
+        return scene
+
+    def _reportStartup(self):
+        # once both the first frame and the audio are up
+        if self.loaded and self._firstFrameShown:
+            self.startup.report()
+
+    def pollLoading(self):
+        """Finishes start-up once the background load is done."""
+        if not self.loaded and self._analyzerReady.is_set():
+            self._finishLoading()
+
+    def waitUntilLoaded(self):
+        self._analyzerReady.wait()
+        self.pollLoading()
 
     def change_scene(self, scene_name):
-        if scene_name in self.scenes:
-            self.current_scene = self.scenes[scene_name]
+        # scenes waiting for the analyzer aren't registered yet
+        if scene_name not in self.scenes:
+            return
+        start = time.perf_counter()
+        how = self.scenes.status(scene_name)
+        scene = self.scenes[scene_name]
+        self.current_scene.on_exit()
+        self.scenes.beginTransition(self.scene_name, scene_name, how, start)
+        self.current_scene = scene
+        self.scene_name = scene_name
+        self.profiler.scene = scene_name
+        if self.audio_analyzer is not None:
+            # the CQT only runs while a scene shows the spectrum
+            self.audio_analyzer.setSpectrumWanted(scene.wantsSpectrum)
+        scene.on_enter()
+        self.scenes.enter(scene_name)
 
     def run(self):
+        profiler = self.profiler
         while self.running:
             dt = self.clock.tick(FPS) / 1000.0  # Delta time in seconds
-            self.audio_analyzer.update()
+            profiler.lap("wait")
+            frameStart = time.perf_counter()
+            self.pollLoading()
+            if self.audio_analyzer is not None:
+                self.audio_analyzer.update()
             events = pygame.event.get()
             for event in events:
                 if event.type == pygame.QUIT:
                     self.running = False
 
+            self.latency_tracer.handle_events(events)
+            if self.quality is not None:
+                self.quality.handle_events(events)
+            profiler.handle_events(events)
             self.current_scene.handle_events(events)
+            profiler.lap("events")
             self.current_scene.update(dt)
+            profiler.lap("update")
             self.current_scene.draw()
+            profiler.lap("draw")
+            self.latency_tracer.draw(self.screen)
+            if self.quality is not None:
+                self.quality.draw(self.screen)
+            profiler.draw(self.screen)
+            profiler.lap("overlays")
 
             pygame.display.flip()
+            profiler.lap("flip")
+            self.latency_tracer.markFlip()
+            if self.quality is not None:
+                self.quality.markFrame(time.perf_counter() - frameStart)
+            profiler.endFrame()
+            self.scenes.markFrame()
+            if not self._firstFrameShown:
+                self.startup.mark("first frame shown")
+                self._firstFrameShown = True
+                self._reportStartup()
 
+        if self.analysis_worker is not None:
+            self.analysis_worker.stop()
+        if self.recorder is not None:
+            self.recorder.close()
         pygame.quit()
 
         
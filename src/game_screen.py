@@ -1,12 +1,23 @@
 # game_screen.py
 # Main game screen scene
 
+import numpy as np
 import pygame
 import pymunk
 
+from bricks import BrickField
+from note_events import NOTE_ON, NOTE_OFF, PITCH_CHANGE
+from paddle_controller import PaddleController
 from scenes import Scene
 from settings import *
 
+
+def interpolate(previous, current, alpha):
+    """Render position between the last two physics steps."""
+    return (previous[0] + (current[0] - previous[0]) * alpha,
+            previous[1] + (current[1] - previous[1]) * alpha)
+
+
 class Ball:
     def __init__(self, space, x, y):
         self.radius = BALL_RADIUS
@@ -22,16 +33,22 @@ class Ball:
         self.shape = pymunk.Circle(self.body, self.radius)
         self.shape.elasticity = 1.0  # Perfect bounce
         self.shape.friction = 0.0
+        self.shape.collision_type = BALL_COLLISION_TYPE
         
         space.add(self.body, self.shape)
+        self.prevPosition = tuple(self.body.position)
+
+    def savePosition(self):
+        self.prevPosition = tuple(self.body.position)
 
-    def draw(self, screen):
-        pos = self.body.position
-        pygame.draw.circle(screen, RED, (int(pos.x), int(pos.y)), self.radius)
+    def draw(self, screen, alpha=1.0):
+        x, y = interpolate(self.prevPosition, self.body.position, alpha)
+        pygame.draw.circle(screen, RED, (int(x), int(y)), self.radius)
         
 class Paddle:
-    def __init__(self, space, x, y):
+    def __init__(self, space, x, y, colour=WHITE):
         self.width = PADDLE_WIDTH
+        self.colour = colour
         self.height = PADDLE_HEIGHT
         
         # Kinematic body
@@ -62,20 +79,30 @@ class Paddle:
         self.shape.friction = 0.3    # Friction allows "spinning" the ball on hit
         
         space.add(self.body, self.shape)
+        self.prevPosition = tuple(self.body.position)
+
+    def update(self, target_x, dt=None):
+        if dt is None:
+            # Update position
+            self.body.position = (target_x, self.body.position.y)
+        else:
+            # Move there over the next step, so pymunk sees the paddle's
+            # speed when it hits the ball instead of a teleport
+            self.body.velocity = ((target_x - self.body.position.x) / dt, 0)
 
-    def update(self, target_x):
-        # Update position
-        self.body.position = (target_x, self.body.position.y)
+    def savePosition(self):
+        self.prevPosition = tuple(self.body.position)
 
-    def draw(self, screen):
+    def draw(self, screen, alpha=1.0):
         # Convert Pymunk vertices to world coordinates for Pygame
-        ps = [self.body.local_to_world(v) for v in self.vertices]
+        x, y = interpolate(self.prevPosition, self.body.position, alpha)
+        ps = [(x + vx, y + vy) for vx, vy in self.vertices]
         # Draw the convex polygon
-        pygame.draw.polygon(screen, WHITE, ps)
+        pygame.draw.polygon(screen, self.colour, ps)
 
 
 class GameScreen(Scene):
-    def __init__(self, screen, game):
+    def __init__(self, screen, game, level=BRICK_LEVEL):
         super().__init__(screen, game)
         self.audio_analyzer = game.audio_analyzer
 
@@ -83,19 +110,60 @@ class GameScreen(Scene):
         self.space = pymunk.Space()
         self.space.gravity = (0, 0)
 
-        # Instantiate Classes
-        self.paddle = Paddle(self.space, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50)
+        # Instantiate Classes: one paddle per input channel, each in its
+        # own lane of the screen
+        channels = len(game.analysis_worker.snapshot.noteIndices)
+        self.laneWidth = SCREEN_WIDTH / channels
+        self.paddles = [Paddle(self.space, self.laneWidth * (i + 0.5), SCREEN_HEIGHT - 50,
+                               PADDLE_COLOURS[i % len(PADDLE_COLOURS)])
+                        for i in range(channels)]
+        self.paddle = self.paddles[0]
+        # filters every analysis result into paddle positions. It needs each
+        # pass, not just the note changes the NOTE_* events report, to follow
+        # slides and confirm jumps. None maps the notes played straight to
+        # the lanes instead, from the events
+        self.controller = PaddleController(channels) if PADDLE_FILTER else None
+        # last note played on each channel, without the filter; NOTE_OFF
+        # leaves it, so a paddle stays where its note put it
+        self.noteIndices = np.zeros(channels, dtype=int)
         self.ball = Ball(self.space, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
 
         # Add static boundaries (walls)
         self._setup_walls()
 
-        # Initialize lives
+        # Bricks
+        self.bricks = None
+        self.load_level(*BRICK_LEVELS[level])
+
+        # The mouse overrides the played note (handy without an instrument);
+        # a session replay sets mouseX instead of moving the real pointer
+        self.useMouse = MOUSE_CONTROL
+        self.mouseX = None
+        # snapshot seqs of the first and last note event handled this frame,
+        # for the session log
+        self.eventSeqs = (-1, -1)
+
+        # Initialize lives and score
         self.lives = 3
+        self.score = 0
+
+        # Fixed timestep state: unsimulated real time and how far the
+        # renderer is between the last two physics steps
+        self.fixed_dt = 1.0 / PHYSICS_HZ
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.droppedTime = 0.0  # real time discarded by the catch-up cap
 
     def reset_ball(self):
         self.ball.body.position = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
         self.ball.body.velocity = (300, -300)
+        # no interpolated streak across the screen
+        self.ball.savePosition()
+
+    def load_level(self, rows, cols):
+        if self.bricks is not None:
+            self.bricks.remove()
+        self.bricks = BrickField(self.space, rows, cols)
 
     def _setup_walls(self):
         walls = [
@@ -107,25 +175,91 @@ class GameScreen(Scene):
             wall.elasticity = 1.0
             self.space.add(wall)
 
+    def on_exit(self):
+        # after a game over the next game starts from a fresh scene, preloaded
+        # while the title screen shows; a recorded session holds one game
+        if self.lives <= 0 and self.game.recorder is None:
+            self.game.scenes.discard("game")
+
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.game.change_scene("title")
-
+            elif event.type in (NOTE_ON, NOTE_OFF, PITCH_CHANGE):
+                seq = event.snapshot.seq
+                first = self.eventSeqs[0]
+                self.eventSeqs = (seq if first < 0 else min(first, seq), max(self.eventSeqs[1], seq))
+                if (self.controller is None and event.type != NOTE_OFF
+                        and event.channel < len(self.paddles)):
+                    self.noteIndices[event.channel] = event.noteIndex
+                    self.game.latency_tracer.markApplied(event.snapshot)
 
     def update(self, dt):
-        # 1. Update Paddle position via Audio Note
-        _, _, note_index = self.audio_analyzer.getNoteIndex()
-        target_x = SCREEN_WIDTH * (note_index % 12) / 12
+        # 1. Update Paddle positions from the notes played, one channel each
+        lanes = self.laneWidth * np.arange(len(self.paddles))
+        if self.controller is not None:
+            snapshot = self.game.analysis_worker.snapshot
+            self.controller.advance(dt)
+            self.controller.measure(snapshot)
+            self.game.latency_tracer.markApplied(snapshot)
+            positions = self.controller.positions()
+        else:
+            positions = (self.noteIndices % 12) / 12
+        targets = (lanes + self.laneWidth * positions).tolist()
 
-        target_x, _ = pygame.mouse.get_pos()
-
-        self.paddle.update(target_x)
+        mouseX = None
+        if self.useMouse:
+            mouseX = pygame.mouse.get_pos()[0] if self.mouseX is None else self.mouseX
+            targets[0] = mouseX
 
         # 2. Advance Physics
-        self.space.step(1/60.0)
+        if not FIXED_TIMESTEP:
+            for paddle, target_x in zip(self.paddles, targets):
+                paddle.update(target_x)
+            self.space.step(1/60.0)
+            self.break_bricks()
+            self.check_ball_lost()
+        else:
+            self.step_fixed(dt, targets)
+
+        # Log the tick when the session is being recorded
+        if self.game.recorder is not None:
+            self.game.recorder.recordTick(self, dt, mouseX)
+        self.eventSeqs = (-1, -1)
+
+    def step_fixed(self, dt, targets):
+        # Fixed steps over the real time that passed, at most
+        # MAX_PHYSICS_STEPS of them; anything beyond that is dropped
+        self.accumulator += dt
+        steps = 0
+        with self.game.profiler.span("physics"):
+            while self.accumulator >= self.fixed_dt and steps < MAX_PHYSICS_STEPS:
+                self.ball.savePosition()
+                for paddle, target_x in zip(self.paddles, targets):
+                    paddle.savePosition()
+                    paddle.update(target_x, self.fixed_dt)
+                for _ in range(PHYSICS_SUBSTEPS):
+                    self.space.step(self.fixed_dt / PHYSICS_SUBSTEPS)
+                self.break_bricks()
+                self.accumulator -= self.fixed_dt
+                steps += 1
+                if self.check_ball_lost():
+                    break
+        if self.accumulator >= self.fixed_dt:
+            self.droppedTime += self.accumulator - self.accumulator % self.fixed_dt
+            self.accumulator %= self.fixed_dt
+        self.alpha = self.accumulator / self.fixed_dt
+
+    def break_bricks(self):
+        # hits from the whole step are removed together
+        self.score += self.bricks.flushHits()
+        if self.bricks.remaining == 0 and len(self.bricks.alive):
+            # level cleared: start it again
+            self.bricks.reset()
+            self.reset_ball()
 
+    def check_ball_lost(self):
         # 3. Game Over check
         if self.ball.body.position.y > SCREEN_HEIGHT:
             self.lives -= 1
@@ -133,13 +267,19 @@ class GameScreen(Scene):
                 self.reset_ball()
             else:
                 self.game.change_scene("title")
+            return True
+        return False
 
     def draw(self):
-        self.screen.fill(BLACK)
-        self.paddle.draw(self.screen)
-        self.ball.draw(self.screen)
+        self.bricks.draw(self.screen)
+        alpha = self.alpha if FIXED_TIMESTEP else 1.0
+        for paddle in self.paddles:
+            paddle.draw(self.screen, alpha)
+        self.ball.draw(self.screen, alpha)
         
         # Draw lives
-        font = pygame.font.SysFont(None, 24)
-        text = font.render(f"Lives: {self.lives}", True, WHITE)
-        self.screen.blit(text, (10, 10))
\ No newline at end of file
+        font = self.getFont(24, sysfont=True)
+        text = self.renderText(f"Lives: {self.lives}", font, WHITE)
+        self.screen.blit(text, (10, 10))
+        text = self.renderText(f"Score: {self.score}", font, WHITE)
+        self.screen.blit(text, (SCREEN_WIDTH - text.get_width() - 10, 10))
\ No newline at end of file
@@ -0,0 +1,269 @@
+# headless.py
+# Runs GameScreen without a window, microphone or frame clock
+#
+# python headless.py --duration 120
+# python headless.py --sessions 8 --processes 4 --level stress
+# python headless.py --wav take1.wav --frames frames --frame-every 30
+# python headless.py --wav take1.wav --record sessions/take1
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Must be set before pygame creates the display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from settings import *
+from analysis_worker import AnalysisSnapshot
+from frame_profiler import FrameProfiler
+from latency_trace import LatencyTracer
+from note_events import NoteEventTracker
+from scenes import Scene
+from session_log import SessionRecorder
+
+
+class ScriptedNotes:
+    """
+    A note stream from a script of (time, noteIndex) pairs, sorted by time.
+    noteIndex counts semitones above the analyzer's minNote, as in
+    AnalysisSnapshot; None is silence, which holds the last note like the
+    analysis worker does.
+    """
+    def __init__(self, script, recorder=None):
+        self.times = np.array([t for t, _ in script], dtype=np.float64)
+        self.notes = [note for _, note in script]
+        self.snapshot = AnalysisSnapshot(-1, 0.0, 0.0, float("nan"), 0.0, "No strong note",
+                                         0, (), np.zeros(0), np.zeros(0),
+                                         np.full(1, np.nan), np.zeros(1), np.zeros(1, dtype=int),
+                                         np.zeros((1, 0)), np.full(1, SILENCE_DB),
+                                         np.zeros(1, dtype=np.int64))
+        self.recorder = recorder
+        self._index = -1
+
+    @classmethod
+    def random(cls, duration, interval=0.5, seed=0):
+        """A new random note every `interval` seconds, over one octave."""
+        rng = np.random.default_rng(seed)
+        times = np.arange(0.0, duration, interval)
+        return cls(list(zip(times.tolist(), rng.integers(0, 12, len(times)).tolist())))
+
+    def advance(self, simTime):
+        index = int(np.searchsorted(self.times, simTime, side="right")) - 1
+        if index == self._index:
+            return
+        self._index = index
+        note = self.notes[index] if index >= 0 else None
+        if note is None:
+            self.snapshot = self.snapshot._replace(seq=index + 1, pitch=float("nan"), voicedProb=0.0,
+                                                   pitches=np.full(1, np.nan), voicedProbs=np.zeros(1),
+                                                   levels=np.full(1, SILENCE_DB))
+        else:
+            # every scripted note is struck anew
+            self.snapshot = self.snapshot._replace(seq=index + 1, pitch=0.0, voicedProb=1.0,
+                                                   strongestNote=str(note), noteIndex=note,
+                                                   pitches=np.zeros(1), voicedProbs=np.ones(1),
+                                                   noteIndices=np.array([note]), levels=np.zeros(1),
+                                                   onsets=self.snapshot.onsets + 1)
+        if self.recorder is not None:
+            self.recorder.recordAnalysis(self.snapshot)
+
+
+class RecordedNotes:
+    """
+    A note stream from audio played through the real analyzer. The source is
+    driven by simulated time (speed=0) and analysed synchronously at
+    ANALYSIS_RATE, so a run gives the same result however fast it goes.
+    pyin is far slower than real time, so the streaming tracker is the default.
+    """
+    def __init__(self, source, pitchMode="streaming", recorder=None):
+        from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+        from analysis_worker import AnalysisWorker
+        if isinstance(source, str):
+            from audio_sources import FileSource
+            source = FileSource(source, 44100, 1024, speed=0)
+        self.source = source
+        self.analyzer = LibrosaAudioAnalyzer(source, recorder=recorder)
+        self.analyzer.setPitchMode(pitchMode)
+        # never started: analyzeOnce is called on simulated time instead
+        self.worker = AnalysisWorker(self.analyzer)
+        self.worker.recorder = recorder
+        self.blockTime = self.analyzer.CHUNK / self.analyzer.RATE
+        self.nextAnalysis = 0.0
+        # keep librosa's lazy imports out of the timed run
+        self.analyzer.warmUp()
+        self.advance(0.0)
+
+    @property
+    def snapshot(self):
+        return self.worker.snapshot
+
+    def advance(self, simTime):
+        due = int(simTime / self.blockTime) - self.source.blocksDelivered
+        if due > 0:
+            self.source.pump(self.analyzer._audio_callback, due)
+        while self.nextAnalysis <= simTime:
+            self.worker.analyzeOnce()
+            self.nextAnalysis += 1.0 / ANALYSIS_RATE
+
+    def close(self):
+        self.source.close()
+
+
+class HeadlessGame:
+    """The parts of Game a GameScreen uses, with the note stream in place of the worker."""
+    def __init__(self, notes, level=BRICK_LEVEL, recorder=None):
+        pygame.init()
+        # sessions run one after another in a pool worker
+        Scene.textCache.clear()
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.notes = notes
+        self.audio_analyzer = getattr(notes, "analyzer", None)
+        self.analysis_worker = notes
+        self.latency_tracer = LatencyTracer()
+        self.profiler = FrameProfiler(enabled=False)
+        self.recorder = recorder
+        self.scene_name = "game"
+
+        from game_screen import GameScreen
+        self.scene = GameScreen(self.screen, self, level)
+        self.scene.useMouse = False
+
+    def change_scene(self, scene_name):
+        # GameScreen only leaves for the title screen, on game over
+        self.scene_name = scene_name
+
+
+def runSession(script=None, wav=None, duration=60.0, dt=1.0 / FPS, level=BRICK_LEVEL,
+               frameEvery=0, framesDir=None, seed=0, pitchMode="streaming", lives=None,
+               recordDir=None):
+    """
+    Plays one game for `duration` simulated seconds (or until game over) as
+    fast as the CPU allows. Frames are drawn only every `frameEvery` ticks,
+    and saved as PNGs when framesDir is given. With recordDir the session
+    is logged there for session_log.py to replay.
+    """
+    recorder = SessionRecorder(recordDir, level=level) if recordDir else None
+    if wav is not None:
+        notes = RecordedNotes(wav, pitchMode, recorder)
+    elif script is not None:
+        notes = ScriptedNotes(script, recorder)
+    else:
+        notes = ScriptedNotes.random(duration, seed=seed)
+        notes.recorder = recorder
+    game = HeadlessGame(notes, level, recorder)
+    scene = game.scene
+    if lives is not None:
+        scene.lives = lives
+    if recorder is not None:
+        recorder.meta["lives"] = scene.lives
+    if framesDir:
+        os.makedirs(framesDir, exist_ok=True)
+
+    # the note events Game would post, handed straight to the scene
+    noteEvents = NoteEventTracker()
+    ticks = 0
+    frames = 0
+    simTime = 0.0
+    start = time.perf_counter()
+    while simTime < duration and game.scene_name == "game":
+        notes.advance(simTime)
+        scene.handle_events(noteEvents.update(notes.snapshot))
+        scene.update(dt)
+        ticks += 1
+        simTime = ticks * dt
+        if frameEvery and ticks % frameEvery == 0:
+            scene.draw()
+            frames += 1
+            if framesDir:
+                pygame.image.save(game.screen, os.path.join(framesDir, f"frame_{ticks:06d}.png"))
+    wall = time.perf_counter() - start
+
+    if isinstance(notes, RecordedNotes):
+        notes.close()
+    if recorder is not None:
+        recorder.close()
+    pygame.quit()
+    return {
+        "seed": seed,
+        "simSeconds": simTime,
+        "wallSeconds": wall,
+        "speedup": simTime / wall if wall > 0 else float("inf"),
+        "ticks": ticks,
+        "framesDrawn": frames,
+        "gameOver": game.scene_name != "game",
+        "lives": scene.lives,
+        "score": scene.score,
+        "bricksLeft": int(scene.bricks.remaining),
+    }
+
+
+def _runSessionKwargs(kwargs):
+    return runSession(**kwargs)
+
+
+def runSessions(sessions, processes=None):
+    """Runs independent sessions (runSession keyword dicts) in worker processes."""
+    if processes == 1:
+        return [runSession(**kwargs) for kwargs in sessions]
+    # every worker gets its own pygame and pymunk state
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_runSessionKwargs, sessions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play GameScreen headlessly, faster than real time.")
+    parser.add_argument("--duration", type=float, default=60.0, help="simulated seconds per session")
+    parser.add_argument("--dt", type=float, default=1.0 / FPS, help="simulated seconds per tick")
+    parser.add_argument("--level", default=BRICK_LEVEL, choices=sorted(BRICK_LEVELS))
+    parser.add_argument("--lives", type=int, help="lives to start with (default as in the game)")
+    parser.add_argument("--script", help="JSON list of [time, noteIndex] pairs to play")
+    parser.add_argument("--wav", help="recording to analyse instead of a script (44.1 kHz)")
+    parser.add_argument("--pitch-mode", default="streaming", choices=["pyin", "piptrack", "streaming"],
+                        help="pitch estimator for --wav (default streaming; pyin is slower than real time)")
+    parser.add_argument("--sessions", type=int, default=1,
+                        help="independent sessions; unscripted ones get random notes seeded 0..N-1")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--frame-every", type=int, default=0, help="draw every Nth tick (0: never)")
+    parser.add_argument("--frames", help="directory to save drawn frames in (one session only)")
+    parser.add_argument("--out", help="write the session results here (JSON)")
+    parser.add_argument("--record", help="log the session here for session_log.py (one session only)")
+    args = parser.parse_args(argv)
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = [tuple(pair) for pair in json.load(f)]
+    sessions = [dict(script=script, wav=args.wav, duration=args.duration, dt=args.dt,
+                     level=args.level, frameEvery=args.frame_every,
+                     framesDir=args.frames if args.sessions == 1 else None, seed=i,
+                     pitchMode=args.pitch_mode, lives=args.lives,
+                     recordDir=args.record if args.sessions == 1 else None)
+                for i in range(args.sessions)]
+
+    start = time.perf_counter()
+    results = runSessions(sessions, args.processes)
+    wall = time.perf_counter() - start
+
+    for r in results:
+        print(f"session {r['seed']:3d}: {r['simSeconds']:8.1f} sim s in {r['wallSeconds']:6.2f} s "
+              f"({r['speedup']:7.1f}x)  score {r['score']:4d}  lives {r['lives']}"
+              f"{'  game over' if r['gameOver'] else ''}")
+    simTotal = sum(r["simSeconds"] for r in results)
+    print(f"\n{simTotal:.1f} simulated seconds in {wall:.2f} wall seconds "
+          f"= {simTotal / wall:.1f} sim s per wall s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"sessions": results, "wallSeconds": wall}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# latency_trace.py
+# Timestamps a played note from the microphone block to the displayed frame
+
+import csv
+import json
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+import pygame
+
+from scenes import Scene
+from settings import *
+
+# One analysed chunk followed all the way to the screen. All times are
+# time.perf_counter() seconds.
+TraceEvent = namedtuple("TraceEvent", [
+    "seq",            # recording.seq of the analysis (newest chunk is seq - 1)
+    "frame",          # Game.run frame the result was applied in
+    "capture",        # ADC time of the newest chunk in the analysed window
+    "analysisStart",
+    "analysisEnd",
+    "applied",        # Paddle.update with the new result
+    "flipped",        # pygame.display.flip() of that frame
+])
+
+# (name, start field, end field) of each stage in the breakdown
+STAGES = [
+    ("buffer", "capture", "analysisStart"),     # block + wait for the next analysis
+    ("analysis", "analysisStart", "analysisEnd"),
+    ("publish", "analysisEnd", "applied"),      # wait for the next game tick
+    ("present", "applied", "flipped"),          # rest of the frame up to the flip
+    ("total", "capture", "flipped"),
+]
+
+
+class LatencyTracer:
+    """
+    Collects the timestamps of the mic -> analysis -> paddle -> flip chain.
+
+    The audio callback records when each chunk was captured, GameScreen marks
+    the frame a new analysis result moves the paddle and Game.run marks the
+    flip; every result that reaches the screen becomes one TraceEvent.
+    """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        # capture time of chunk i lives at i % capacity
+        self.captureTimes = np.full(capacity, np.nan)
+        self.events = deque(maxlen=capacity)
+        self.frame = 0
+        self.lastSeq = -1
+        self._pending = None
+        self.showHud = False
+        self.font = None
+
+    def markCapture(self, chunkIndex, frames, samplerate, timeInfo):
+        """Called from the audio callback before the chunk is published."""
+        now = time.perf_counter()
+        if timeInfo is None:
+            age = frames / samplerate
+        else:
+            # how long ago, on the stream clock, the first sample hit the ADC
+            age = timeInfo.currentTime - timeInfo.inputBufferAdcTime
+        self.captureTimes[chunkIndex % self.capacity] = now - age
+
+    def markApplied(self, snapshot):
+        """Called when an analysis result is applied to the paddle."""
+        if snapshot.seq <= self.lastSeq or snapshot.seq <= 0:
+            return
+        self.lastSeq = snapshot.seq
+        capture = self.captureTimes[(snapshot.seq - 1) % self.capacity]
+        if np.isnan(capture):
+            # captured before the tracer was attached
+            return
+        self._pending = (snapshot.seq, self.frame, capture, snapshot.analysisStart,
+                         snapshot.time, time.perf_counter())
+
+    def markFlip(self):
+        """Called right after pygame.display.flip()."""
+        if self._pending is not None:
+            self.events.append(TraceEvent(*self._pending, time.perf_counter()))
+            self._pending = None
+        self.frame += 1
+
+    def breakdown(self, events=None):
+        """Per-stage latency in ms, one row per event: {stage: np.array}."""
+        events = list(self.events) if events is None else events
+        columns = {field: np.array([getattr(e, field) for e in events], dtype=np.float64)
+                   for field in TraceEvent._fields}
+        return {name: (columns[end] - columns[start]) * 1e3 for name, start, end in STAGES}
+
+    def summary(self, last=120):
+        """{stage: (mean_ms, p95_ms)} over the most recent `last` events."""
+        events = list(self.events)[-last:]
+        if not events:
+            return {}
+        result = {}
+        for name, values in self.breakdown(events).items():
+            values = values[~np.isnan(values)]
+            if len(values):
+                result[name] = (float(values.mean()), float(np.percentile(values, 95)))
+        return result
+
+    def export(self, path):
+        """Writes every event and its breakdown to .csv or .json."""
+        events = list(self.events)
+        stages = self.breakdown(events)
+        rows = []
+        for i, event in enumerate(events):
+            row = event._asdict()
+            row.update({f"{name}_ms": float(stages[name][i]) for name, _, _ in STAGES})
+            rows.append(row)
+
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"events": rows, "summary": self.summary(len(rows))}, f, indent=2)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(TraceEvent._fields) +
+                                        [f"{name}_ms" for name, _, _ in STAGES])
+                writer.writeheader()
+                writer.writerows(rows)
+        return len(rows)
+
+    def handle_events(self, events):
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                if event.key == LATENCY_HUD_KEY:
+                    self.showHud = not self.showHud
+                elif event.key == LATENCY_EXPORT_KEY:
+                    count = self.export(LATENCY_EXPORT_FILE)
+                    print(f"Wrote {count} latency events to {LATENCY_EXPORT_FILE}")
+
+    def draw(self, screen):
+        if not self.showHud:
+            return
+        if self.font is None:
+            self.font = Scene.textCache.font(22)
+        lines = ["latency ms   mean    p95"]
+        for name, (mean, p95) in self.summary().items():
+            lines.append(f"{name:<10}{mean:7.1f}{p95:7.1f}")
+        if len(lines) == 1:
+            lines.append("no notes traced yet")
+        y = 10
+        for line in lines:
+            text = Scene.textCache.renderUncached(line, self.font, YELLOW)
+            screen.blit(text, (SCREEN_WIDTH - 220, y))
+            y += 18
@@ -0,0 +1,62 @@
+# note_events.py
+# Note on / off / pitch change events built from the analysis results
+
+import numpy as np
+import pygame
+
+# Every event carries channel, noteIndex (semitones above minNote), pitch in
+# Hz, voicedProb and the AnalysisSnapshot it came from
+NOTE_ON = pygame.event.custom_type()
+NOTE_OFF = pygame.event.custom_type()
+PITCH_CHANGE = pygame.event.custom_type()  # also has previous, the last noteIndex
+
+
+class NoteEventTracker:
+    """
+    Compares each new AnalysisSnapshot with the last one, per channel:
+    NOTE_ON when a channel becomes voiced or is struck again (a new onset),
+    NOTE_OFF when it goes quiet and PITCH_CHANGE when a sounding note moves
+    to another semitone. Scenes get them in handle_events.
+
+    post: called with every event, e.g. pygame.event.post. update() returns
+    them as well.
+    """
+    def __init__(self, post=None):
+        self.post = post
+        self.seq = None
+        self.sounding = np.zeros(0, dtype=int)  # noteIndex per channel, -1 when quiet
+        self.onsets = np.zeros(0, dtype=np.int64)
+
+    def update(self, snapshot):
+        if snapshot.seq == self.seq:
+            return []
+        self.seq = snapshot.seq
+        notes = np.where(np.isnan(snapshot.pitches), -1, snapshot.noteIndices)
+        if len(notes) != len(self.sounding):
+            self.sounding = np.full(len(notes), -1)
+            self.onsets = snapshot.onsets
+
+        # a new onset on a sounding channel ends its note and starts another
+        struck = (notes >= 0) & (self.sounding >= 0) & (snapshot.onsets > self.onsets)
+        events = []
+        for channel in np.nonzero((notes != self.sounding) | struck)[0].tolist():
+            before, after = int(self.sounding[channel]), int(notes[channel])
+            if before >= 0 and (after < 0 or struck[channel]):
+                events.append(self._event(NOTE_OFF, channel, before, snapshot))
+            if after >= 0 and (before < 0 or struck[channel]):
+                events.append(self._event(NOTE_ON, channel, after, snapshot))
+            elif after >= 0:
+                events.append(self._event(PITCH_CHANGE, channel, after, snapshot, previous=before))
+        self.sounding = notes
+        self.onsets = snapshot.onsets
+
+        if self.post is not None:
+            for event in events:
+                self.post(event)
+        return events
+
+    def _event(self, type, channel, noteIndex, snapshot, **extra):
+        return pygame.event.Event(type, channel=channel, noteIndex=noteIndex,
+                                  pitch=float(snapshot.pitches[channel]),
+                                  voicedProb=float(snapshot.voicedProbs[channel]),
+                                  snapshot=snapshot, **extra)
@@ -0,0 +1,284 @@
+# paddle_controller.py
+# Filters the analysed pitch into paddle positions, hiding analysis latency
+#
+# python paddle_controller.py --session sessions/20261017-201500
+# python paddle_controller.py --wav take1.wav --alpha 0.3 0.5 0.8 --predict 0 0.05
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from settings import *
+
+
+class PaddleController:
+    """
+    Pitch-to-paddle stage: an alpha-beta filter over the pitch of every
+    channel, in cents above the analyzer's minNote, run as one vectorised
+    update per analysis result.
+
+    Every measurement is compared with the filter's prediction:
+      - off by a whole octave (within octaveTolerance) it is an octave error
+        of the pitch estimator and is folded back; the paddle follows the
+        pitch class anyway
+      - within jumpCents it is tracked: the error is corrected by alpha and
+        fed into the velocity by beta
+      - further away it is a jump. With a new onset, or once `confirm`
+        measurements in a row agree on it, the filter snaps to the new note;
+        until then it is an outlier and ignored
+
+    The paddle is placed `predict` seconds ahead along the estimated pitch
+    velocity (at most maxPredictCents), which hides part of the analysis
+    latency during slides and vibrato. Higher alpha / beta and lower confirm
+    follow the player sooner; lower ones are steadier. evaluate() measures
+    both on recorded input.
+
+    Time is whatever advance() is given (GameScreen's dt), so the filter is
+    as deterministic as the game.
+    """
+    def __init__(self, channels=1, alpha=PADDLE_ALPHA, beta=PADDLE_BETA, jumpCents=PADDLE_JUMP_CENTS,
+                 confirm=PADDLE_CONFIRM, octaveTolerance=PADDLE_OCTAVE_TOLERANCE,
+                 predict=PADDLE_PREDICT, maxPredictCents=PADDLE_MAX_PREDICT_CENTS):
+        self.channels = channels
+        self.alpha = alpha
+        self.beta = beta
+        self.jumpCents = jumpCents
+        self.confirm = confirm
+        self.octaveTolerance = octaveTolerance
+        self.predict = predict
+        self.maxPredictCents = maxPredictCents
+
+        self.time = 0.0
+        self.seq = None
+        self.cents = np.zeros(channels)      # filtered pitch at lastTime
+        self.velocity = np.zeros(channels)   # cents per second
+        self.lastTime = np.zeros(channels)
+        self.tracking = np.zeros(channels, dtype=bool)  # has had a voiced measurement
+        self.pending = np.zeros(channels)    # the jump waiting for confirmation
+        self.pendingCount = np.zeros(channels, dtype=int)
+        self.onsets = None
+
+        # Profiling counters
+        self.measurements = 0
+        self.octaveErrors = 0
+        self.outliers = 0
+        self.jumps = 0
+
+    def advance(self, dt):
+        self.time += dt
+
+    def measure(self, snapshot):
+        """Feeds in an AnalysisSnapshot; one already seen is ignored."""
+        if snapshot is None or snapshot.seq == self.seq:
+            return
+        self.seq = snapshot.seq
+        n = self.channels
+        pitches = np.asarray(snapshot.pitches, dtype=float)[:n]
+        onsets = np.asarray(snapshot.onsets)[:n]
+        if self.onsets is None:
+            self.onsets = onsets
+        voiced = ~np.isnan(pitches)
+        struck = onsets > self.onsets
+        self.onsets = onsets
+
+        # 1. Measured cents: the note index plus how far the pitch is off
+        #    that note (minNote is a tempered note, so A440 gives the offset)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            semitones = 12 * np.log2(pitches / 440.0)
+            detune = np.where(pitches > 0, semitones - np.round(semitones), 0.0)
+        measured = 100 * (np.asarray(snapshot.noteIndices)[:n] + detune)
+
+        # 2. Compare with the prediction, folding octave errors back
+        elapsed = self.time - self.lastTime
+        predicted = self.cents + self.velocity * elapsed
+        residual = measured - predicted
+        octaves = np.round(residual / 1200)
+        octave = voiced & self.tracking & (octaves != 0) & (np.abs(residual - 1200 * octaves) <= self.octaveTolerance)
+        residual = np.where(octave, residual - 1200 * octaves, residual)
+        measured = predicted + residual
+
+        # 3. Jumps need an onset or confirmation; the rest are outliers
+        jump = voiced & self.tracking & (np.abs(residual) > self.jumpCents)
+        agrees = jump & (self.pendingCount > 0) & (np.abs(measured - self.pending) <= self.jumpCents)
+        self.pendingCount = np.where(jump, np.where(agrees, self.pendingCount + 1, 1), 0)
+        self.pending = np.where(jump & ~agrees, measured, self.pending)
+        snap = voiced & (~self.tracking | (jump & (struck | (self.pendingCount >= self.confirm))))
+        track = voiced & self.tracking & ~jump
+        self.pendingCount[snap] = 0
+
+        # 4. Alpha-beta update; silence freezes the paddle where it is
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(elapsed > 0, residual / elapsed, 0.0)
+        self.cents = np.where(track, predicted + self.alpha * residual,
+                              np.where(snap, measured, predicted))
+        self.velocity = np.where(track, self.velocity + self.beta * rate,
+                                 np.where(snap | ~voiced, 0.0, self.velocity))
+        self.lastTime[:] = self.time
+        self.tracking |= voiced
+
+        self.measurements += 1
+        self.octaveErrors += int(octave.sum())
+        self.outliers += int((jump & ~snap).sum())
+        self.jumps += int((jump & snap).sum())
+
+    def positions(self):
+        """
+        Where each paddle belongs in its lane, 0 to 1 like noteIndex % 12 / 12:
+        tempered notes land where the unfiltered mapping puts them, and a
+        pitch between notes lands between them.
+        """
+        ahead = np.clip(self.velocity * (self.time - self.lastTime + self.predict),
+                        -self.maxPredictCents, self.maxPredictCents)
+        semitones = (self.cents + ahead) / 100
+        # a quarter tone either side of C stays at the left edge, not the right
+        return ((semitones + 0.5) % 12 - 0.5) / 12
+
+    def getStats(self):
+        return {
+            "measurements": self.measurements,
+            "octaveErrors": self.octaveErrors,
+            "outliers": self.outliers,
+            "jumps": self.jumps,
+        }
+
+
+def sessionSnapshots(directory):
+    """(seconds, AnalysisSnapshot) of every analysis in a recorded session."""
+    from session_log import SessionLog, snapshotFromRecord
+    log = SessionLog(directory)
+    return [(float(record["time"] - log.start), snapshotFromRecord(record)) for record in log.analysis]
+
+
+def wavSnapshots(path, pitchMode="streaming"):
+    """The same for a recording analysed on simulated time (see headless.RecordedNotes)."""
+    import soundfile as sf
+    from headless import RecordedNotes
+    duration = sf.info(path).duration
+    notes = RecordedNotes(path, pitchMode)
+    timed = []
+    t = 0.0
+    while t < duration:
+        notes.advance(t)
+        if not timed or notes.snapshot.seq != timed[-1][1].seq:
+            timed.append((t, notes.snapshot))
+        t += notes.blockTime
+    notes.close()
+    return timed
+
+
+def _slotChanges(slots):
+    return int((np.diff(slots, axis=0) != 0).sum())
+
+
+def evaluate(timedSnapshots, fps=FPS, settle=0.15, **params):
+    """
+    Plays (seconds, snapshot) pairs through a PaddleController at `fps`
+    frames a second, as GameScreen would, next to the unfiltered mapping:
+      flips   - times a paddle changes note slot, per minute
+      travel  - paddle movement in semitones per second
+      latency - seconds from a note change the unfiltered mapping makes (one
+                that then holds for `settle` seconds) until the filtered
+                paddle is on that note too
+    params go to PaddleController.
+    """
+    channels = len(timedSnapshots[0][1].pitches)
+    controller = PaddleController(channels, **params)
+    end = timedSnapshots[-1][0]
+    frames = int(end * fps) + 1
+    raw = np.zeros((frames, channels))
+    filtered = np.zeros((frames, channels))
+    index = -1
+    for frame in range(frames):
+        t = frame / fps
+        while index + 1 < len(timedSnapshots) and timedSnapshots[index + 1][0] <= t:
+            index += 1
+        if frame:
+            controller.advance(1.0 / fps)
+        if index >= 0:
+            snapshot = timedSnapshots[index][1]
+            controller.measure(snapshot)
+            raw[frame] = np.asarray(snapshot.noteIndices)[:channels] % 12 / 12
+        filtered[frame] = controller.positions()
+
+    def summary(positions):
+        slots = np.round(positions * 12).astype(int) % 12
+        steps = np.diff(positions * 12, axis=0)
+        steps = (steps + 6) % 12 - 6  # the short way round the lane
+        return slots, {
+            "flips": _slotChanges(slots) * 60.0 / max(end, 1e-9),
+            "travel": float(np.abs(steps).sum()) / max(end, 1e-9),
+        }
+
+    rawSlots, rawSummary = summary(raw)
+    slots, filteredSummary = summary(filtered)
+    hold = max(int(settle * fps), 1)
+    latencies = []
+    missed = 0
+    for channel in range(channels):
+        changes = np.nonzero(np.diff(rawSlots[:, channel]))[0] + 1
+        for start, stop in zip(changes, np.append(changes[1:], frames)):
+            if stop - start < hold:
+                continue
+            reached = np.nonzero(slots[start:stop, channel] == rawSlots[start, channel])[0]
+            if len(reached):
+                latencies.append(reached[0] / fps)
+            else:
+                missed += 1
+    filteredSummary.update(
+        latencyMean=float(np.mean(latencies)) if latencies else None,
+        latencyMax=float(np.max(latencies)) if latencies else None,
+        notesMissed=missed,
+        **controller.getStats(),
+    )
+    return {"seconds": end, "unfiltered": rawSummary, "filtered": filteredSummary}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the paddle filter's stability and latency on recorded input.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--session", help="a session recorded by session_log.py")
+    source.add_argument("--wav", help="a recording to analyse (44.1 kHz)")
+    parser.add_argument("--pitch-mode", default="streaming", choices=["pyin", "piptrack", "streaming"],
+                        help="pitch estimator for --wav")
+    parser.add_argument("--alpha", type=float, nargs="+", default=[PADDLE_ALPHA])
+    parser.add_argument("--beta", type=float, nargs="+", default=[PADDLE_BETA])
+    parser.add_argument("--confirm", type=int, nargs="+", default=[PADDLE_CONFIRM])
+    parser.add_argument("--predict", type=float, nargs="+", default=[PADDLE_PREDICT])
+    parser.add_argument("--out", help="write the results here (JSON)")
+    args = parser.parse_args(argv)
+
+    timed = sessionSnapshots(args.session) if args.session else wavSnapshots(args.wav, args.pitch_mode)
+    if not timed:
+        print("no analysis results to evaluate")
+        return 1
+
+    results = []
+    for alpha in args.alpha:
+        for beta in args.beta:
+            for confirm in args.confirm:
+                for predict in args.predict:
+                    params = dict(alpha=alpha, beta=beta, confirm=confirm, predict=predict)
+                    results.append(dict(params, **evaluate(timed, **params)))
+
+    raw = results[0]["unfiltered"]
+    print(f"{results[0]['seconds']:.1f} s of input")
+    print(f"{'':29s}  flips/min  travel st/s  latency ms (mean/max)  missed  outliers")
+    print(f"{'unfiltered':29s}  {raw['flips']:9.1f}  {raw['travel']:11.2f}")
+    for r in results:
+        f = r["filtered"]
+        label = f"a={r['alpha']:g} b={r['beta']:g} c={r['confirm']} p={r['predict']:g}"
+        latency = "-" if f["latencyMean"] is None else f"{f['latencyMean'] * 1e3:5.0f} / {f['latencyMax'] * 1e3:4.0f}"
+        print(f"{label:29s}  {f['flips']:9.1f}  {f['travel']:11.2f}  {latency:>21s}  "
+              f"{f['notesMissed']:6d}  {f['outliers']:8d}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# pitch_tracker.py
+# Incremental, low-latency pitch tracking (a streaming take on pyin)
+
+import numpy as np
+
+
+def _betaTable(a=2.0, b=18.0):
+    # pyin's threshold prior; integrated numerically so we don't need scipy here
+    grid = np.linspace(0.0, 1.0, 2001)
+    pdf = grid ** (a - 1) * (1 - grid) ** (b - 1)
+    cdf = np.cumsum(pdf)
+    return grid, cdf / cdf[-1]
+
+
+_BETA_GRID, _BETA_CDF = _betaTable()
+
+
+def _betaCdf(x):
+    return np.interp(x, _BETA_GRID, _BETA_CDF)
+
+
+class StreamingPitchTracker:
+    """
+    Emits one pitch estimate per newly recorded chunk instead of re-running
+    pyin over the whole ring buffer.
+
+    For every new chunk:
+      1. the YIN cumulative-mean-normalised difference function is computed
+         over the last `frameChunks` chunks only (one FFT, fixed size);
+      2. its troughs become pitch candidates weighted by pyin's beta prior
+         over thresholds;
+      3. an online HMM forward step (the same voiced/unvoiced pitch-bin state
+         space pyin decodes with Viterbi) folds them into the running state.
+
+    The HMM state is kept between calls, so the cost per chunk is bounded and
+    the latency is one frame (two chunks) rather than the full window.
+
+    With several channels every step runs on all of them at once: one batched
+    FFT, trough search and forward step over a (channels, ...) array, each
+    channel with its own HMM state.
+
+    Frames, FFTs and the HMM state are all `dtype`; the lag and transition
+    tables are stored in it too, so float32 frames are never promoted.
+    """
+    def __init__(self, sr, chunkSize, fmin, fmax, frameChunks=2,
+                 binsPerSemitone=10, maxTransitionRate=35.92,
+                 switchProb=0.01, noTroughProb=0.01, channels=1, dtype=np.float64):
+        self.sr = sr
+        self.dtype = np.dtype(dtype)
+        self.channels = channels
+        self.chunkSize = chunkSize
+        self.frameLength = chunkSize * frameChunks
+        self.window = self.frameLength // 2
+        self.fmin = fmin
+        self.fmax = fmax
+
+        # lag search range, limited by the integration window
+        self.minLag = max(2, int(np.floor(sr / fmax)))
+        self.maxLag = min(self.window - 1, int(np.ceil(sr / fmin)))
+        self.taus = np.arange(self.maxLag + 1)
+        self.lagWeights = self.taus[1:].astype(self.dtype)  # tau in the CMND
+        self.lags = np.arange(self.minLag, self.maxLag).astype(self.dtype)
+
+        # 1. Threshold prior (pyin: 100 thresholds under a beta(2, 18))
+        self.noTroughProb = noTroughProb
+
+        # 2. Pitch bins every 1/binsPerSemitone semitone from fmin to fmax
+        self.binsPerSemitone = binsPerSemitone
+        self.nBins = int(np.ceil(12 * binsPerSemitone * np.log2(fmax / fmin))) + 1
+        self.binFreqs = fmin * 2.0 ** (np.arange(self.nBins) / (12.0 * binsPerSemitone))
+
+        # 3. Triangular pitch transition band, as wide as the pitch can move
+        #    in one chunk at maxTransitionRate octaves per second
+        hop = chunkSize / sr
+        width = max(1, int(round(maxTransitionRate * 12 * binsPerSemitone * hop)))
+        tri = width + 1 - np.abs(np.arange(-width, width + 1))
+        self.transition = (tri / tri.sum()).astype(self.dtype)
+        # renormalises the band where it falls off either end of the range
+        self.edgeNorm = np.convolve(np.ones(self.nBins, dtype=self.dtype), self.transition, mode="same")
+        self.switchProb = switchProb
+
+        self.reset()
+
+    def requestReset(self):
+        """
+        reset() from another thread: the analysis worker may be stepping the
+        HMM right now, so the next update() does the reset instead.
+        """
+        self.resetPending = True
+
+    def reset(self):
+        self.resetPending = False
+        # forward probabilities per channel: row 0 voiced, row 1 unvoiced
+        self.state = np.full((self.channels, 2, self.nBins), 0.5 / self.nBins, dtype=self.dtype)
+        self.lastSeq = None
+        self.skipped = 0
+        self.pitches = np.full(self.channels, np.nan)
+        self.voicedProbs = np.zeros(self.channels)
+        # channel 0, for single-channel callers
+        self.pitch = float("nan")
+        self.voicedProb = 0.0
+
+    def _candidates(self, frames):
+        """
+        Pitch candidates for a batch of frames, shape (channels, frameLength).
+        Returns (freqs, probs), both (channels, lags) over the lag search
+        range; probs is zero everywhere except at troughs.
+        """
+        W = self.window
+        minLag, maxLag = self.minLag, self.maxLag
+        count = len(frames)
+        # Difference function d(tau) = E(0) + E(tau) - 2 r(tau) via one FFT
+        nfft = 2 * self.frameLength
+        acf = np.fft.irfft(np.fft.rfft(frames, nfft) * np.conj(np.fft.rfft(frames[:, :W], nfft)), nfft)
+        energy = np.concatenate((np.zeros((count, 1), dtype=frames.dtype), np.cumsum(frames * frames, axis=1)),
+                                axis=1)
+        taus = self.taus
+        d = energy[:, W:W + 1] + (energy[:, taus + W] - energy[:, taus]) - 2 * acf[:, :maxLag + 1]
+
+        # Cumulative mean normalised difference
+        cmnd = np.ones_like(d)
+        running = np.cumsum(d[:, 1:], axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cmnd[:, 1:] = np.where(running > 0, d[:, 1:] * self.lagWeights / running, 1.0)
+
+        # Troughs inside the lag range
+        a, b, c = cmnd[:, minLag - 1:maxLag - 1], cmnd[:, minLag:maxLag], cmnd[:, minLag + 1:maxLag + 1]
+        isTrough = (b < a) & (b <= c)
+
+        # A trough wins every threshold between its own value and the lowest
+        # earlier trough, so its probability is the prior mass of that interval
+        values = np.where(isTrough, b, np.inf)
+        earlierMin = np.minimum.accumulate(values, axis=1)
+        rows, cols = np.nonzero(isTrough)
+        before = np.where(cols > 0, earlierMin[rows, cols - 1], np.inf)
+        before[np.isinf(before)] = 1.0
+        probs = np.zeros_like(b)
+        probs[rows, cols] = np.clip(_betaCdf(before) - _betaCdf(b[rows, cols]), 0.0, None)
+        # nothing under any threshold: the global minimum gets a token weight
+        empty = np.nonzero((probs.sum(axis=1) == 0) & isTrough.any(axis=1))[0]
+        probs[empty, np.argmin(values[empty], axis=1)] = self.noTroughProb
+
+        # Parabolic interpolation for sub-sample lag accuracy
+        denom = a - 2 * b + c
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (a - c) / np.where(denom == 0, 1, denom), 0.0)
+        freqs = self.sr / (self.lags + np.clip(shift, -1, 1))
+        return freqs, probs
+
+    def _spread(self, state):
+        """Convolves every row of the (channels, 2, nBins) state with the transition band."""
+        # np.convolve per row beats a sliding-window or banded-matrix product
+        # several times over at these sizes
+        rows = state.reshape(-1, self.nBins)
+        return np.stack([np.convolve(row, self.transition, mode="same") for row in rows]).reshape(state.shape)
+
+    def processFrames(self, frames):
+        """
+        Advances every channel's HMM by one frame. frames: (channels, frameLength).
+        Returns (pitches_hz, voiced_probs), one entry per channel.
+        """
+        frames = np.atleast_2d(np.asarray(frames, dtype=self.dtype))
+        freqs, probs = self._candidates(frames)
+
+        # Observation likelihoods over the voiced and unvoiced bins
+        obs = np.zeros((len(frames), 2, self.nBins), dtype=self.dtype)
+        inRange = (probs > 0) & (freqs >= self.binFreqs[0]) & (freqs <= self.binFreqs[-1])
+        rows, cols = np.nonzero(inRange)
+        bins = np.round(12 * self.binsPerSemitone * np.log2(freqs[rows, cols] / self.fmin)).astype(int)
+        np.add.at(obs[:, 0], (rows, bins), probs[rows, cols])
+        obs[:, 1] = ((1.0 - np.minimum(obs[:, 0].sum(axis=1), 1.0)) / self.nBins)[:, None]
+
+        # Forward step: pitch moves within the band, voicing switches rarely
+        moved = self._spread(self.state) / self.edgeNorm
+        stay = 1.0 - self.switchProb
+        predicted = stay * moved + self.switchProb * moved[:, ::-1]
+        posterior = predicted * obs
+        total = posterior.sum(axis=(1, 2))
+        dead = total <= 0
+        if dead.any():
+            posterior[dead] = predicted[dead]
+            total[dead] = predicted[dead].sum(axis=(1, 2))
+        self.state = posterior / total[:, None, None]
+
+        voiced, unvoiced = self.state[:, 0], self.state[:, 1]
+        self.voicedProbs = voiced.sum(axis=1)
+        self.pitches = np.where(voiced.max(axis=1) >= unvoiced.max(axis=1),
+                                self.binFreqs[np.argmax(voiced, axis=1)], np.nan)
+        self.pitch = float(self.pitches[0])
+        self.voicedProb = float(self.voicedProbs[0])
+        return self.pitches, self.voicedProbs
+
+    def processFrame(self, frame):
+        """Single-channel processFrames: returns (pitch_hz, voiced_prob)."""
+        self.processFrames(frame)
+        return self.pitch, self.voicedProb
+
+    def update(self, recording):
+        """
+        Processes every chunk that arrived in `recording` since the last call.
+        Returns a list of (seq, pitches_hz, voiced_probs), one per chunk, each
+        with one entry per channel.
+        """
+        if self.resetPending:
+            self.reset()
+        newest = recording.seq
+        if self.lastSeq is None:
+            self.lastSeq = newest - 1
+        # chunks older than the ring's slack may already be overwritten
+        oldest = newest - recording.slackChunks
+        if self.lastSeq + 1 < oldest:
+            self.skipped += oldest - self.lastSeq - 1
+            self.lastSeq = oldest - 1
+
+        results = []
+        for seq in range(self.lastSeq + 1, newest + 1):
+            pitches, probs = self.processFrames(recording.getLatest(self.frameLength, seq))
+            results.append((seq, pitches, probs))
+        self.lastSeq = newest
+        return results
@@ -0,0 +1,134 @@
+# quality_scheduler.py
+# Steps analysis quality down when frames run over budget, and back up when
+# there is headroom again
+
+import time
+from collections import deque
+
+import numpy as np
+import pygame
+
+from scenes import Scene
+from settings import *
+
+
+class QualityScheduler:
+    """
+    Keeps analysis at the best tier of QUALITY_TIERS (best first) the
+    machine can afford.
+
+    Game.run reports how long each frame's work took (markFrame). Every
+    QUALITY_CHECK_INTERVAL seconds two loads are measured:
+      frame usage    - 90th percentile of the last QUALITY_WINDOW frames'
+                       work time, as a share of the frame budget (1 / FPS)
+      analysis usage - the worker's busy time per second, the share of a
+                       core the analysis takes
+
+    QUALITY_DOWN_DELAY seconds over budget steps one tier down.
+    QUALITY_UP_DELAY seconds with headroom steps one tier back up. A step up
+    that has to be undone before the next delay has passed doubles that
+    delay, so a tier that doesn't fit isn't retried every few seconds.
+    """
+    def __init__(self, analyzer, worker, tiers=QUALITY_TIERS, budget=1.0 / FPS):
+        self.analyzer = analyzer
+        self.worker = worker
+        self.tiers = tiers
+        self.budget = budget
+        self.frameTimes = deque(maxlen=QUALITY_WINDOW)
+        self.frameUsage = 0.0
+        self.analysisUsage = 0.0
+        self.upDelay = QUALITY_UP_DELAY
+        self.changes = 0
+        self.showHud = False
+        self.font = None
+
+        self._lastCheck = time.perf_counter()
+        self._lastBusy = worker.busyTime
+        self._overTime = 0.0
+        self._underTime = 0.0
+        self._lastChange = self._lastCheck
+        self._steppedUp = False
+        self.tier = 0
+        self.apply(0)
+
+    def apply(self, index):
+        """Switches the analyzer and worker to tier `index`."""
+        tier = self.tiers[index]
+        self.analyzer.setQuality(tier["pitchMode"], tier["windowChunks"], tier["spectrumStep"])
+        self.worker.setRate(tier["rate"])
+        self.tier = index
+
+    def markFrame(self, workTime):
+        """Called once per frame with the seconds the frame took, sleep excluded."""
+        self.frameTimes.append(workTime)
+        now = time.perf_counter()
+        if now - self._lastCheck >= QUALITY_CHECK_INTERVAL:
+            self._check(now)
+
+    def _check(self, now):
+        # 1. Loads since the last check
+        elapsed = now - self._lastCheck
+        busy = self.worker.busyTime
+        # a restarted DSP process counts from zero again
+        self.analysisUsage = max(busy - self._lastBusy, 0.0) / elapsed
+        self.frameUsage = float(np.percentile(self.frameTimes, 90)) / self.budget if self.frameTimes else 0.0
+        self._lastCheck = now
+        self._lastBusy = busy
+
+        over = self.frameUsage > QUALITY_HIGH_USAGE or self.analysisUsage > QUALITY_ANALYSIS_SHARE
+        under = self.frameUsage < QUALITY_LOW_USAGE and self.analysisUsage < QUALITY_ANALYSIS_SHARE / 2
+        self._overTime = self._overTime + elapsed if over else 0.0
+        self._underTime = self._underTime + elapsed if under else 0.0
+
+        # 2. Down quickly, up slowly
+        if self._overTime >= QUALITY_DOWN_DELAY and self.tier < len(self.tiers) - 1:
+            if self._steppedUp and now - self._lastChange < self.upDelay:
+                self.upDelay = min(self.upDelay * 2, QUALITY_MAX_UP_DELAY)
+            self._change(self.tier + 1, now, steppedUp=False)
+        elif self._underTime >= self.upDelay and self.tier > 0:
+            self._change(self.tier - 1, now, steppedUp=True)
+
+    def _change(self, index, now, steppedUp):
+        self.apply(index)
+        self.changes += 1
+        self._lastChange = now
+        self._steppedUp = steppedUp
+        # measure the new tier on its own frames
+        self.frameTimes.clear()
+        self._overTime = 0.0
+        self._underTime = 0.0
+
+    def getStats(self):
+        return {
+            "tier": self.tiers[self.tier]["name"],
+            "tierIndex": self.tier,
+            "frameUsage": self.frameUsage,
+            "analysisUsage": self.analysisUsage,
+            "changes": self.changes,
+            "upDelay": self.upDelay,
+        }
+
+    def handle_events(self, events):
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key == QUALITY_HUD_KEY:
+                self.showHud = not self.showHud
+
+    def draw(self, screen):
+        if not self.showHud:
+            return
+        if self.font is None:
+            self.font = Scene.textCache.font(22)
+        tier = self.tiers[self.tier]
+        window = tier["windowChunks"] or "all"
+        lines = [
+            f"quality   {tier['name']} ({self.tier + 1}/{len(self.tiers)})",
+            f"frame     {self.frameUsage:4.0%} of {self.budget * 1e3:.1f} ms",
+            f"analysis  {self.analysisUsage:4.0%} of a core",
+            f"{self.analyzer.activePitchMode}, {window} chunks, {tier['rate']}/s, 1/{tier['spectrumStep']} bins",
+        ]
+        y = SCREEN_HEIGHT - 10 - 18 * len(lines)
+        screen.fill(BLACK, (5, y - 5, 250, 18 * len(lines) + 8))
+        for line in lines:
+            text = Scene.textCache.renderUncached(line, self.font, YELLOW)
+            screen.blit(text, (10, y))
+            y += 18
@@ -0,0 +1,190 @@
+# range_tables.py
+# Per-range analysis tables, cached on disk between launches and in memory
+# between range changes
+
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cqt_engine import ConstantQEngine
+from settings import ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_DIR_BYTES, ANALYSIS_CONFIG_CACHE_BYTES
+
+# Bump whenever the contents or layout of the tables change so stale cache
+# files are ignored instead of loaded
+TABLES_VERSION = 1
+
+
+def tablesPath(midiMin, midiMax, rate, windowLength, cacheDir=ANALYSIS_CACHE_DIR):
+    name = f"range-v{TABLES_VERSION}-{midiMin}-{midiMax}-{rate}-{windowLength}.npz"
+    return os.path.join(cacheDir, name)
+
+
+def buildRangeTables(midiMin, midiMax, rate, windowLength):
+    """
+    Everything adjustRange needs for one note range:
+    note names, CQT frequencies, A-weighting and the CQT kernel bank.
+    """
+    import librosa
+    n_bins = int(midiMax - midiMin) + 1
+    fmin = librosa.midi_to_hz(midiMin)
+    note_freqs = librosa.cqt_frequencies(n_bins, fmin=fmin)
+    return {
+        # one vectorised call instead of one per note
+        "note_names": np.asarray(librosa.midi_to_note(np.arange(midiMin, midiMax + 1), unicode=False)),
+        "note_freqs": note_freqs,
+        "a_weighting": librosa.A_weighting(note_freqs),
+        "cqt_kernels": ConstantQEngine(rate, fmin, n_bins, windowLength).kernels,
+    }
+
+
+def touch(path):
+    """Marks a cache file as just used, for pruneCacheDir."""
+    # the file system's own clock can be too coarse to order quick loads
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def pruneCacheDir(cacheDir=ANALYSIS_CACHE_DIR, maxBytes=ANALYSIS_CACHE_DIR_BYTES):
+    """
+    Deletes the least recently used range files (by mtime, which a load
+    refreshes) until the rest fit in maxBytes; the newest is always kept.
+    Files of older TABLES_VERSIONs are never loaded again, so they go first.
+    Returns how many files were deleted.
+    """
+    files = []
+    try:
+        for entry in os.scandir(cacheDir):
+            if entry.name.startswith("range-") and entry.name.endswith(".npz"):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    except OSError:
+        return 0
+
+    files.sort(reverse=True)
+    total = 0
+    deleted = 0
+    for i, (_, size, path) in enumerate(files):
+        total += size
+        if i > 0 and total > maxBytes:
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                pass
+    return deleted
+
+
+def loadRangeTables(midiMin, midiMax, rate, windowLength, cacheDir=ANALYSIS_CACHE_DIR,
+                    maxBytes=ANALYSIS_CACHE_DIR_BYTES):
+    """
+    Returns the tables for a range from the on-disk cache, building and
+    saving them on a miss. A missing or unwritable cache is never fatal.
+    The directory is kept under maxBytes (see pruneCacheDir).
+    """
+    path = tablesPath(midiMin, midiMax, rate, windowLength, cacheDir)
+    try:
+        with np.load(path) as cached:
+            tables = {key: cached[key] for key in cached.files}
+    except (OSError, ValueError, KeyError):
+        tables = None
+    if tables is not None:
+        try:
+            touch(path)
+        except OSError:
+            pass
+        return tables
+
+    tables = buildRangeTables(midiMin, midiMax, rate, windowLength)
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        # write then rename so a crash never leaves a half-written cache file
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            # uncompressed: loads in ~10 ms, compressed takes longer than rebuilding
+            np.savez(f, **tables)
+        os.replace(tmpPath, path)
+        touch(path)
+        pruneCacheDir(cacheDir, maxBytes)
+    except OSError as e:
+        print(f"Could not cache analysis tables in {cacheDir}: {e}")
+    return tables
+
+
+class AnalysisConfig:
+    """
+    Everything that depends on the analysed note range, built once and then
+    swapped into the analyzer as a whole by adjustRange.
+    """
+    def __init__(self, minNote, maxNote, midiMin, midiMax, fmin, tables, cqt, pitchTracker):
+        self.minNote = minNote
+        self.maxNote = maxNote
+        self.midiMin = midiMin
+        self.midiMax = midiMax
+        self.fmin = fmin
+        self.n_bins = int(midiMax - midiMin) + 1
+        self.note_names = list(tables["note_names"])
+        self.note_freqs = tables["note_freqs"]
+        self.a_weighting = tables["a_weighting"]
+        self.cqt = cqt
+        self.pitchTracker = pitchTracker
+
+    def nbytes(self):
+        # the kernel bank dominates; the rest is a few KiB
+        return (self.cqt.nbytes() + self.note_freqs.nbytes + self.a_weighting.nbytes
+                + self.pitchTracker.state.nbytes)
+
+
+class ConfigCache:
+    """
+    Least-recently-used cache of AnalysisConfigs keyed by
+    (minNote, maxNote, RATE, CHUNK, dtype), bounded by total bytes rather
+    than count. The most recent entry is always kept even if it alone is
+    over budget. An entry's size is measured afresh every time, since its
+    CQT engine grows a decimated bank per spectrumStep after it is cached.
+    """
+    def __init__(self, maxBytes=ANALYSIS_CONFIG_CACHE_BYTES):
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def bytes(self):
+        # a handful of entries, each a few array sizes to add up
+        return sum(config.nbytes() for config in self.entries.values())
+
+    def get(self, key, build):
+        """Returns the config for key, calling build() on a miss."""
+        config = self.entries.get(key)
+        if config is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            config = build()
+            self.entries[key] = config
+        # entries may have grown since the last lookup, so hits evict too
+        self._evict()
+        return config
+
+    def _evict(self):
+        while len(self.entries) > 1 and self.bytes > self.maxBytes:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,100 @@
+# ring_buffer.py
+# Mirrored ring buffer for captured audio
+
+import numpy as np
+
+from settings import SINGLE_PRECISION
+
+# Sample type of the analyzer's rings, and so of everything analysed from them
+SAMPLE_DTYPE = np.dtype(np.float32 if SINGLE_PRECISION else np.float64)
+
+
+class CircularBuffer:
+    """
+    Holds the most recent `numChunks` chunks of audio and hands them out as a
+    contiguous, read-only view without copying.
+
+    The ring is `numChunks + slackChunks` chunks long and its first window's
+    worth of samples is mirrored just past the end, so any `numChunks`-long
+    run of chunks is contiguous somewhere in the backing store.
+
+    Single producer / single consumer protocol:
+      * the producer (the audio callback) writes a chunk into the slot of the
+        oldest chunk, then publishes it by incrementing `seq`;
+      * a consumer reads `seq` once and derives the view from it. The slack
+        chunks mean the producer can write `slackChunks` more chunks before it
+        touches any sample in that view, and `isIntact(seq)` tells the consumer
+        afterwards whether that may have happened. A chunk is written before
+        `seq` counts it, so once `slackChunks` chunks are counted the next one
+        may already be overwriting the view.
+
+    With several channels every channel gets its own lane (a row of
+    `buffer`) with that same layout, and views are (channels, n) so all
+    lanes can be analysed in one batched call. A one-channel ring hands out
+    plain (n,) views.
+
+    Samples are stored as `dtype`; with float32 the float32 blocks audio
+    sources deliver are copied in as they are, not upcast.
+    """
+    def __init__(self, chunkSize, numChunks, slackChunks=4, channels=1, dtype=np.float64):
+        self.chunkSize = chunkSize
+        self.numChunks = numChunks
+        self.slackChunks = slackChunks
+        self.channels = channels
+        self.windowSize = chunkSize * numChunks
+        self.capacity = (numChunks + slackChunks) * chunkSize
+        self.buffer = self._allocate((channels, self.capacity + self.windowSize), dtype)
+
+    def _allocate(self, shape, dtype):
+        """The backing store, with seq at 0."""
+        # number of chunks ever written; the only value shared between threads
+        self.seq = 0
+        return np.zeros(shape, dtype=dtype)
+
+    @property
+    def full(self):
+        return self.seq >= self.numChunks
+
+    def add_chunk(self, chunk):
+        """chunk: (chunkSize,) or, like a callback's indata, (chunkSize, channels)."""
+        if chunk.ndim == 2:
+            chunk = chunk.T
+        pos = (self.seq * self.chunkSize) % self.capacity
+        end = pos + self.chunkSize
+        self.buffer[:, pos:end] = chunk
+        if pos < self.windowSize:
+            self.buffer[:, self.capacity + pos:self.capacity + end] = chunk
+        # publish only after the samples are in place
+        self.seq += 1
+
+    def getLatest(self, n=None, seq=None):
+        """
+        Read-only view of the `n` most recent samples (default: the whole
+        window) as of chunk `seq` (default: now), oldest sample first.
+        Shape (n,) for one channel, (channels, n) for more.
+        """
+        n = self.windowSize if n is None else n
+        seq = self.seq if seq is None else seq
+        end = (seq * self.chunkSize) % self.capacity
+        if end < n:
+            end += self.capacity
+        view = self.buffer[:, end - n:end]
+        if self.channels == 1:
+            view = view[0]
+        view.flags.writeable = False
+        return view
+
+    def read(self, n=None):
+        """Returns (seq, view) so the caller can check isIntact(seq) later."""
+        seq = self.seq
+        return seq, self.getLatest(n, seq)
+
+    def isIntact(self, seq):
+        """True if no sample of the view taken at `seq` has been overwritten."""
+        # at seq + slackChunks the producer may be writing into the view's
+        # oldest chunk, which it only counts once it is done
+        return self.seq - seq < self.slackChunks
+
+    def getFlat(self):
+        # will be all zeros until the buffer has filled once
+        return self.getLatest()
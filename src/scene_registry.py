@@ -0,0 +1,131 @@
+# scene_registry.py
+# Builds scenes when they are first needed, preloads the likely next ones
+# on a background thread, and times every scene change to its first frame
+
+import threading
+import time
+
+
+class SceneRegistry:
+    """
+    Scenes by name, built on demand from their factories.
+
+    register(name, factory, next) adds a scene without building it; `next`
+    names the scenes the player is likely to go to from it. enter(name)
+    preloads those on a "SceneLoader" thread while this one runs, so a
+    change_scene finds them built. A scene asked for before its preload is
+    done waits for it, and one never preloaded is built on the spot.
+    Factories only create their own surfaces and pymunk spaces, and load
+    fonts and render text through Scene.textCache, whose lock every text
+    render in the game takes; so they can run next to the render thread.
+
+    beginTransition() / markFrame() time each change of scene until its
+    first frame is flipped, noting whether the scene was ready.
+    """
+    def __init__(self):
+        self.factories = {}
+        self.next = {}
+        self.scenes = {}
+        self.buildTimes = {}   # name -> seconds its last build took
+        self.transitions = []  # (from, to, seconds to first frame, how)
+        self._pending = {}     # name -> Event set when its preload is done
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._transition = None
+
+    def register(self, name, factory, next=()):
+        """factory() builds the scene; `next` are the scenes likely to follow it."""
+        self.factories[name] = factory
+        self.next[name] = tuple(next)
+
+    def __contains__(self, name):
+        return name in self.factories
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def status(self, name):
+        """"ready", "loading" (a preload is running) or "cold" (not built yet)."""
+        with self._lock:
+            if name in self.scenes:
+                return "ready"
+            return "loading" if name in self._pending else "cold"
+
+    def get(self, name):
+        """The scene `name`, waiting for its preload or building it if need be."""
+        with self._lock:
+            done = self._pending.get(name)
+        if done is not None:
+            done.wait()
+        with self._lock:
+            error = self._errors.pop(name, None)
+            scene = self.scenes.get(name)
+        if error is not None:
+            raise error
+        if scene is None:
+            scene = self._build(name)
+        return scene
+
+    def _build(self, name):
+        start = time.perf_counter()
+        scene = self.factories[name]()
+        with self._lock:
+            self.scenes[name] = scene
+            self.buildTimes[name] = time.perf_counter() - start
+        return scene
+
+    def preload(self, names):
+        """Builds the registered scenes in `names` that aren't yet, one after another, off this thread."""
+        with self._lock:
+            names = [name for name in names
+                     if name in self.factories and name not in self.scenes and name not in self._pending]
+            for name in names:
+                self._pending[name] = threading.Event()
+        if names:
+            threading.Thread(target=self._preload, args=(names,), name="SceneLoader", daemon=True).start()
+
+    def _preload(self, names):
+        for name in names:
+            try:
+                self._build(name)
+            except Exception as e:
+                # raised on the main thread when the scene is asked for
+                with self._lock:
+                    self._errors[name] = e
+            with self._lock:
+                done = self._pending.pop(name)
+            done.set()
+
+    def enter(self, name):
+        """Called once `name` is the current scene: preloads where it leads."""
+        self.preload(self.next.get(name, ()))
+
+    def discard(self, name):
+        """Forgets a built scene, so the next visit starts it afresh."""
+        with self._lock:
+            self.scenes.pop(name, None)
+            self.buildTimes.pop(name, None)
+
+    def beginTransition(self, fromName, name, how, start):
+        """A change of scene asked for at perf_counter() `start`; `how` is status() back then."""
+        self._transition = (fromName, name, how, start)
+
+    def markFrame(self):
+        """Called after every flip; closes the transition in progress."""
+        if self._transition is None:
+            return
+        fromName, name, how, start = self._transition
+        self._transition = None
+        seconds = time.perf_counter() - start
+        self.transitions.append((fromName, name, seconds, how))
+        print(f"Scene {fromName} -> {name}: first frame after {seconds * 1e3:.1f} ms ({how})")
+
+    def getStats(self):
+        return {
+            "built": sorted(self.scenes),
+            "buildMs": {name: seconds * 1e3 for name, seconds in self.buildTimes.items()},
+            "transitions": [
+                {"from": fromName, "to": name, "firstFrameMs": seconds * 1e3, "how": how}
+                for fromName, name, seconds, how in self.transitions
+            ],
+        }
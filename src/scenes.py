@@ -1,10 +1,85 @@
 # scenes.py
 # Base scene class for managing different game screens
 
+import threading
 import pygame
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from settings import TEXT_CACHE_SIZE
+
+
+class TextCache:
+    """
+    Fonts loaded once and rendered text surfaces kept in a bounded LRU keyed
+    by (text, font, colour, antialias), so unchanged text costs only a blit.
+    Scenes preloaded on the SceneLoader thread share it, hence the lock:
+    SDL_ttf isn't thread-safe, so every font is loaded and every piece of
+    text rendered through here, cached or not (see renderUncached).
+    """
+    def __init__(self, maxEntries=TEXT_CACHE_SIZE):
+        self.maxEntries = maxEntries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def font(self, size, name=None, sysfont=False):
+        key = (name, size, sysfont)
+        with self.lock:
+            font = self.fonts.get(key)
+            if font is None:
+                font = pygame.font.SysFont(name, size) if sysfont else pygame.font.Font(name, size)
+                self.fonts[key] = font
+            return font
+
+    def render(self, text, font, colour, antialias=True):
+        key = (text, font, tuple(colour), antialias)
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is not None:
+                self.hits += 1
+                self.surfaces.move_to_end(key)
+                return surface
+
+            self.misses += 1
+            surface = font.render(text, antialias, colour)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.maxEntries:
+                self.surfaces.popitem(last=False)
+                self.evictions += 1
+            return surface
+
+    def renderUncached(self, text, font, colour, antialias=True):
+        """render() for text that changes every frame, e.g. the HUD overlays."""
+        with self.lock:
+            return font.render(text, antialias, colour)
+
+    def clear(self):
+        """Forgets every font and surface; they die with pygame.quit()."""
+        self.fonts.clear()
+        self.surfaces.clear()
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.surfaces),
+            "fonts": len(self.fonts),
+        }
+
 
 class Scene(ABC):
+    # shared by every scene
+    textCache = TextCache()
+    # whether the analysis worker should compute the spectrum while this scene is shown
+    wantsSpectrum = False
+
     def __init__(self, screen, game):
         self.screen = screen
         self.game = game
@@ -21,8 +96,22 @@ class Scene(ABC):
     def draw(self):
         pass
 
+    def on_enter(self):
+        """Called each time the scene becomes the current one."""
+        pass
+
+    def on_exit(self):
+        """Called each time another scene takes over."""
+        pass
+
+    def getFont(self, size, name=None, sysfont=False):
+        return self.textCache.font(size, name, sysfont)
+
+    def renderText(self, words, font, colour, antialias=True):
+        return self.textCache.render(words, font, colour, antialias)
+
     def textToScreen(self,words, font, colour, x, y):
-        text=font.render(words, True, colour)
+        text=self.renderText(words, font, colour)
         textRect=text.get_rect()
         textRect.center=(x, y)
-        self.screen.blit(text, textRect)
\ No newline at end of file
+        self.screen.blit(text, textRect)
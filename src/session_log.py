@@ -0,0 +1,510 @@
+# session_log.py
+# Records a session's audio, analysis results and game state, and replays it
+#
+# python session_log.py info sessions/20261017-201500
+# python session_log.py seek sessions/20261017-201500 --time 1800
+# python session_log.py replay sessions/20261017-201500
+
+import argparse
+import bisect
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import pygame
+
+from settings import *
+from audio_sources import BlockSource, BlockTime
+
+# Every log file starts with MAGIC, the length of a JSON header (uint32) and
+# the header itself, padded to HEADER_ALIGN bytes. Fixed-size records of the
+# header's numpy dtype follow back to back, so record i is at a known offset
+# and the whole file maps straight onto a numpy array.
+MAGIC = b"ARKLOG01"
+HEADER_ALIGN = 64
+MAX_LOG_PADDLES = 8
+
+# one file per stream in the session directory
+AUDIO_LOG = "audio.log"
+ANALYSIS_LOG = "analysis.log"
+TICKS_LOG = "ticks.log"
+
+
+def audioDtype(chunk, channels):
+    return np.dtype([
+        ("seq", np.int64),          # recording.seq the chunk was stored as
+        ("time", np.float64),       # time.perf_counter() when it arrived
+        ("sensitivity", np.float64),  # the gate threshold is relative to this
+        ("frames", np.int32),       # frames used; the rest of samples is zero
+        ("samples", np.float32, (chunk, channels)),
+    ])
+
+
+def analysisDtype(channels):
+    return np.dtype([
+        ("seq", np.int64),
+        ("analysisStart", np.float64),
+        ("time", np.float64),
+        ("pitches", np.float64, (channels,)),
+        ("voicedProbs", np.float64, (channels,)),
+        ("noteIndices", np.int64, (channels,)),
+        ("levels", np.float64, (channels,)),
+        ("onsets", np.int64, (channels,)),
+        # what the pass ran with, so a replay follows the player's changes;
+        # empty when the results didn't come from an analyzer
+        ("minNote", "S8"),
+        ("maxNote", "S8"),
+        ("pitchMode", "S12"),
+        ("pitchModeCap", "S12"),
+        ("windowChunks", np.int32),  # 0 for the whole window
+        ("spectrumStep", np.int32),
+    ])
+
+
+TICK_DTYPE = np.dtype([
+    ("tick", np.int64),
+    ("time", np.float64),
+    ("dt", np.float64),
+    # snapshot seqs of the note events the scene handled before this tick,
+    # -1 when there were none
+    ("firstSeq", np.int64),
+    ("lastSeq", np.int64),
+    ("mouseX", np.float64),  # pointer x that steered paddle 0, nan for notes
+    ("snapshotSeq", np.int64),  # the worker's snapshot the paddle filter read, -1 for none
+    # state after the tick
+    ("ball", np.float64, (4,)),  # x, y, vx, vy
+    ("paddles", np.float64, (MAX_LOG_PADDLES,)),  # x of every paddle, nan past the last
+    ("lives", np.int32),
+    ("score", np.int32),
+    ("bricksLeft", np.int32),
+])
+
+
+class LogWriter:
+    """Appends records of one dtype to a new log file."""
+    def __init__(self, path, dtype, meta):
+        self.dtype = dtype
+        self.file = open(path, "wb")
+        header = json.dumps({"dtype": np.lib.format.dtype_to_descr(dtype), "meta": meta}).encode()
+        size = -(-(len(MAGIC) + 4 + len(header)) // HEADER_ALIGN) * HEADER_ALIGN
+        self.file.write(MAGIC + np.uint32(len(header)).tobytes()
+                        + header.ljust(size - len(MAGIC) - 4, b" "))
+
+    def write(self, records):
+        self.file.write(records.tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def readLog(path):
+    """
+    (records, meta) of a log file. records is a read-only memory map, so
+    opening an hour-long log costs nothing and indexing it only pages in
+    the records touched. A record cut short by a crash is left out.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        length = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+        header = json.loads(f.read(length))
+    dtype = np.lib.format.descr_to_dtype(header["dtype"])
+    offset = -(-(len(MAGIC) + 4 + length) // HEADER_ALIGN) * HEADER_ALIGN
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype), header["meta"]
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)), header["meta"]
+
+
+class SessionRecorder:
+    """
+    Writes a session to `directory`, one log per stream:
+      audio.log     every chunk the analyzer's audio callback receives
+      analysis.log  every result the analysis worker publishes
+      ticks.log     GameScreen's state after every tick, and its inputs
+
+    The record calls only queue a record; a writer thread does the file I/O,
+    so the audio callback never waits on the disk. Each log is created on
+    its first record, with `meta` as it is at that point in its header.
+    Raw float32 audio is most of it, about 630 MB an hour per channel.
+    """
+    def __init__(self, directory, **meta):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.meta = dict(meta, start=time.perf_counter(), created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        self.ticks = 0
+        self._audioDtype = None
+        self._analysisDtype = None
+        self._logs = {}
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writeLoop, name="SessionRecorder", daemon=True)
+        self._thread.start()
+
+    def open(self, analyzer):
+        """Called by the analyzer before its source starts."""
+        self.meta.update(rate=analyzer.RATE, chunk=analyzer.CHUNK, channels=analyzer.channels,
+                         dtype=analyzer.dtype.str)
+        self._audioDtype = audioDtype(analyzer.CHUNK, analyzer.channels)
+
+    def recordChunk(self, seq, indata, sensitivity):
+        record = np.zeros(1, self._audioDtype)
+        record["seq"] = seq
+        record["time"] = time.perf_counter()
+        record["sensitivity"] = sensitivity
+        frames = min(len(indata), self._audioDtype["samples"].shape[0])
+        record["frames"] = frames
+        channels = self._audioDtype["samples"].shape[1]
+        # sounddevice reuses indata for the next block: copied here
+        record["samples"][0, :frames] = indata[:frames, :channels]
+        self._queue.put((AUDIO_LOG, record))
+
+    def recordAnalysis(self, snapshot, analyzer=None):
+        channels = len(snapshot.pitches)
+        if self._analysisDtype is None or self._analysisDtype["pitches"].shape[0] != channels:
+            self._analysisDtype = analysisDtype(channels)
+        record = np.zeros(1, self._analysisDtype)
+        for field in ("seq", "analysisStart", "time", "pitches", "voicedProbs",
+                      "noteIndices", "levels", "onsets"):
+            record[field] = getattr(snapshot, field)
+        if analyzer is not None:
+            record["minNote"] = analyzer.minNote
+            record["maxNote"] = analyzer.maxNote
+            record["pitchMode"] = analyzer.pitchMode
+            record["pitchModeCap"] = analyzer.pitchModeCap or ""
+            record["windowChunks"] = analyzer.windowChunks or 0
+            record["spectrumStep"] = analyzer.spectrumStep
+        self._queue.put((ANALYSIS_LOG, record))
+
+    def recordTick(self, scene, dt, mouseX=None):
+        record = np.zeros(1, TICK_DTYPE)
+        record["tick"] = self.ticks
+        record["time"] = time.perf_counter()
+        record["dt"] = dt
+        record["firstSeq"], record["lastSeq"] = scene.eventSeqs
+        record["mouseX"] = np.nan if mouseX is None else mouseX
+        # the worker may have published another one since
+        controller = scene.controller
+        record["snapshotSeq"] = -1 if controller is None or controller.seq is None else controller.seq
+        body = scene.ball.body
+        record["ball"] = (body.position.x, body.position.y, body.velocity.x, body.velocity.y)
+        paddles = np.full(MAX_LOG_PADDLES, np.nan)
+        xs = [paddle.body.position.x for paddle in scene.paddles[:MAX_LOG_PADDLES]]
+        paddles[:len(xs)] = xs
+        record["paddles"] = paddles
+        record["lives"] = scene.lives
+        record["score"] = scene.score
+        record["bricksLeft"] = scene.bricks.remaining
+        self.ticks += 1
+        self._queue.put((TICKS_LOG, record))
+
+    def _writeLoop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            name, record = item
+            log = self._logs.get(name)
+            if log is None:
+                log = self._logs[name] = LogWriter(os.path.join(self.directory, name), record.dtype, self.meta)
+            log.write(record)
+
+    def close(self):
+        """Writes out everything queued so far and closes the logs."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for log in self._logs.values():
+            log.close()
+
+
+class SessionLog:
+    """
+    A recorded session, memory-mapped. Times are seconds since recording
+    started; the *At / *Between lookups bisect a log's time column record
+    by record, so they touch a handful of pages even in an hour-long
+    session (np.searchsorted would copy the whole strided column first).
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta = {}
+        self.audio = self._open(AUDIO_LOG)
+        self.analysis = self._open(ANALYSIS_LOG)
+        self.ticks = self._open(TICKS_LOG)
+        if not self.meta:
+            raise FileNotFoundError(f"no session logs in {directory}")
+        self.start = self.meta["start"]
+
+    def _open(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        records, meta = readLog(path)
+        # later logs were created later and know more
+        self.meta.update(meta)
+        return records
+
+    @property
+    def duration(self):
+        ends = [records["time"][-1] for records in (self.audio, self.analysis, self.ticks)
+                if records is not None and len(records)]
+        return max(ends) - self.start if ends else 0.0
+
+    def indexAt(self, records, t):
+        """Index of the last record at or before `t` seconds, -1 if none."""
+        return bisect.bisect_right(records["time"], self.start + t) - 1
+
+    def between(self, records, t0, t1):
+        times = records["time"]
+        return records[bisect.bisect_left(times, self.start + t0):bisect.bisect_left(times, self.start + t1)]
+
+    def tickAt(self, t):
+        index = self.indexAt(self.ticks, t)
+        return self.ticks[index] if index >= 0 else None
+
+    def analysisAt(self, t):
+        index = self.indexAt(self.analysis, t)
+        return self.analysis[index] if index >= 0 else None
+
+    def audioBetween(self, t0, t1):
+        """(frames, channels) samples of the chunks that arrived between t0 and t1."""
+        chunks = self.between(self.audio, t0, t1)
+        return np.concatenate([c["samples"][:c["frames"]] for c in chunks]) if len(chunks) else np.zeros((0, 1))
+
+    def describe(self):
+        counts = {name: 0 if records is None else len(records)
+                  for name, records in (("chunks", self.audio), ("analyses", self.analysis),
+                                        ("ticks", self.ticks))}
+        return dict(counts, duration=self.duration,
+                    **{k: v for k, v in self.meta.items() if k != "start"})
+
+
+class LogSource(BlockSource):
+    """Plays a recorded audio log back like any other source."""
+    def __init__(self, records, samplerate, blocksize, channels=1, speed=1.0):
+        super().__init__(samplerate, blocksize, channels, speed)
+        self.records = records
+
+    def blocks(self):
+        for i in range(len(self.records)):
+            record = self.records[i]
+            yield record["samples"][:record["frames"]]
+
+
+def snapshotFromRecord(record):
+    from analysis_worker import AnalysisSnapshot
+    pitches = np.array(record["pitches"])
+    noteIndices = np.array(record["noteIndices"])
+    return AnalysisSnapshot(int(record["seq"]), float(record["analysisStart"]), float(record["time"]),
+                            float(pitches[0]), float(record["voicedProbs"][0]), "", int(noteIndices[0]),
+                            (), np.zeros(0), np.zeros(0), pitches, np.array(record["voicedProbs"]),
+                            noteIndices, np.zeros((len(pitches), 0)), np.array(record["levels"]),
+                            np.array(record["onsets"]))
+
+
+def _analysisDiffers(record, snapshot):
+    return not (np.array_equal(record["pitches"], snapshot.pitches, equal_nan=True)
+                and np.array_equal(record["noteIndices"], snapshot.noteIndices)
+                and np.array_equal(record["onsets"], snapshot.onsets))
+
+
+class SessionReplay:
+    """
+    Plays a recorded session again, deterministically, and compares it with
+    the log.
+
+    The logged chunks go through a fresh analyzer (with the recorded
+    sensitivity) and are analysed at exactly the seqs the live worker
+    analysed them at, with the range, pitch mode and quality it had then.
+    The results drive a headless GameScreen through the same note events,
+    tick lengths and pointer positions as the live one, and its state is
+    checked after every tick. Sessions recorded without audio replay the
+    logged results instead.
+    """
+    def __init__(self, directory):
+        self.log = SessionLog(directory)
+        self.analyzer = None
+
+    def replayAnalysis(self):
+        """Yields (recorded, replayed) for every logged analysis."""
+        log = self.log
+        if log.audio is None or not len(log.audio):
+            for record in log.analysis:
+                yield record, snapshotFromRecord(record)
+            return
+
+        from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+        from analysis_worker import AnalysisWorker
+        meta = log.meta
+        source = LogSource(log.audio, meta["rate"], meta["chunk"], meta["channels"], speed=0)
+        # analysed in the precision the session was, whatever SINGLE_PRECISION is now
+        analyzer = self.analyzer = LibrosaAudioAnalyzer(source, channels=meta["channels"],
+                                                        dtype=np.dtype(meta.get("dtype", "<f8")))
+        worker = AnalysisWorker(analyzer)
+        firstSeq = int(log.audio["seq"][0])
+
+        def callback(indata, frames, time, status):
+            analyzer.sensitivity = float(log.audio["sensitivity"][source.blocksDelivered])
+            analyzer._audio_callback(indata, frames, time, status)
+
+        for record in log.analysis:
+            self._applySettings(analyzer, record)
+            # the ring counts from the first recorded chunk
+            due = int(record["seq"]) - firstSeq - source.blocksDelivered
+            if due > 0:
+                source.pump(callback, due)
+            snapshot = worker.analyzeOnce()
+            yield record, snapshot._replace(seq=snapshot.seq + firstSeq)
+
+    def _applySettings(self, analyzer, record):
+        if not record["minNote"]:
+            return
+        minNote, maxNote = record["minNote"].decode(), record["maxNote"].decode()
+        if (minNote, maxNote) != (analyzer.minNote, analyzer.maxNote):
+            analyzer.adjustRange(minNote, maxNote)
+        if record["pitchMode"].decode() != analyzer.pitchMode:
+            analyzer.setPitchMode(record["pitchMode"].decode())
+        analyzer.setQuality(record["pitchModeCap"].decode() or None,
+                            int(record["windowChunks"]) or None, int(record["spectrumStep"]))
+
+    def run(self, tolerance=1e-6):
+        """Replays the analysis and the game; returns where they diverge, if anywhere."""
+        from headless import HeadlessGame
+        from note_events import NoteEventTracker
+
+        # 1. Analysis
+        snapshots = []
+        mismatches = 0
+        firstMismatch = None
+        start = time.perf_counter()
+        for i, (record, snapshot) in enumerate(self.replayAnalysis()):
+            if _analysisDiffers(record, snapshot):
+                mismatches += 1
+                if firstMismatch is None:
+                    firstMismatch = i
+            snapshots.append(snapshot)
+        analysisWall = time.perf_counter() - start
+
+        # 2. Game: every tick gets the replayed events of the snapshots the
+        #    live scene handled before it; the ones another scene took are
+        #    dropped, as they were live
+        report = {"analyses": len(snapshots), "analysisMismatches": mismatches,
+                  "firstAnalysisMismatch": None, "ticks": 0, "firstDivergentTick": None,
+                  "maxBallError": 0.0, "maxPaddleError": 0.0, "analysisWallSeconds": analysisWall}
+        if firstMismatch is not None:
+            report["firstAnalysisMismatch"] = {
+                "index": firstMismatch,
+                "time": float(self.log.analysis["time"][firstMismatch] - self.log.start),
+                "seq": int(self.log.analysis["seq"][firstMismatch]),
+            }
+        ticks = self.log.ticks
+        if ticks is None or not len(ticks):
+            return report
+
+        # what the worker holds before its first pass
+        channels = len(snapshots[0].pitches) if snapshots else self.log.meta.get("channels", 1)
+        empty = snapshotFromRecord(np.zeros(1, analysisDtype(channels))[0])._replace(
+            seq=-1, pitch=float("nan"), pitches=np.full(channels, np.nan))
+        notes = _ReplayNotes(empty)
+        game = HeadlessGame(notes, self.log.meta.get("level", BRICK_LEVEL))
+        scene = game.scene
+        scene.lives = self.log.meta.get("lives", scene.lives)
+        tracker = NoteEventTracker()
+        pending = []
+        fed = 0
+        polled = -1
+        paddles = len(scene.paddles)
+        for i in range(len(ticks)):
+            tick = ticks[i]
+            lastSeq, firstSeq = int(tick["lastSeq"]), int(tick["firstSeq"])
+            while fed < len(snapshots) and snapshots[fed].seq <= lastSeq:
+                pending.extend(tracker.update(snapshots[fed]))
+                fed += 1
+            events = [e for e in pending if firstSeq <= e.snapshot.seq <= lastSeq]
+            pending = [e for e in pending if e.snapshot.seq > lastSeq]
+            # and the newest snapshot the paddle filter read in that tick
+            while polled + 1 < len(snapshots) and snapshots[polled + 1].seq <= tick["snapshotSeq"]:
+                polled += 1
+            notes.snapshot = snapshots[polled] if polled >= 0 else empty
+
+            scene.useMouse = not np.isnan(tick["mouseX"])
+            scene.mouseX = float(tick["mouseX"]) if scene.useMouse else None
+            scene.handle_events(events)
+            scene.update(float(tick["dt"]))
+
+            # 3. Compare
+            body = scene.ball.body
+            ballError = float(np.max(np.abs(np.array([body.position.x, body.position.y,
+                                                       body.velocity.x, body.velocity.y]) - tick["ball"])))
+            paddleError = float(np.max(np.abs(np.array([p.body.position.x for p in scene.paddles])
+                                              - tick["paddles"][:paddles])))
+            report["maxBallError"] = max(report["maxBallError"], ballError)
+            report["maxPaddleError"] = max(report["maxPaddleError"], paddleError)
+            report["ticks"] = i + 1
+            if report["firstDivergentTick"] is None and (
+                    ballError > tolerance or paddleError > tolerance
+                    or (scene.lives, scene.score, scene.bricks.remaining)
+                    != (tick["lives"], tick["score"], tick["bricksLeft"])):
+                report["firstDivergentTick"] = {
+                    "tick": i,
+                    "time": float(tick["time"] - self.log.start),
+                    "ballError": ballError,
+                    "paddleError": paddleError,
+                    "recorded": {"lives": int(tick["lives"]), "score": int(tick["score"]),
+                                 "bricksLeft": int(tick["bricksLeft"])},
+                    "replayed": {"lives": scene.lives, "score": scene.score,
+                                 "bricksLeft": int(scene.bricks.remaining)},
+                }
+        pygame.quit()
+        return report
+
+
+class _ReplayNotes:
+    """Stands in for the analysis worker: the replay sets the snapshot of every tick."""
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or replay a recorded session.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="what the session holds").add_argument("session")
+    seek = sub.add_parser("seek", help="the logged state at a point in the session")
+    seek.add_argument("session")
+    seek.add_argument("--time", type=float, required=True, help="seconds since recording started")
+    replay = sub.add_parser("replay", help="re-run the session and diff it against the log")
+    replay.add_argument("session")
+    replay.add_argument("--out", help="write the report here (JSON)")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        print(json.dumps(SessionLog(args.session).describe(), indent=2))
+        return 0
+
+    if args.command == "seek":
+        log = SessionLog(args.session)
+        for name, record in (("tick", log.tickAt(args.time)), ("analysis", log.analysisAt(args.time))):
+            if record is None:
+                print(f"{name}: none yet")
+                continue
+            fields = {field: record[field].tolist() for field in record.dtype.names}
+            fields["time"] = float(record["time"] - log.start)
+            print(f"{name}: {fields}")
+        return 0
+
+    report = SessionReplay(args.session).run()
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["firstDivergentTick"] is None and not report["analysisMismatches"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 # settings.py
 # Game constants and settings
 
+import os
 import pygame
 
 # Screen settings
@@ -8,6 +9,53 @@ SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
 
+# Startup
+FAST_STARTUP = True  # show the title screen while the audio analysis loads
+# versioned per-range tables (note names, A-weighting, CQT kernels) live here
+ANALYSIS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "musicalArkenoid")
+ANALYSIS_CACHE_DIR_BYTES = 256 * 1024 * 1024  # least recently used range files past this are deleted
+
+# Audio analysis settings
+ANALYSIS_RATE = 20  # analysis passes per second while sound is above the gate
+# Pitch estimator at start-up; P cycles through the others on the tuning screen.
+# streaming and piptrack take a few ms a pass. A pyin pass takes 0.2-0.5 s,
+# a whole core at any rate, so with AUTO_QUALITY the scheduler steps down to
+# piptrack within a second of choosing it, retries it after QUALITY_UP_DELAY
+# and then ever less often (see QUALITY_MAX_UP_DELAY)
+PITCH_MODE = "streaming"
+# Energy gate and onsets (see energy_gate.py)
+SILENCE_DB = -120.0       # level reported for digital silence
+GATE_RANGE_DB = 40        # the gate opens this far below the sensitivity, the tuning display's floor
+GATE_HYSTERESIS_DB = 6    # and closes again this far under that
+GATE_HOLD_CHUNKS = 4      # after this many quiet chunks (~90 ms)
+ONSET_RISE_DB = 9         # level jump over the decaying envelope that counts as an onset
+ONSET_DECAY_DB = 1.5      # envelope fall per chunk
+ANALYSIS_CONFIG_CACHE_BYTES = 64 * 1024 * 1024  # in-memory cache of per-range configs
+SINGLE_PRECISION = False  # float32 from capture through pitch analysis: half the memory traffic
+
+# Tuning screen waterfall (see spectrum_view.Waterfall)
+WATERFALL_KEY = pygame.K_w             # switches the tuning screen between bars and the waterfall
+WATERFALL_EXPORT_KEY = pygame.K_e      # writes the spectrum history to WATERFALL_EXPORT_FILE
+WATERFALL_EXPORT_FILE = "waterfall.npy"
+WATERFALL_HISTORY = 5 * 60 * ANALYSIS_RATE  # spectra kept, five minutes' worth
+
+# Latency tracing
+LATENCY_HUD_KEY = pygame.K_F3     # toggles the on-screen latency breakdown
+LATENCY_EXPORT_KEY = pygame.K_F4  # writes every traced event to LATENCY_EXPORT_FILE
+LATENCY_EXPORT_FILE = "latency_trace.csv"  # .csv or .json
+
+# Frame profiling (see frame_profiler.py)
+PROFILING = False                 # time every frame's stages from the start, not just with the overlay
+PROFILE_FRAMES = 600              # frames kept for the percentiles
+PROFILE_MAX_STAGES = 64           # (scene, stage) pairs tracked
+PROFILE_GRAPH_FRAMES = 120        # frames shown in the overlay graph
+PROFILE_HUD_KEY = pygame.K_F6     # toggles the overlay, and profiling with it
+PROFILE_CAPTURE_KEY = pygame.K_F7 # profiles the next PROFILE_CAPTURE_FRAMES frames to PROFILE_DIR
+PROFILE_CAPTURE_FRAMES = 120
+PROFILE_CAPTURE_MODE = "cprofile" # "cprofile" (main thread, .prof) or "sampling" (all threads, folded stacks)
+PROFILE_SAMPLE_INTERVAL = 0.002   # seconds between stack samples
+PROFILE_DIR = "profiles"
+
 # Colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -19,8 +67,74 @@ YELLOW = (255, 255, 0)
 # Fonts
 FONT_SIZE_TITLE = 48
 FONT_SIZE_BUTTON = 36
+TEXT_CACHE_SIZE = 256  # rendered text surfaces shared by all scenes
+
+# Physics settings
+FIXED_TIMESTEP = True    # False steps the space once per frame by 1/60 s
+PHYSICS_HZ = 120         # fixed simulation rate, independent of FPS
+PHYSICS_SUBSTEPS = 2     # pymunk steps per fixed step, against tunnelling
+MAX_PHYSICS_STEPS = 8    # catch-up cap per frame so a stall can't spiral
 
 # Game settings
+MOUSE_CONTROL = True      # the mouse moves the paddle instead of the played note
 PADDLE_WIDTH = 100
 PADDLE_HEIGHT = 10
-BALL_RADIUS = 10
\ No newline at end of file
+INPUT_CHANNELS = 1        # mic channels analysed; one player and paddle each
+PADDLE_COLOURS = [WHITE, (80, 200, 255), (255, 200, 60), (120, 230, 120),
+                  (230, 110, 230), (255, 130, 90), (150, 150, 255), (200, 200, 200)]
+BALL_RADIUS = 10
+
+# Pitch to paddle filter (see paddle_controller.py)
+PADDLE_FILTER = True            # filter every analysis result; False maps NOTE_ON / PITCH_CHANGE straight to the paddle
+PADDLE_ALPHA = 0.5              # share of a pitch measurement's error corrected at once
+PADDLE_BETA = 0.1               # and fed into the pitch velocity estimate
+PADDLE_JUMP_CENTS = 70          # a measurement further than this from the prediction is a jump
+PADDLE_CONFIRM = 2              # agreeing measurements before a jump without an onset is believed
+PADDLE_OCTAVE_TOLERANCE = 40    # cents off a whole octave that still count as an octave error
+PADDLE_PREDICT = 0.05           # seconds the paddle is extrapolated ahead, against latency
+PADDLE_MAX_PREDICT_CENTS = 50   # at most this far
+
+# Bricks
+BRICK_LEVELS = {
+    "default": (6, 10),   # rows, columns
+    "stress": (40, 80),   # 3200 bricks, for checking frame time at scale
+}
+BRICK_LEVEL = "default"
+BRICK_AREA = (20, 40, SCREEN_WIDTH - 40, 180)  # x, y, width, height the grid fills
+BRICK_GAP = 2             # pixels between neighbouring bricks
+BRICK_HP = 1              # hits to break a brick
+BALL_COLLISION_TYPE = 1
+BRICK_COLLISION_TYPE = 2
+
+# DSP process (see dsp_process.py)
+DSP_PROCESS = False          # capture and analyse in a child process instead of a thread
+DSP_MAX_BINS = 128           # spectrum bins a shared result slot can hold
+DSP_RESULT_SLOTS = 4         # published results kept in the shared ring
+DSP_START_TIMEOUT = 60.0     # seconds to wait for the child (it imports librosa)
+DSP_HEARTBEAT_TIMEOUT = 2.0  # a child silent this long is restarted
+DSP_MAX_RESTARTS = 5         # then analysis stays frozen at the last result
+
+# Adaptive analysis quality (see quality_scheduler.py)
+AUTO_QUALITY = True       # step analysis quality down when frames run over budget
+# Tiers, best first. pitchMode replaces any costlier mode the player picked
+# (None keeps theirs), windowChunks is how much of the window pyin looks at
+# (None: all of it) and spectrumStep computes every n-th spectrum bin.
+QUALITY_TIERS = [
+    {"name": "full", "rate": ANALYSIS_RATE, "pitchMode": None, "windowChunks": None, "spectrumStep": 1},
+    {"name": "high", "rate": 15, "pitchMode": None, "windowChunks": 6, "spectrumStep": 1},
+    {"name": "medium", "rate": 12, "pitchMode": "piptrack", "windowChunks": 4, "spectrumStep": 2},
+    {"name": "low", "rate": 8, "pitchMode": "streaming", "windowChunks": 4, "spectrumStep": 3},
+]
+QUALITY_HIGH_USAGE = 0.9      # frame work over this share of 1/FPS is over budget
+QUALITY_LOW_USAGE = 0.6       # and under it is headroom
+QUALITY_ANALYSIS_SHARE = 0.9  # analysis busier than this share of a core can't keep up either
+QUALITY_WINDOW = 60           # frames the frame usage is measured over
+QUALITY_CHECK_INTERVAL = 0.25 # seconds between decisions
+QUALITY_DOWN_DELAY = 0.5      # seconds over budget before stepping down
+QUALITY_UP_DELAY = 3.0        # seconds of headroom before stepping up
+QUALITY_MAX_UP_DELAY = 60.0   # the up delay doubles after every failed step up, to this
+QUALITY_HUD_KEY = pygame.K_F2 # toggles the quality overlay
+
+# Session recording (see session_log.py)
+RECORD_SESSIONS = False   # log audio, analysis and game state for replay
+RECORD_DIR = "sessions"   # one subdirectory per session, named by start time
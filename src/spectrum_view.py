@@ -0,0 +1,245 @@
+# spectrum_view.py
+# Batched bar-spectrum renderer for the tuning screen
+
+import colorsys
+
+import numpy as np
+import pygame
+
+from scenes import Scene
+from settings import *
+
+
+def magnitudeLut(size=256):
+    """RGB colour for each magnitude level: 240 = blue for low, 0 = red for high."""
+    lut = np.zeros((size, 3), dtype=np.uint8)
+    for i in range(size):
+        normalized = i / (size - 1)
+        r, g, b = colorsys.hsv_to_rgb(240 * (1 - normalized) / 360, 1, 1)
+        lut[i] = (int(r * 255), int(g * 255), int(b * 255))
+    return lut
+
+
+class SpectrumRenderer:
+    """
+    Draws the spectrum bars into one surface that is blitted once.
+
+    Bar x positions (log-frequency axis) and octave label surfaces only
+    change with the note range, so they are rebuilt when the frequencies
+    change, not every frame. Each frame the bar heights and colours for all
+    bins are computed together, and only bars whose height or colour changed
+    are repainted: the band between the old and new top, or the whole bar
+    when its colour changed. Nothing the size of the surface is allocated.
+    """
+    def __init__(self, width, height, font, barWidth=2):
+        self.width = width
+        self.height = height
+        self.font = font
+        self.barWidth = barWidth
+
+        # opaque, in the display's pixel format, so the blit is a plain copy
+        self.surface = pygame.Surface((width, height)).convert()
+        # the LUT holds colours already mapped to the surface's pixel format
+        self.lut = np.array([self.surface.map_rgb(tuple(c)) for c in magnitudeLut()], dtype=np.uint32)
+
+        self._layoutKey = None
+        self._labelKey = None
+        self.labels = []
+        self.log_min = 0.0
+        self.log_max = 1.0
+
+    def _layout(self, freqs):
+        """Recomputes which bin owns each screen column when the range changes."""
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]))
+        if key == self._layoutKey:
+            return
+        self._layoutKey = key
+        self.log_min = np.log2(freqs[0])
+        self.log_max = np.log2(freqs[-1])
+        xs = self.mapFreqToX(freqs)
+
+        # Every bar is barWidth columns wide; where bars overlap the higher bin
+        # wins, as it did when they were drawn one by one. Work per frame is
+        # then bounded by the screen width, not by the number of bins.
+        owner = np.full(self.width, -1)
+        for dx in range(self.barWidth):
+            cols = xs + dx
+            onScreen = cols < self.width
+            np.maximum.at(owner, cols[onScreen], np.nonzero(onScreen)[0])
+        # Runs of neighbouring columns owned by the same bin are one bar,
+        # filled as one rect
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(owner)) + 1))
+        widths = np.diff(np.append(starts, self.width))
+        shown = owner[starts] >= 0
+        self.barX = starts[shown]
+        self.barWidths = widths[shown]
+        self.barBins = owner[starts[shown]]
+        # what each bar was last painted with: the black the surface is
+        # filled with below
+        self.tops = np.full(len(self.barX), self.height)
+        self.colours = np.zeros(len(self.barX), dtype=np.uint32)
+        # the old bars are somewhere else now
+        self.surface.fill(BLACK)
+
+    def mapFreqToX(self, freq):
+        return ((np.log2(freq) - self.log_min) / (self.log_max - self.log_min) * self.width).astype(int)
+
+    def labelSurfaces(self, names, freqs, y):
+        """One cached (surface, rect) per octave label for the current range."""
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]), y)
+        if key != self._labelKey:
+            self._labelKey = key
+            self._layout(freqs)
+            self.labels = []
+            for octive in range(int(np.ceil(len(freqs) / 12))):
+                index = min(12 * octive, len(names) - 1)
+                text = Scene.textCache.render(names[index], self.font, WHITE)
+                rect = text.get_rect(center=(int(self.mapFreqToX(freqs[index])), y))
+                self.labels.append((text, rect))
+        return self.labels
+
+    def render(self, freqs, mags, minMag, maxMag):
+        """Redraws the bars that changed into self.surface."""
+        self._layout(freqs)
+        mags = np.asarray(mags)[self.barBins]
+
+        # 1. Tops and colours of every bar at once, and which bars differ from
+        #    what is on the surface
+        normalized = np.clip((mags - minMag) / (maxMag - minMag), 0.0, 1.0)
+        tops = self.height - (normalized * self.height).astype(int)
+        colours = self.lut[(normalized * (len(self.lut) - 1)).astype(int)]
+        changed = np.flatnonzero((tops != self.tops) | (colours != self.colours))
+
+        # 2. Only what changed: black where a bar shrank, the new colour where
+        #    it grew, or the whole bar when its colour changed
+        fill = self.surface.fill
+        height = self.height
+        for i, x, width, top, oldTop, colour, oldColour in zip(
+                changed.tolist(), self.barX[changed].tolist(), self.barWidths[changed].tolist(),
+                tops[changed].tolist(), self.tops[changed].tolist(),
+                colours[changed].tolist(), self.colours[changed].tolist()):
+            if top > oldTop:
+                fill(0, (x, oldTop, width, top - oldTop))
+            if colour != oldColour:
+                fill(colour, (x, top, width, height - top))
+            elif top < oldTop:
+                fill(colour, (x, top, width, oldTop - top))
+        self.tops, self.colours = tops, colours
+        return self.surface
+
+    def draw(self, screen, topLeft, freqs, mags, minMag, maxMag):
+        screen.blit(self.render(freqs, mags, minMag, maxMag), topLeft)
+
+
+class Waterfall:
+    """
+    Scrolling spectrogram of the spectra the tuning screen has shown.
+
+    The history is a preallocated (capacity, 128) float32 ring, one row per
+    analysis pass and one column per MIDI note, in dB. Bins outside the
+    range analysed at the time are NaN, so older rows stay valid across
+    range changes. push() writes a row in place and allocates nothing.
+
+    The newest spectrum is the top row of a panel-sized surface. draw()
+    scrolls the surface down by the rows pushed since the last draw and
+    paints only those through the colour LUT. The visible rows are
+    repainted from the history only when the range or the level scale
+    changes, or when more rows arrived than fit on the panel.
+    """
+    NOTES = 128
+
+    def __init__(self, width, height, capacity=WATERFALL_HISTORY):
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        # rows are only read once pushed, so the pages are touched as they fill
+        self.history = np.empty((capacity, self.NOTES), dtype=np.float32)
+        self.count = 0  # spectra ever pushed
+        self._last = None
+
+        self.surface = pygame.Surface((width, height)).convert()
+        # the last entry, past the colour scale, is the black of NaN bins
+        self.lut = np.array([self.surface.map_rgb(tuple(c)) for c in magnitudeLut()]
+                            + [self.surface.map_rgb(BLACK)], dtype=np.uint32)
+        self.levels = len(self.lut) - 2  # highest colour index
+
+        self._layoutKey = None
+        self.notes = np.zeros(width, dtype=np.intp)  # MIDI note shown in each screen column
+        # one painted row's scratch arrays
+        self._values = np.empty(width, dtype=np.float32)
+        self._index = np.empty(width, dtype=np.intp)
+        self._colours = np.empty(width, dtype=np.uint32)
+        self._paintKey = None
+        self._painted = 0  # count the surface was last brought up to
+
+    def push(self, snapshot):
+        """Adds the snapshot's spectrum, once per snapshot."""
+        if snapshot is self._last or not len(snapshot.spectrum):
+            return
+        self._last = snapshot
+        low = int(round(12 * np.log2(snapshot.noteFreqs[0] / 440.0))) + 69
+        bins = min(len(snapshot.spectrum), self.NOTES - low)
+        row = self.history[self.count % self.capacity]
+        row.fill(np.nan)
+        row[low:low + bins] = snapshot.spectrum[:bins]
+        self.count += 1
+
+    def _layout(self, freqs):
+        """Which note each screen column shows, on the bar view's log-frequency axis."""
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]))
+        if key == self._layoutKey:
+            return
+        self._layoutKey = key
+        logs = np.log2(freqs)
+        xs = ((logs - logs[0]) / (logs[-1] - logs[0]) * self.width).astype(int)
+        low = int(round(12 * np.log2(freqs[0] / 440.0))) + 69
+        # each bin fills the columns from its bar to the next one
+        self.notes[:] = low + np.searchsorted(xs, np.arange(self.width), side="right") - 1
+
+    def _colourIndex(self, values, minMag, maxMag):
+        # in place: dB -> colour index, NaN -> black
+        values -= minMag
+        values *= self.levels / (maxMag - minMag)
+        np.clip(values, 0, self.levels, out=values)
+        np.nan_to_num(values, copy=False, nan=self.levels + 1)
+        return values
+
+    def _paintRow(self, pixels, y, row, minMag, maxMag):
+        np.take(row, self.notes, out=self._values)
+        self._index[:] = self._colourIndex(self._values, minMag, maxMag)
+        np.take(self.lut, self._index, out=self._colours)
+        pixels[:, y] = self._colours
+
+    def _repaint(self, pixels, minMag, maxMag):
+        visible = min(self.count, self.height, self.capacity)
+        rows = (self.count - 1 - np.arange(visible)) % self.capacity
+        values = self._colourIndex(self.history[rows][:, self.notes], minMag, maxMag)
+        pixels[:, :visible] = self.lut[values.astype(np.intp)].T
+        pixels[:, visible:] = self.lut[-1]
+
+    def draw(self, screen, topLeft, freqs, minMag, maxMag):
+        self._layout(freqs)
+        key = (self._layoutKey, minMag, maxMag)
+        new = self.count - self._painted
+        if key == self._paintKey and not new:
+            screen.blit(self.surface, topLeft)
+            return
+        if key == self._paintKey and new < self.height:
+            self.surface.scroll(0, new)
+            pixels = pygame.surfarray.pixels2d(self.surface)
+            for y in range(new):
+                self._paintRow(pixels, y, self.history[(self.count - 1 - y) % self.capacity], minMag, maxMag)
+        else:
+            pixels = pygame.surfarray.pixels2d(self.surface)
+            self._repaint(pixels, minMag, maxMag)
+            self._paintKey = key
+        del pixels  # unlocks the surface
+        self._painted = self.count
+        screen.blit(self.surface, topLeft)
+
+    def export(self, path):
+        """Saves the history to .npy, oldest spectrum first. Returns the row count."""
+        rows = min(self.count, self.capacity)
+        order = (self.count - rows + np.arange(rows)) % self.capacity
+        np.save(path, self.history[order])
+        return rows
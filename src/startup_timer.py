@@ -0,0 +1,32 @@
+# startup_timer.py
+# Records where launch time goes
+
+import threading
+import time
+
+# Taken when this module is first imported, which game.py does first thing
+PROCESS_START = time.perf_counter()
+
+
+class StartupTimer:
+    """Named milestones since launch, from any thread, printed as one report."""
+    def __init__(self, start=PROCESS_START):
+        self.start = start
+        self.marks = []
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def mark(self, name):
+        with self.lock:
+            self.marks.append((name, time.perf_counter() - self.start, threading.current_thread().name))
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        print("Startup timing (ms since launch):")
+        previous = {}
+        for name, at, thread in sorted(self.marks, key=lambda m: m[1]):
+            step = at - previous.get(thread, 0.0)
+            previous[thread] = at
+            print(f"  {at * 1e3:8.1f}  (+{step * 1e3:7.1f})  {name}  [{thread}]")
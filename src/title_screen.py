@@ -8,8 +8,8 @@ from settings import *
 class TitleScreen(Scene):
     def __init__(self, screen, game):
         super().__init__(screen, game)
-        self.font_title = pygame.font.Font(None, FONT_SIZE_TITLE)
-        self.font_button = pygame.font.Font(None, FONT_SIZE_BUTTON)
+        self.font_title = self.getFont(FONT_SIZE_TITLE)
+        self.font_button = self.getFont(FONT_SIZE_BUTTON)
 
         #putting the text to the screen
         
@@ -38,6 +38,8 @@ class TitleScreen(Scene):
         self.textToScreen("Music Arkenoid", self.font_title, WHITE, SCREEN_WIDTH//2, SCREEN_HEIGHT//2-50)
         self.textToScreen("Press SPACE to Start", self.font_button, GREEN, SCREEN_WIDTH//2, SCREEN_HEIGHT//2+50)
         self.textToScreen("Press T for Tuning", self.font_button, BLUE, SCREEN_WIDTH//2, SCREEN_HEIGHT//2+100)
+        if not self.game.loaded:
+            self.textToScreen("Loading audio...", self.font_button, WHITE, SCREEN_WIDTH//2, SCREEN_HEIGHT//2+150)
      #   self.screen.blit(self.title_text, self.title_rect)
       #  self.screen.blit(self.start_text, self.start_rect)
        # self.screen.blit(self.tuning_text, self.tuning_rect)
\ No newline at end of file
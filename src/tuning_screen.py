@@ -3,31 +3,37 @@
 
 import pygame
 import numpy as np
-import colorsys
 from typing import Any, List
 from scenes import Scene
 from settings import *
+from spectrum_view import SpectrumRenderer, Waterfall
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from game import Game
 
 class TuningScreen(Scene):
+    wantsSpectrum = True
+
     def __init__(self, screen: pygame.Surface, game: "Game") -> None:
         super().__init__(screen, game)
-        self.font_title = pygame.font.Font(None, FONT_SIZE_TITLE)
-        self.font_button = pygame.font.Font(None, FONT_SIZE_BUTTON)
+        self.font_title = self.getFont(FONT_SIZE_TITLE)
+        self.font_button = self.getFont(FONT_SIZE_BUTTON)
 
-        self.title_text = self.font_title.render("Tuning Screen", True, WHITE)
-        self.back_text = self.font_button.render("Press ESC to go back", True, GREEN)
+        self.title_text = self.renderText("Tuning Screen", self.font_title, WHITE)
+        self.back_text = self.renderText("Press ESC to go back", self.font_button, GREEN)
         self.sensitivity = -40 
 
         self.title_rect = self.title_text.get_rect(center=(SCREEN_WIDTH // 2, 50))
         self.back_rect = self.back_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50))
         self.audio_analyzer = game.audio_analyzer
-        
-        self.log_min = np.log2(self.audio_analyzer.note_freqs[0])
-        self.log_max = np.log2(self.audio_analyzer.note_freqs[-1])      
+
+        # Bars are drawn from the bottom of a max_height tall panel
+        self.max_height = 400
+        self.spectrum_view = SpectrumRenderer(SCREEN_WIDTH, self.max_height, self.font_button)
+        # the same panel as a spectrogram of the recent spectra (W)
+        self.waterfall = Waterfall(SCREEN_WIDTH, self.max_height)
+        self.showWaterfall = False
 
     def handle_events(self, events: List[pygame.event.Event]) -> None:
         for event in events:
@@ -38,6 +44,14 @@ class TuningScreen(Scene):
                     self.audio_analyzer.adjust_sensitivity(increase=True)                    
                 elif event.key == pygame.K_MINUS:
                     self.audio_analyzer.adjust_sensitivity(increase=False)
+                elif event.key == pygame.K_p:
+                    # Switch pitch estimator to compare accuracy and latency
+                    self.audio_analyzer.cyclePitchMode()
+                elif event.key == WATERFALL_KEY:
+                    self.showWaterfall = not self.showWaterfall
+                elif event.key == WATERFALL_EXPORT_KEY:
+                    count = self.waterfall.export(WATERFALL_EXPORT_FILE)
+                    print(f"Wrote {count} spectra to {WATERFALL_EXPORT_FILE}")
 
                 # Left/Right: Shift the frequency window (Horizontal Offset)
                 elif event.key == pygame.K_LEFT:
@@ -61,7 +75,8 @@ class TuningScreen(Scene):
                     
 
     def update(self, dt: float) -> None:
-        pass  # No dynamic updates needed for tuning screen
+        # every new spectrum goes into the waterfall's history, shown or not
+        self.waterfall.push(self.game.analysis_worker.snapshot)
     
     def adjust_sensitivity(self, increase=True):
         """Increase or decrease the dB threshold."""
@@ -73,59 +88,49 @@ class TuningScreen(Scene):
             self.sensitivity -= step
     def draw(self) -> None:
         self.screen.fill(BLACK)
+
+        # Latest result from the analysis worker, never blocks on DSP
+        snapshot = self.game.analysis_worker.snapshot
+
+        # Draw spectrum in log domain for frequencies, all bars in one pass.
+        # The panel is opaque, so it goes down before the text drawn over it.
+        maxMag = 0 + self.audio_analyzer.getSensitivity()
+        minMag = maxMag-40
+        topLeft = (0, SCREEN_HEIGHT - 100 - self.max_height)
+        if self.showWaterfall:
+            self.waterfall.draw(self.screen, topLeft, snapshot.noteFreqs, minMag, maxMag)
+        else:
+            self.spectrum_view.draw(self.screen, topLeft, snapshot.noteFreqs, snapshot.spectrum, minMag, maxMag)
+
         self.screen.blit(self.title_text, self.title_rect)
         self.screen.blit(self.back_text, self.back_rect)
 
-        sens_text = self.font_button.render(f"Sensitivity: {self.audio_analyzer.getSensitivity():.1f} (+/- to adjust)\n Arrow keys to adjust Range", True, WHITE)
+        sens_text = self.renderText(f"Sensitivity: {self.audio_analyzer.getSensitivity():.1f} (+/- to adjust)\n Arrow keys to adjust Range", self.font_button, WHITE)
         sens_rect = sens_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100))
         self.screen.blit(sens_text, sens_rect)
 
         # Display strongest note
-        strongest_note = self.audio_analyzer.getStrongestNote()
-        note_text = self.font_button.render(f"Strongest Note: {strongest_note}", True, YELLOW)
+        strongest_note = snapshot.strongestNote
+        mode = self.audio_analyzer.pitchMode
+        active = self.audio_analyzer.activePitchMode
+        if active != mode:
+            # the quality scheduler stepped it down
+            mode = f"{mode}->{active}"
+        note_text = self.renderText(f"Strongest Note: {strongest_note} [{mode}, P]", self.font_button, YELLOW)
         note_rect = note_text.get_rect(center=(SCREEN_WIDTH // 2, 100))
         self.screen.blit(note_text, note_rect)
 
-        # Draw spectrum in log domain for frequencies
-        max_height = 400
-        maxMag = 0 + self.audio_analyzer.getSensitivity()
-        minMag = maxMag-40
-        scaling = max_height/(maxMag- minMag)        
-        self.log_min = np.log2(self.audio_analyzer.note_freqs[0])
-        self.log_max = np.log2(self.audio_analyzer.note_freqs[-1])      
-
-
-        for freq, log_amp in self.audio_analyzer.getSpectrum():
-            height = int((log_amp  - minMag)* scaling)
-            height = max(min(height, max_height),0)
-            
-            # Color based on magnitude using HSV
-            normalized = (log_amp - minMag) / (maxMag - minMag)
-            normalized = max(0, min(1, normalized))  # Clamp to 0-1
-            hue = 240 * (1 - normalized)  # 240=blue for low, 0=red for high
-            r, g, b = colorsys.hsv_to_rgb(hue / 360, 1, 1)
-            color = (int(r * 255), int(g * 255), int(b * 255))
-            
-            x_pos = self.mapFreqToX(freq)
-            pygame.draw.rect(self.screen, color, (x_pos, SCREEN_HEIGHT - 100 - height, 2, height))  # Thin bars
-
-        # Draw note labels
-        # this is C3
-        
-        for octive in range(self.audio_analyzer.getNumOctives()):
-            index = min(0+12*octive, len(self.audio_analyzer.note_names))
-            note = self.audio_analyzer.note_names[index]
-            freq = self.audio_analyzer.note_freqs[index]
-            x_pos = self.mapFreqToX(freq)
-            note_text = self.font_button.render(note, True, WHITE)
-            note_rect = note_text.get_rect(center=(x_pos, SCREEN_HEIGHT - 70))
-            self.screen.blit(note_text, note_rect)
-
-        
+        # Input level against the gate pitch estimation waits for
+        gate = self.audio_analyzer.getSensitivity() - GATE_RANGE_DB
+        level = snapshot.levels[0]
+        level_text = self.renderText(f"Level: {level:.0f} dB (gate {gate:.0f} dB)", self.font_button,
+                                     GREEN if level >= gate else WHITE)
+        level_rect = level_text.get_rect(center=(SCREEN_WIDTH // 2, 135))
+        self.screen.blit(level_text, level_rect)
 
+        # Draw note labels, rendered once per range
+        for note_text, note_rect in self.spectrum_view.labelSurfaces(snapshot.noteNames, snapshot.noteFreqs, SCREEN_HEIGHT - 70):
+            self.screen.blit(note_text, note_rect)
 
     def mapFreqToX(self, freq: float) -> int:
-        x_pos = int((np.log2(freq) - self.log_min) / (self.log_max - self.log_min) * SCREEN_WIDTH)
-        return x_pos    
-
-    
\ No newline at end of file
+        return int(self.spectrum_view.mapFreqToX(freq))
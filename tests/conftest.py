@@ -0,0 +1,11 @@
+# conftest.py
+# The game's modules import each other by bare name from src/
+
+import os
+import sys
+
+# pygame tests run without a display or a sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,76 @@
+# test_analysis_worker.py
+# AnalysisWorker passes against an analyzer fed by a SyntheticSource
+
+import numpy as np
+import pytest
+
+from audio_sources import SyntheticSource
+from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+from analysis_worker import AnalysisWorker
+
+
+@pytest.fixture
+def analyzer():
+    source = SyntheticSource(44100, 1024, speed=0, kind="tone", freqs=[440.0], noise=0.01)
+    analyzer = LibrosaAudioAnalyzer(source)
+    analyzer.setPitchMode("streaming")
+    source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    yield analyzer
+    source.close()
+
+
+def test_pass_finds_the_tone(analyzer):
+    snapshot = AnalysisWorker(analyzer).analyzeOnce()
+    assert snapshot.strongestNote.startswith("A4")
+    assert snapshot.noteNames[snapshot.noteIndex] == "A4"
+
+
+def test_tracker_reset_waits_for_the_next_pass(analyzer):
+    worker = AnalysisWorker(analyzer)
+    worker.analyzeOnce()
+    tracker = analyzer.pitchTracker
+    state = tracker.state
+    # the main thread only flags the reset; the worker may be mid-step
+    analyzer.setPitchMode("streaming")
+    assert tracker.resetPending
+    assert tracker.state is state
+    analyzer.source.pump(analyzer._audio_callback, 1)
+    worker.analyzeOnce()
+    assert not tracker.resetPending
+    assert tracker.lastSeq == analyzer.recording.seq
+
+
+def test_range_change_during_a_pass_keeps_its_tables(analyzer):
+    worker = AnalysisWorker(analyzer)
+    config = analyzer.config
+    getPitches = analyzer.getPitches
+
+    def changeRangeMidPass(*args):
+        analyzer.adjustRange("C3", "C5")
+        return getPitches(*args)
+
+    analyzer.getPitches = changeRangeMidPass
+    snapshot = worker.analyzeOnce()
+    assert snapshot.noteNames is config.note_names
+    assert snapshot.noteNames[snapshot.noteIndex] == "A4"
+
+
+def test_streaming_pass_analyses_a_copy(analyzer):
+    worker = AnalysisWorker(analyzer)
+    worker.analyzeOnce()
+    assert worker._window is not None
+    assert not np.shares_memory(worker._window, analyzer.recording.buffer)
+
+
+def test_silence_skips_pitch_estimation():
+    source = SyntheticSource(44100, 1024, speed=0, kind="tone", amplitude=0.0)
+    analyzer = LibrosaAudioAnalyzer(source)
+    source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    # the gate never let a chunk through to wake the worker
+    assert not analyzer.chunkReady.is_set()
+    worker = AnalysisWorker(analyzer)
+    analyzer.getPitches = None  # would fail if called
+    snapshot = worker.analyzeOnce()
+    assert worker.gated == 1
+    assert np.isnan(snapshot.pitches).all()
+    source.close()
@@ -0,0 +1,94 @@
+# test_audio_sources.py
+# Generated and file-backed AudioSources, delivered through pump()
+
+import numpy as np
+import pytest
+
+from audio_sources import AudioSource, BlockSource, FileSource, SyntheticSource
+
+RATE = 8000
+BLOCK = 256
+
+
+class Collector:
+    """A callback that keeps every block it is given."""
+    def __init__(self):
+        self.blocks = []
+        self.times = []
+
+    def __call__(self, indata, frames, time, status):
+        assert frames == len(indata)
+        self.blocks.append(indata.copy())
+        self.times.append(time)
+
+
+def test_base_classes_are_abstract():
+    with pytest.raises(TypeError):
+        AudioSource(RATE, BLOCK)
+    with pytest.raises(TypeError):
+        BlockSource(RATE, BLOCK)
+
+
+def test_tone_blocks_and_timestamps():
+    source = SyntheticSource(RATE, BLOCK, freqs=[440.0], channels=2, speed=0)
+    callback = Collector()
+    assert source.pump(callback, 4) == 4
+    assert source.blocksDelivered == 4
+    for block in callback.blocks:
+        assert block.shape == (BLOCK, 2)
+        assert block.dtype == np.float32
+    signal = np.concatenate(callback.blocks)[:, 0]
+    t = np.arange(4 * BLOCK) / RATE
+    np.testing.assert_allclose(signal, 0.5 * np.sin(2 * np.pi * 440.0 * t), atol=1e-6)
+    assert [time.inputBufferAdcTime for time in callback.times] == [i * BLOCK / RATE for i in range(4)]
+
+
+def test_duration_ends_the_stream():
+    source = SyntheticSource(RATE, BLOCK, duration=3 * BLOCK / RATE, speed=0)
+    assert source.pump(Collector()) == 3
+
+
+def test_same_seed_same_noise():
+    a, b = Collector(), Collector()
+    SyntheticSource(RATE, BLOCK, kind="noise", seed=3, speed=0).pump(a, 2)
+    SyntheticSource(RATE, BLOCK, kind="noise", seed=3, speed=0).pump(b, 2)
+    np.testing.assert_array_equal(np.concatenate(a.blocks), np.concatenate(b.blocks))
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        SyntheticSource(RATE, BLOCK, kind="square")
+
+
+def test_speed_zero_never_starts_a_thread():
+    source = SyntheticSource(RATE, BLOCK, speed=0)
+    callback = Collector()
+    source.start(callback)
+    source.stop()
+    assert callback.blocks == []
+
+
+def test_file_source_pads_loops_and_matches_channels(tmp_path):
+    sf = pytest.importorskip("soundfile")
+    samples = np.linspace(-0.5, 0.5, BLOCK + 10, dtype=np.float32)
+    path = str(tmp_path / "ramp.wav")
+    sf.write(path, samples, RATE, subtype="FLOAT")
+
+    callback = Collector()
+    source = FileSource(path, RATE, BLOCK, channels=2, speed=0, loop=True)
+    assert source.pump(callback, 4) == 4
+    first, second, third = callback.blocks[:3]
+    np.testing.assert_array_equal(first[:, 0], samples[:BLOCK])
+    np.testing.assert_array_equal(first[:, 1], first[:, 0])
+    # the short last block is zero-padded, then the file starts over
+    np.testing.assert_array_equal(second[:10, 0], samples[BLOCK:])
+    assert not second[10:].any()
+    np.testing.assert_array_equal(third, first)
+
+
+def test_file_source_checks_the_rate(tmp_path):
+    sf = pytest.importorskip("soundfile")
+    path = str(tmp_path / "tone.wav")
+    sf.write(path, np.zeros(100, dtype=np.float32), RATE * 2)
+    with pytest.raises(ValueError):
+        FileSource(path, RATE, BLOCK)
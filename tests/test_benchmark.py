@@ -0,0 +1,42 @@
+# test_benchmark.py
+# The measuring and comparing helpers behind benchmark.py
+
+import json
+
+import numpy as np
+
+from benchmark import compare, measure, percentiles
+
+
+def test_percentiles_in_ms():
+    stats = percentiles([0.001, 0.002, 0.003, 0.004])
+    assert stats["calls"] == 4
+    assert stats["mean_ms"] == 2.5
+    assert stats["p50_ms"] == 2.5
+    assert stats["max_ms"] == 4.0
+
+
+def test_measure_runs_between_before_every_call():
+    calls = []
+    result = measure(lambda: calls.append("fn"), repeat=3, warmup=1,
+                     between=lambda: calls.append("between"))
+    # warmup, timed calls and the tracemalloc calls all get a fresh input
+    assert calls == ["between", "fn"] * (1 + 3 + 3)
+    assert result["calls"] == 3
+
+
+def test_measure_sees_allocations():
+    result = measure(lambda: np.ones(100_000), repeat=2)
+    assert result["alloc_peak_bytes"] >= 800_000
+    kept = []
+    result = measure(lambda: kept.append(np.ones(10_000)), repeat=2)
+    assert result["alloc_retained_bytes"] >= 80_000
+
+
+def test_compare_flags_slowdowns_over_the_threshold(tmp_path):
+    baseline = tmp_path / "bench.json"
+    baseline.write_text(json.dumps({"results": {
+        "same": {"p50_ms": 1.0}, "slower": {"p50_ms": 1.0}, "faster": {"p50_ms": 2.0}}}))
+    results = {"same": {"p50_ms": 1.1}, "slower": {"p50_ms": 1.5},
+               "faster": {"p50_ms": 1.0}, "new": {"p50_ms": 9.0}}
+    assert compare(results, str(baseline), threshold=0.2) == ["slower"]
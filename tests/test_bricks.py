@@ -0,0 +1,87 @@
+# test_bricks.py
+# BrickField's layout, batched hits and cached background
+
+import pygame
+import pymunk
+import pytest
+
+from bricks import BrickField
+from settings import BLACK, SCREEN_HEIGHT, SCREEN_WIDTH
+
+
+@pytest.fixture
+def space():
+    pygame.display.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    yield pymunk.Space()
+    pygame.display.quit()
+
+
+def pixel(field, i):
+    x, y, w, h = field.rects[i].tolist()
+    return tuple(field.surface.get_at((x + w // 2, y + h // 2)))[:3]
+
+
+def test_layout(space):
+    field = BrickField(space, 3, 4, area=(0, 0, 400, 60), gap=2)
+    assert field.rects.tolist()[:2] == [[0, 0, 98, 18], [100, 0, 98, 18]]
+    assert field.rects.tolist()[4] == [0, 20, 98, 18]
+    assert len(space.shapes) == 12
+    assert field.remaining == 12
+    assert pixel(field, 5) == tuple(field.colours[5])
+
+
+def test_hits_apply_together_after_the_step(space):
+    field = BrickField(space, 2, 2, hp=2)
+    field.pending.extend([0, 0, 3])  # one brick hit twice in a step takes one hit
+    assert field.flushHits() == 0
+    assert field.hp.tolist() == [1, 2, 2, 1]
+    assert pixel(field, 0) == tuple(field.colours[0] // 2)
+    field.pending.extend([0, 3])
+    assert field.flushHits() == 2
+    assert field.remaining == 2
+    assert len(space.shapes) == 2
+    assert pixel(field, 3) == BLACK
+    # a broken brick can't be hit again
+    field.pending.append(0)
+    assert field.flushHits() == 0
+    assert field.pending == []
+
+
+def test_ball_breaks_a_brick(space):
+    field = BrickField(space, 1, 1, area=(0, 0, 100, 20), gap=0)
+    ball = pymunk.Body(1, pymunk.moment_for_circle(1, 0, 5))
+    ball.position = (50, 60)
+    ball.velocity = (0, -600)
+    shape = pymunk.Circle(ball, 5)
+    shape.collision_type = 1
+    shape.elasticity = 1.0
+    space.add(ball, shape)
+    for _ in range(20):
+        space.step(1 / 120)
+        assert field.alive[0]  # nothing changes mid-step
+        if field.pending:
+            break
+    assert field.flushHits() == 1
+    assert ball.velocity.y > 0
+
+
+def test_reset_and_remove(space):
+    field = BrickField(space, 2, 3)
+    field.pending.extend([1, 4])
+    field.flushHits()
+    field.reset()
+    assert field.alive.all() and field.remaining == 6
+    assert len(space.shapes) == 6
+    assert pixel(field, 1) == tuple(field.colours[1])
+    field.remove()
+    assert len(space.shapes) == 0
+    assert len(space.bodies) == 0
+
+
+def test_draw_is_the_background(space):
+    field = BrickField(space, 2, 2)
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    field.draw(screen)
+    assert tuple(screen.get_at((0, 0)))[:3] == BLACK
+    assert tuple(screen.get_at(tuple(field.rects[2, :2] + 1)))[:3] == tuple(field.colours[2])
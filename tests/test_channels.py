@@ -0,0 +1,99 @@
+# test_channels.py
+# A multi-channel analyzer against one mono analyzer per channel
+
+import numpy as np
+import pytest
+
+from audio_sources import BlockSource, SyntheticSource
+from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+from analysis_worker import AnalysisWorker
+
+RATE = 44100
+CHUNK = 1024
+FREQS = (220.0, 329.63)
+
+
+class StackedSource(BlockSource):
+    """One mono source per channel, side by side."""
+    def __init__(self, sources):
+        super().__init__(RATE, CHUNK, channels=len(sources), speed=0)
+        self.sources = sources
+
+    def blocks(self):
+        for blocks in zip(*(source.blocks() for source in self.sources)):
+            yield np.hstack(blocks)
+
+
+def tone(freq, seed):
+    return SyntheticSource(RATE, CHUNK, freqs=[freq], noise=0.01, speed=0, seed=seed)
+
+
+@pytest.fixture
+def analyzers():
+    """The stereo analyzer and a mono one per channel, fed the same samples."""
+    stereo = LibrosaAudioAnalyzer(StackedSource([tone(f, i) for i, f in enumerate(FREQS)]), channels=2)
+    monos = [LibrosaAudioAnalyzer(tone(f, i)) for i, f in enumerate(FREQS)]
+    everything = [stereo, *monos]
+    for analyzer in everything:
+        analyzer.setPitchMode("streaming")
+        analyzer.source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    yield everything
+    for analyzer in everything:
+        analyzer.source.close()
+
+
+def pumpAll(analyzers, blocks):
+    for analyzer in analyzers:
+        analyzer.source.pump(analyzer._audio_callback, blocks)
+
+
+def test_ring_has_a_lane_per_channel(analyzers):
+    stereo, *monos = analyzers
+    assert stereo.recording.getFlat().shape == (2, stereo.recording.windowSize)
+    for lane, mono in zip(stereo.recording.getFlat(), monos):
+        np.testing.assert_array_equal(lane, mono.recording.getFlat())
+
+
+def test_spectrum_matches_per_channel(analyzers):
+    stereo, *monos = analyzers
+    spectra = stereo.getSpectrumMagnitudes()
+    assert spectra.shape == (2, len(stereo.note_freqs))
+    for row, mono in zip(spectra, monos):
+        np.testing.assert_allclose(row, mono.getSpectrumMagnitudes(), atol=1e-6)
+
+
+@pytest.mark.parametrize("mode", ["streaming", "piptrack", "pyin"])
+def test_pitches_match_per_channel(analyzers, mode):
+    stereo, *monos = analyzers
+    for analyzer in analyzers:
+        analyzer.setPitchMode(mode)
+    for _ in range(3 if mode != "pyin" else 1):
+        pumpAll(analyzers, 1)
+        pitches, probs = stereo.getPitches()
+        assert pitches.shape == probs.shape == (2,)
+        for channel, mono in enumerate(monos):
+            (pitch,), (prob,) = mono.getPitches()
+            assert pitches[channel] == pytest.approx(pitch, rel=1e-5, nan_ok=True)
+            assert probs[channel] == pytest.approx(prob, rel=1e-5)
+    notes = stereo.pitchesToNoteIndices(pitches)
+    assert [stereo.note_names[i] for i in notes] == ["A3", "E4"]
+
+
+def test_worker_publishes_every_channel(analyzers):
+    stereo = analyzers[0]
+    snapshot = AnalysisWorker(stereo).analyzeOnce()
+    assert [snapshot.noteNames[i] for i in snapshot.noteIndices] == ["A3", "E4"]
+    assert snapshot.levels.shape == snapshot.onsets.shape == (2,)
+    # the single-channel fields follow the first channel
+    assert snapshot.noteNames[snapshot.noteIndex] == "A3"
+
+
+def test_quiet_channel_stays_unvoiced():
+    source = StackedSource([tone(440.0, 0), SyntheticSource(RATE, CHUNK, amplitude=0.0, speed=0)])
+    analyzer = LibrosaAudioAnalyzer(source, channels=2)
+    analyzer.setPitchMode("streaming")
+    source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    snapshot = AnalysisWorker(analyzer).analyzeOnce()
+    assert snapshot.noteNames[snapshot.noteIndices[0]] == "A4"
+    assert np.isnan(snapshot.pitches[1])
+    source.close()
@@ -0,0 +1,54 @@
+# test_cqt_engine.py
+# ConstantQEngine against librosa.cqt, to the tolerances its docstring gives
+
+import librosa
+import numpy as np
+import pytest
+
+from cqt_engine import ConstantQEngine
+
+SR = 44100
+N = 10240
+FMIN = librosa.note_to_hz("C2")
+N_BINS = 61
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return ConstantQEngine(SR, FMIN, N_BINS, N)
+
+
+def db(x):
+    return 20 * np.log10(x + 1e-9)
+
+
+@pytest.mark.parametrize("k", [0, 3, 10, 22, 33, 45, 57, 60])
+def test_matches_librosa(engine, k):
+    # three windows of a steady tone; librosa's frame 3 (hop N / 2) is
+    # centred on the middle window, which is the one the engine sees
+    t = np.arange(3 * N) / SR
+    x = 0.3 * np.sin(2 * np.pi * engine.freqs[k] * t + 0.3)
+    reference = np.abs(librosa.cqt(x, sr=SR, fmin=FMIN, n_bins=N_BINS, hop_length=N // 2))[:, 3]
+    magnitudes = engine.transform(x[N:2 * N])
+
+    assert np.argmax(magnitudes) == k
+    assert abs(db(magnitudes[k]) - db(reference[k])) <= 0.1
+    neighbours = slice(max(k - 2, 0), k + 3)
+    assert np.abs(db(magnitudes[neighbours]) - db(reference[neighbours])).max() <= 1.5
+
+
+@pytest.mark.parametrize("step", [2, 3, 4])
+def test_step_repeats_the_computed_bins(engine, step):
+    window = np.random.default_rng(step).standard_normal(N)
+    full = engine.transform(window)
+    coarse = engine.transform(window, step)
+    assert coarse.shape == full.shape
+    expected = np.repeat(full[::step], step)[:N_BINS]
+    np.testing.assert_allclose(coarse, expected, rtol=1e-12)
+
+
+def test_batches_match_single_windows(engine):
+    windows = np.random.default_rng(0).standard_normal((3, N))
+    batch = engine.transform(windows)
+    for window, row in zip(windows, batch):
+        np.testing.assert_allclose(row, engine.transform(window), rtol=1e-12)
@@ -0,0 +1,55 @@
+# test_dsp_process.py
+# The shared-memory ring the DSP process captures into
+
+import numpy as np
+import pytest
+from multiprocessing import resource_tracker
+
+from dsp_process import SharedCircularBuffer
+from ring_buffer import CircularBuffer
+
+CHUNK = 4
+NUM_CHUNKS = 3
+
+
+@pytest.fixture
+def owner():
+    ring = SharedCircularBuffer(CHUNK, NUM_CHUNKS, slackChunks=2)
+    yield ring
+    ring.close()
+    ring.shm.unlink()
+
+
+def test_layout_matches_the_local_ring(owner):
+    local = CircularBuffer(CHUNK, NUM_CHUNKS, slackChunks=2, dtype=owner.buffer.dtype)
+    assert owner.buffer.shape == local.buffer.shape
+    assert owner.seq == 0
+    for i in range(7):
+        chunk = np.full(CHUNK, float(i))
+        owner.add_chunk(chunk)
+        local.add_chunk(chunk)
+    np.testing.assert_array_equal(owner.getFlat(), local.getFlat())
+    assert owner.seq == local.seq == 7
+
+
+def test_attached_ring_shares_samples_and_seq(owner):
+    for i in range(4):
+        owner.add_chunk(np.full(CHUNK, float(i)))
+    # attaching, as a restarted child does, keeps the count
+    attached = SharedCircularBuffer(CHUNK, NUM_CHUNKS, slackChunks=2, name=owner.name)
+    assert attached.seq == 4
+    np.testing.assert_array_equal(attached.getFlat(), owner.getFlat())
+    attached.add_chunk(np.full(CHUNK, 9.0))
+    assert owner.seq == 5
+    assert owner.getLatest(CHUNK).tolist() == [9.0] * CHUNK
+    attached.close()
+
+
+def test_attaching_is_not_tracked(owner, monkeypatch):
+    # the creator alone unlinks the block; a tracked attach would be
+    # reported as leaked when the attaching process exits
+    registered = []
+    monkeypatch.setattr(resource_tracker, "register", lambda name, rtype: registered.append(name))
+    attached = SharedCircularBuffer(CHUNK, NUM_CHUNKS, slackChunks=2, name=owner.name)
+    attached.close()
+    assert registered == []
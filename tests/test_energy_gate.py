@@ -0,0 +1,86 @@
+# test_energy_gate.py
+# EnergyGate's levels, hysteresis and onsets
+
+import numpy as np
+import pytest
+
+from energy_gate import EnergyGate
+from settings import GATE_HOLD_CHUNKS, GATE_HYSTERESIS_DB, ONSET_DECAY_DB, ONSET_RISE_DB, SILENCE_DB
+
+CHUNK = 1024
+THRESHOLD = -50.0
+
+
+def chunk(*dbs):
+    """A (CHUNK, channels) chunk of constant samples at the given RMS dBFS."""
+    return np.tile(10 ** (np.array(dbs) / 20), (CHUNK, 1)).astype(np.float32)
+
+
+def test_levels_per_channel():
+    gate = EnergyGate(2)
+    gate.process(chunk(-20.0, -40.0), THRESHOLD)
+    np.testing.assert_allclose(gate.levels, [-20.0, -40.0], atol=1e-4)
+    gate.process(np.zeros((CHUNK, 2), dtype=np.float32), THRESHOLD)
+    assert gate.levels.tolist() == [SILENCE_DB, SILENCE_DB]
+
+
+def test_silence_stays_shut():
+    gate = EnergyGate()
+    for _ in range(10):
+        assert not gate.process(chunk(THRESHOLD - 1), THRESHOLD)
+    assert gate.onsets.tolist() == [0]
+
+
+def test_closes_only_after_the_hold():
+    gate = EnergyGate()
+    assert gate.process(chunk(-20.0), THRESHOLD)
+    # between the threshold and the hysteresis it stays open indefinitely
+    for _ in range(2 * GATE_HOLD_CHUNKS):
+        gate.process(chunk(THRESHOLD - GATE_HYSTERESIS_DB / 2), THRESHOLD)
+        assert gate.open[0]
+    # under the hysteresis it holds for GATE_HOLD_CHUNKS chunks
+    for _ in range(GATE_HOLD_CHUNKS - 1):
+        assert gate.process(chunk(SILENCE_DB), THRESHOLD)
+        assert gate.open[0]
+    # the chunk that closes it is still worth analysing, the next isn't
+    assert gate.process(chunk(SILENCE_DB), THRESHOLD)
+    assert not gate.open[0]
+    assert not gate.process(chunk(SILENCE_DB), THRESHOLD)
+
+
+def test_onsets_need_a_rise_over_the_envelope():
+    gate = EnergyGate(2)
+    gate.process(chunk(-20.0, SILENCE_DB), THRESHOLD)
+    assert gate.onsets.tolist() == [1, 0]
+    # held: no new onset
+    for _ in range(5):
+        gate.process(chunk(-20.0, SILENCE_DB), THRESHOLD)
+    assert gate.onsets.tolist() == [1, 0]
+    # a rise smaller than ONSET_RISE_DB over the envelope isn't one
+    gate.process(chunk(-20.0 + ONSET_RISE_DB - 1, SILENCE_DB), THRESHOLD)
+    assert gate.onsets.tolist() == [1, 0]
+
+
+def test_restrike_after_the_envelope_decays():
+    gate = EnergyGate()
+    gate.process(chunk(-20.0), THRESHOLD)
+    decay = int(np.ceil(ONSET_RISE_DB / ONSET_DECAY_DB)) + 1
+    for _ in range(decay):
+        gate.process(chunk(-40.0), THRESHOLD)
+    gate.process(chunk(-20.0), THRESHOLD)
+    assert gate.onsets.tolist() == [2]
+
+
+def test_results_are_swapped_not_written():
+    gate = EnergyGate()
+    levels, onsets, isOpen = gate.levels, gate.onsets, gate.open
+    gate.process(chunk(-20.0), THRESHOLD)
+    assert levels.tolist() == [SILENCE_DB] and onsets.tolist() == [0] and not isOpen[0]
+
+
+def test_reset():
+    gate = EnergyGate(2)
+    gate.process(chunk(-20.0, -20.0), THRESHOLD)
+    gate.reset()
+    assert gate.onsets.tolist() == [0, 0]
+    assert not gate.open.any()
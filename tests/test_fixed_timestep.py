@@ -0,0 +1,61 @@
+# test_fixed_timestep.py
+# GameScreen's fixed physics step, catch-up cap and render interpolation
+
+import pygame
+import pytest
+
+from game_screen import interpolate
+from headless import HeadlessGame, ScriptedNotes
+from settings import MAX_PHYSICS_STEPS, PHYSICS_HZ
+
+
+@pytest.fixture
+def makeScene():
+    def makeScene():
+        return HeadlessGame(ScriptedNotes([])).scene
+    yield makeScene
+    pygame.quit()
+
+
+def ballPosition(scene):
+    return tuple(scene.ball.body.position)
+
+
+def test_interpolate():
+    assert interpolate((0, 10), (4, 30), 0.25) == (1, 15)
+    assert interpolate((0, 10), (4, 30), 1.0) == (4, 30)
+
+
+def test_time_accumulates_until_a_whole_step(makeScene):
+    scene = makeScene()
+    start = ballPosition(scene)
+    scene.update(0.5 / PHYSICS_HZ)
+    assert ballPosition(scene) == start
+    assert scene.alpha == pytest.approx(0.5)
+    scene.update(0.5 / PHYSICS_HZ)
+    assert ballPosition(scene) != start
+    assert scene.ball.prevPosition == start
+    assert scene.alpha == pytest.approx(0.0, abs=1e-9)
+
+
+def test_frame_rate_does_not_change_the_simulation(makeScene):
+    # a second at 30 fps and at 120 fps takes the same 120 steps
+    slow = makeScene()
+    for _ in range(30):
+        slow.update(1 / 30)
+    fast = makeScene()
+    for _ in range(120):
+        fast.update(1 / 120)
+    assert ballPosition(slow) == pytest.approx(ballPosition(fast))
+    assert slow.score == fast.score
+
+
+def test_a_stall_is_capped_and_dropped(makeScene):
+    scene = makeScene()
+    start = ballPosition(scene)
+    scene.update(1.0)
+    vx, vy = scene.ball.body.velocity
+    # nothing in the way yet: the ball flew MAX_PHYSICS_STEPS steps, no more
+    assert ballPosition(scene)[0] - start[0] == pytest.approx(vx * MAX_PHYSICS_STEPS / PHYSICS_HZ)
+    assert scene.droppedTime + scene.accumulator == pytest.approx(1.0 - MAX_PHYSICS_STEPS / PHYSICS_HZ)
+    assert 0.0 <= scene.alpha < 1.0
@@ -0,0 +1,145 @@
+# test_frame_profiler.py
+# FrameProfiler's per-scene stage timing, spans and captures
+
+import os
+import threading
+import time
+
+import pytest
+
+import frame_profiler
+from frame_profiler import NULL_SPAN, FrameProfiler, StackSampler, profiled
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(frame_profiler.time, "perf_counter", clock)
+    return clock
+
+
+def frame(profiler, clock, **stages):
+    """One frame whose stages take the given ms, in order."""
+    for stage, ms in stages.items():
+        clock.now += ms / 1e3
+        profiler.lap(stage)
+    profiler.endFrame()
+
+
+def test_disabled_records_nothing(clock):
+    profiler = FrameProfiler(capacity=10, enabled=False)
+    assert profiler.span("physics") is NULL_SPAN
+    frame(profiler, clock, update=5)
+    profiler.add("analysis", 1.0)
+    assert profiler.frames == 0
+    assert profiler.names == []
+
+
+def test_laps_per_scene_and_stage(clock):
+    profiler = FrameProfiler(capacity=10, enabled=True)
+    for ms in (1, 2, 3):
+        frame(profiler, clock, events=ms, update=10 * ms)
+    profiler.scene = "game"
+    frame(profiler, clock, update=7)
+    stats = profiler.percentiles()
+    assert sorted(stats) == ["game.update", "title.events", "title.update"]
+    assert stats["title.update"][0] == pytest.approx(20.0)
+    assert stats["title.events"][2] == pytest.approx(3.0, rel=0.01)
+    # a stage only counts the frames it ran in
+    assert stats["game.update"] == pytest.approx((7.0, 7.0, 7.0))
+    assert profiler.laps == [True, True, True]
+
+
+def test_spans_add_up_within_a_frame(clock):
+    profiler = FrameProfiler(capacity=10, enabled=True)
+    for _ in range(2):
+        with profiler.span("physics"):
+            clock.now += 0.002
+    profiler.add("analysis", 0.004)  # e.g. from the worker thread
+    profiler.endFrame()
+    stats = profiler.percentiles()
+    assert stats["title.physics"][0] == pytest.approx(4.0)
+    assert stats["title.analysis"][0] == pytest.approx(4.0)
+    assert profiler.laps == [False, False]
+
+
+def test_ring_keeps_the_last_frames(clock):
+    profiler = FrameProfiler(capacity=4, enabled=True)
+    for ms in (100, 100, 1, 1, 1, 1):
+        frame(profiler, clock, update=ms)
+    assert profiler.percentiles()["title.update"] == pytest.approx((1.0, 1.0, 1.0))
+
+
+def test_stage_count_is_capped(clock, monkeypatch):
+    monkeypatch.setattr(frame_profiler, "PROFILE_MAX_STAGES", 2)
+    profiler = FrameProfiler(capacity=4, enabled=True)
+    frame(profiler, clock, a=1, b=1, c=1)
+    assert profiler.names == ["title.a", "title.b"]
+
+
+def test_enabling_starts_a_fresh_lap(clock):
+    profiler = FrameProfiler(capacity=4, enabled=False)
+    clock.now += 5.0
+    profiler.setEnabled(True)
+    frame(profiler, clock, update=2)
+    assert profiler.percentiles()["title.update"][0] == pytest.approx(2.0)
+
+
+def test_profiled_decorator(clock):
+    class Analyzer:
+        profiler = None
+
+        @profiled("pitch")
+        def getPitch(self):
+            clock.now += 0.003
+            return 440.0
+
+    analyzer = Analyzer()
+    assert analyzer.getPitch() == 440.0
+    analyzer.profiler = FrameProfiler(capacity=4, enabled=True)
+    assert analyzer.getPitch() == 440.0
+    analyzer.profiler.endFrame()
+    assert analyzer.profiler.percentiles()["title.pitch"][0] == pytest.approx(3.0)
+
+
+def test_cprofile_capture_is_written(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profiler = FrameProfiler(capacity=4, enabled=False)
+    profiler.startCapture(frames=2, mode="cprofile")
+    for _ in range(2):
+        sum(range(1000))
+        profiler.endFrame()
+    assert not profiler.capturing
+    [name] = os.listdir(tmp_path / frame_profiler.PROFILE_DIR)
+    assert name.endswith(".prof")
+
+
+def test_sampler_sees_other_threads(tmp_path):
+    stop = threading.Event()
+
+    def busyLoop():
+        while not stop.is_set():
+            sum(range(100))
+
+    thread = threading.Thread(target=busyLoop, name="Busy")
+    thread.start()
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    stop.set()
+    thread.join()
+    assert sampler.samples > 0
+    assert any(stack.startswith("Busy;") and "busyLoop" in stack for stack in sampler.counts)
+    path = tmp_path / "stacks.folded"
+    sampler.write(path)
+    stack, count = path.read_text().splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
@@ -0,0 +1,62 @@
+# test_headless.py
+# The headless runner: scripted notes and deterministic sessions
+
+import numpy as np
+import pytest
+
+from headless import ScriptedNotes, runSession, runSessions
+
+RESULT_KEYS = ("simSeconds", "ticks", "gameOver", "lives", "score", "bricksLeft")
+
+
+def test_scripted_notes_follow_the_script():
+    notes = ScriptedNotes([(0.0, 3), (1.0, None), (2.0, 7)])
+    notes.advance(0.5)
+    assert notes.snapshot.noteIndex == 3
+    assert notes.snapshot.seq == 1
+    onsets = notes.snapshot.onsets.copy()
+    notes.advance(0.9)
+    assert notes.snapshot.seq == 1  # nothing new
+    notes.advance(1.5)
+    assert np.isnan(notes.snapshot.pitches).all()
+    assert notes.snapshot.noteIndex == 3  # silence holds the last note
+    notes.advance(2.0)
+    assert notes.snapshot.noteIndices.tolist() == [7]
+    assert notes.snapshot.onsets[0] == onsets[0] + 1
+
+
+def test_random_script_is_seeded():
+    a, b, c = ScriptedNotes.random(10, seed=1), ScriptedNotes.random(10, seed=1), ScriptedNotes.random(10, seed=2)
+    assert a.notes == b.notes
+    assert a.notes != c.notes
+    assert a.times.tolist() == np.arange(0.0, 10, 0.5).tolist()
+
+
+def test_same_seed_same_game():
+    first, second = (runSession(duration=20.0, seed=3, lives=100) for _ in range(2))
+    assert [first[k] for k in RESULT_KEYS] == [second[k] for k in RESULT_KEYS]
+    assert first["ticks"] == 1200
+    assert first["score"] > 0
+
+
+def test_pool_matches_in_process():
+    sessions = [dict(duration=5.0, seed=seed) for seed in range(2)]
+    inProcess = runSessions(sessions, processes=1)
+    pooled = runSessions(sessions, processes=2)
+    for a, b in zip(inProcess, pooled):
+        assert [a[k] for k in RESULT_KEYS] == [b[k] for k in RESULT_KEYS]
+
+
+def test_game_over_ends_the_session():
+    # the paddle parked at the left edge misses the ball
+    result = runSession(script=[(0.0, 0)], duration=120.0, lives=1)
+    assert result["gameOver"]
+    assert result["lives"] == 0
+    assert result["simSeconds"] < 120.0
+
+
+def test_frames_are_saved(tmp_path):
+    result = runSession(duration=1.0, frameEvery=20, framesDir=str(tmp_path))
+    assert result["framesDrawn"] == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "frame_000020.png", "frame_000040.png", "frame_000060.png"]
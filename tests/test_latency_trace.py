@@ -0,0 +1,72 @@
+# test_latency_trace.py
+# LatencyTracer's event chain, breakdown and export
+
+import csv
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from audio_sources import BlockTime
+from latency_trace import LatencyTracer, STAGES
+
+Snapshot = namedtuple("Snapshot", ["seq", "analysisStart", "time"])
+
+
+def trace(tracer, seq):
+    """One chunk captured, analysed, applied and flipped."""
+    tracer.markCapture(seq - 1, 1024, 44100, None)
+    start = time.perf_counter()
+    tracer.markApplied(Snapshot(seq, start, start + 0.001))
+    tracer.markFlip()
+
+
+def test_one_event_per_applied_result():
+    tracer = LatencyTracer()
+    for seq in range(1, 4):
+        trace(tracer, seq)
+    assert [event.seq for event in tracer.events] == [1, 2, 3]
+    assert [event.frame for event in tracer.events] == [0, 1, 2]
+
+
+def test_old_or_untraced_results_are_ignored():
+    tracer = LatencyTracer()
+    trace(tracer, 2)
+    # the same result again, and one captured before the tracer existed
+    tracer.markApplied(Snapshot(2, 0.0, 0.0))
+    tracer.markApplied(Snapshot(5, 0.0, 0.0))
+    tracer.markFlip()
+    assert len(tracer.events) == 1
+
+
+def test_capture_time_from_the_stream_clock():
+    tracer = LatencyTracer()
+    before = time.perf_counter()
+    tracer.markCapture(0, 1024, 44100, BlockTime(inputBufferAdcTime=1.0, currentTime=1.5, outputBufferDacTime=0.0))
+    assert tracer.captureTimes[0] == pytest.approx(before - 0.5, abs=0.01)
+
+
+def test_breakdown_stages_add_up():
+    tracer = LatencyTracer()
+    for seq in range(1, 6):
+        trace(tracer, seq)
+    stages = tracer.breakdown()
+    parts = sum(stages[name] for name, _, _ in STAGES if name != "total")
+    np.testing.assert_allclose(parts, stages["total"])
+    assert np.all(stages["total"] >= 0)
+    assert set(tracer.summary()) == {name for name, _, _ in STAGES}
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".json"])
+def test_export(tmp_path, suffix):
+    tracer = LatencyTracer()
+    for seq in range(1, 4):
+        trace(tracer, seq)
+    path = str(tmp_path / f"trace{suffix}")
+    assert tracer.export(path) == 3
+    with open(path) as f:
+        rows = list(csv.DictReader(f)) if suffix == ".csv" else json.load(f)["events"]
+    assert len(rows) == 3
+    assert "total_ms" in rows[0]
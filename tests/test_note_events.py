@@ -0,0 +1,69 @@
+# test_note_events.py
+# NoteEventTracker's note on / off / pitch change events
+
+from collections import namedtuple
+
+import numpy as np
+
+from note_events import NOTE_OFF, NOTE_ON, PITCH_CHANGE, NoteEventTracker
+
+Snapshot = namedtuple("Snapshot", "seq pitches voicedProbs noteIndices onsets")
+
+
+class Script:
+    """Snapshots with a new seq each; None is a quiet channel."""
+    def __init__(self):
+        self.seq = 0
+
+    def __call__(self, notes, onsets):
+        self.seq += 1
+        pitches = np.array([np.nan if n is None else 110.0 * 2 ** (n / 12) for n in notes])
+        return Snapshot(self.seq, pitches, np.where(np.isnan(pitches), 0.0, 0.9),
+                        np.array([-1 if n is None else n for n in notes]), np.array(onsets))
+
+
+def described(events):
+    return [(e.type, e.channel, e.noteIndex) for e in events]
+
+
+def test_on_change_off():
+    tracker = NoteEventTracker()
+    snap = Script()
+    assert tracker.update(snap([None], [0])) == []
+    assert described(tracker.update(snap([5], [1]))) == [(NOTE_ON, 0, 5)]
+    events = tracker.update(snap([7], [1]))
+    assert described(events) == [(PITCH_CHANGE, 0, 7)]
+    assert events[0].previous == 5
+    assert events[0].voicedProb == 0.9
+    assert described(tracker.update(snap([None], [1]))) == [(NOTE_OFF, 0, 7)]
+
+
+def test_same_snapshot_is_ignored():
+    tracker = NoteEventTracker()
+    snapshot = Script()([5], [1])
+    assert len(tracker.update(snapshot)) == 1
+    assert tracker.update(snapshot) == []
+
+
+def test_restruck_note_ends_and_starts_again():
+    tracker = NoteEventTracker()
+    snap = Script()
+    tracker.update(snap([5], [1]))
+    assert tracker.update(snap([5], [1])) == []
+    assert described(tracker.update(snap([5], [2]))) == [(NOTE_OFF, 0, 5), (NOTE_ON, 0, 5)]
+
+
+def test_channels_are_independent():
+    tracker = NoteEventTracker()
+    snap = Script()
+    assert described(tracker.update(snap([3, None], [1, 0]))) == [(NOTE_ON, 0, 3)]
+    assert described(tracker.update(snap([3, 9], [1, 1]))) == [(NOTE_ON, 1, 9)]
+    assert described(tracker.update(snap([None, 9], [1, 1]))) == [(NOTE_OFF, 0, 3)]
+
+
+def test_events_are_posted():
+    posted = []
+    tracker = NoteEventTracker(post=posted.append)
+    events = tracker.update(Script()([4], [1]))
+    assert posted == events
+    assert posted[0].snapshot.seq == 1
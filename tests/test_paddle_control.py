@@ -0,0 +1,69 @@
+# test_paddle_control.py
+# Scripted notes played through HeadlessGame move the paddle to their column
+
+import pygame
+import pytest
+
+import game_screen
+from headless import HeadlessGame, ScriptedNotes
+from note_events import NoteEventTracker
+from settings import FPS, SCREEN_WIDTH
+
+# (time, noteIndex): a note each half second, with a rest
+SCRIPT = [(0.0, 0), (0.5, 6), (1.0, 9), (1.5, None), (2.0, 3), (2.5, 15)]
+
+
+def column(note):
+    # one lane: noteIndex % 12 across the screen
+    return SCREEN_WIDTH * (note % 12) / 12
+
+
+def play(filtered, monkeypatch):
+    """Paddle x at the end of every scripted note, and the tracer's events."""
+    monkeypatch.setattr(game_screen, "PADDLE_FILTER", filtered)
+    notes = ScriptedNotes(SCRIPT)
+    game = HeadlessGame(notes)
+    scene = game.scene
+    assert (scene.controller is not None) == filtered
+    tracker = NoteEventTracker()
+    xs = []
+    dt = 1.0 / FPS
+    for tick in range(3 * FPS):
+        simTime = tick * dt
+        notes.advance(simTime)
+        scene.handle_events(tracker.update(notes.snapshot))
+        scene.update(dt)
+        game.latency_tracer.markFlip()
+        if tick % (FPS // 2) == FPS // 2 - 1:
+            xs.append(scene.paddle.body.position.x)
+    pygame.quit()
+    return xs, game.latency_tracer
+
+
+@pytest.mark.parametrize("filtered", [True, False])
+def test_paddle_reaches_each_note_column(filtered, monkeypatch):
+    xs, _ = play(filtered, monkeypatch)
+    # the rest holds the last note
+    expected = [column(n) for n in (0, 6, 9, 9, 3, 15)]
+    assert xs == pytest.approx(expected, abs=1e-6)
+
+
+def test_filter_drives_the_paddle_not_the_events(monkeypatch):
+    monkeypatch.setattr(game_screen, "PADDLE_FILTER", True)
+    game = HeadlessGame(ScriptedNotes(SCRIPT))
+    scene = game.scene
+    events = NoteEventTracker().update(ScriptedNotes(SCRIPT).snapshot._replace(seq=1, pitches=[0.0],
+                                                                              noteIndices=[6]))
+    scene.handle_events(events)
+    # noted for the session log, but the paddle follows the filter alone
+    assert scene.eventSeqs == (1, 1)
+    assert scene.noteIndices.tolist() == [0]
+    pygame.quit()
+
+
+@pytest.mark.parametrize("filtered", [True, False])
+def test_applied_results_are_traced(filtered, monkeypatch):
+    _, tracer = play(filtered, monkeypatch)
+    # the scripted stream has no capture times, so nothing is timed, but
+    # every note was applied once
+    assert tracer.lastSeq == len(SCRIPT)
@@ -0,0 +1,82 @@
+# test_pitch_tracker.py
+# StreamingPitchTracker on synthetic tones fed through a CircularBuffer
+
+import numpy as np
+import pytest
+
+from pitch_tracker import StreamingPitchTracker
+from ring_buffer import CircularBuffer
+
+SR = 44100
+CHUNK = 1024
+
+
+def feed(tracker, ring, signal):
+    results = []
+    for start in range(0, len(signal) - CHUNK + 1, CHUNK):
+        ring.add_chunk(signal[start:start + CHUNK])
+        results.extend(tracker.update(ring))
+    return results
+
+
+def tone(freq, seconds=0.5, amplitude=0.3):
+    t = np.arange(int(SR * seconds)) / SR
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+
+@pytest.fixture
+def tracker():
+    return StreamingPitchTracker(SR, CHUNK, 65.4, 2093.0)
+
+
+@pytest.mark.parametrize("freq", [110.0, 261.63, 440.0, 987.77])
+def test_tracks_steady_tones(tracker, freq):
+    ring = CircularBuffer(CHUNK, 10)
+    feed(tracker, ring, tone(freq))
+    assert abs(1200 * np.log2(tracker.pitch / freq)) < 15
+    assert tracker.voicedProb > 0.5
+
+
+def test_silence_is_unvoiced(tracker):
+    ring = CircularBuffer(CHUNK, 10)
+    feed(tracker, ring, np.zeros(SR // 2))
+    assert np.isnan(tracker.pitch)
+
+
+def test_one_result_per_new_chunk(tracker):
+    ring = CircularBuffer(CHUNK, 10)
+    results = feed(tracker, ring, tone(440.0, seconds=10 * CHUNK / SR))
+    assert [seq for seq, _, _ in results] == list(range(1, 11))
+    assert tracker.update(ring) == []
+
+
+def test_skips_chunks_the_ring_no_longer_holds(tracker):
+    ring = CircularBuffer(CHUNK, 10)
+    feed(tracker, ring, tone(440.0, seconds=2 * CHUNK / SR))
+    signal = tone(440.0, seconds=12 * CHUNK / SR)
+    for start in range(0, len(signal) - CHUNK + 1, CHUNK):
+        ring.add_chunk(signal[start:start + CHUNK])
+    results = tracker.update(ring)
+    assert len(results) == ring.slackChunks + 1
+    assert tracker.skipped == 12 - len(results)
+
+
+def test_requested_reset_happens_on_the_next_update(tracker):
+    ring = CircularBuffer(CHUNK, 10)
+    feed(tracker, ring, tone(440.0))
+    tracker.requestReset()
+    assert not np.isnan(tracker.pitch)
+    tracker.update(ring)
+    assert tracker.lastSeq == ring.seq
+    assert not tracker.resetPending
+
+
+def test_channels_are_tracked_independently():
+    tracker = StreamingPitchTracker(SR, CHUNK, 65.4, 2093.0, channels=2)
+    ring = CircularBuffer(CHUNK, 10, channels=2)
+    signal = np.stack([tone(220.0), tone(659.25)], axis=1)
+    for start in range(0, len(signal) - CHUNK + 1, CHUNK):
+        ring.add_chunk(signal[start:start + CHUNK])
+        tracker.update(ring)
+    cents = 1200 * np.log2(tracker.pitches / np.array([220.0, 659.25]))
+    assert np.all(np.abs(cents) < 15)
@@ -0,0 +1,92 @@
+# test_precision.py
+# The float32 analysis pipeline (SINGLE_PRECISION) against the float64 one.
+# Timing and memory traffic are measured by benchmark.py --only precision.
+
+import numpy as np
+import pytest
+
+from audio_sources import SyntheticSource
+from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+
+RATE = 44100
+CHUNK = 1024
+
+SIGNALS = {
+    "tone": dict(kind="tone", freqs=[440.0], noise=0.01),
+    "chord": dict(kind="chord", freqs=[261.63, 329.63, 392.0], noise=0.01),
+    "sweep": dict(kind="sweep", freqs=[80.0, 1600.0], sweepTime=2.0),
+}
+
+SPECTRUM_TOL_DB = 0.01
+PITCH_TOL_CENTS = 1.0
+
+
+def makeAnalyzer(dtype, signal="tone"):
+    # speed=0: nothing plays by itself, blocks are pumped in by the test
+    source = SyntheticSource(RATE, CHUNK, speed=0, **SIGNALS[signal])
+    analyzer = LibrosaAudioAnalyzer(source, dtype=dtype)
+    source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    return analyzer, source
+
+
+@pytest.fixture
+def single():
+    analyzer, source = makeAnalyzer(np.float32)
+    analyzer.setPitchMode("streaming")
+    yield analyzer
+    source.close()
+
+
+def test_ring_is_float32(single):
+    assert single.dtype == np.float32
+    assert single.recording.getFlat().dtype == np.float32
+    assert single.recording.getLatest(CHUNK).dtype == np.float32
+
+
+def test_cqt_stays_single(single):
+    wav = single.recording.getFlat()
+    assert single.cqt.kernels.dtype == np.complex64
+    assert single.cqt.transform(wav).dtype == np.float32
+    assert single.getSpectrumMagnitudes(wav).dtype == np.float32
+
+
+def test_tracker_stays_single(single):
+    tracker = single.pitchTracker
+    assert tracker.state.dtype == np.float32
+    single.getPitches()
+    assert tracker.state.dtype == np.float32
+    frames = np.atleast_2d(single.recording.getLatest(tracker.frameLength))
+    freqs, probs = tracker._candidates(frames)
+    assert np.result_type(freqs, probs) == np.float32
+
+
+@pytest.mark.parametrize("signal", sorted(SIGNALS))
+def test_float32_matches_float64(signal):
+    (double, doubleSource), (single, singleSource) = pair = [
+        makeAnalyzer(dtype, signal) for dtype in (np.float64, np.float32)]
+    for analyzer, _ in pair:
+        analyzer.setPitchMode("streaming")
+
+    # 1. Spectrum and streaming pitch, chunk by chunk
+    for _ in range(40):
+        doubleSource.pump(double._audio_callback, 1)
+        singleSource.pump(single._audio_callback, 1)
+        np.testing.assert_allclose(single.getSpectrumMagnitudes(), double.getSpectrumMagnitudes(),
+                                   rtol=0, atol=SPECTRUM_TOL_DB)
+        (p64,), _ = double.getPitches()
+        (p32,), _ = single.getPitches()
+        assert np.isnan(p64) == np.isnan(p32)
+        if not np.isnan(p64):
+            assert abs(1200 * np.log2(p32 / p64)) <= PITCH_TOL_CENTS
+
+    # 2. pyin over the whole window
+    for analyzer, _ in pair:
+        analyzer.setPitchMode("pyin")
+    p64, _ = double.getPitch()
+    p32, _ = single.getPitch()
+    assert np.isnan(p64) == np.isnan(p32)
+    if not np.isnan(p64):
+        assert abs(1200 * np.log2(p32 / p64)) <= PITCH_TOL_CENTS
+
+    doubleSource.close()
+    singleSource.close()
@@ -0,0 +1,131 @@
+# test_quality_scheduler.py
+# QualityScheduler stepping down under load and back up with headroom
+
+import pytest
+
+import quality_scheduler
+from audio_sources import SyntheticSource
+from audio_analyzerLibrosa import LibrosaAudioAnalyzer
+from analysis_worker import AnalysisWorker
+from quality_scheduler import QualityScheduler
+from settings import (ANALYSIS_RATE, FPS, QUALITY_CHECK_INTERVAL, QUALITY_DOWN_DELAY, QUALITY_TIERS,
+                      QUALITY_UP_DELAY)
+
+BUDGET = 1.0 / FPS
+
+
+class Clock:
+    """perf_counter for the scheduler, a frame at a time."""
+    def __init__(self):
+        self.frames = 0
+
+    def __call__(self):
+        return self.frames / FPS
+
+
+class FakeAnalyzer:
+    def setQuality(self, pitchModeCap=None, windowChunks=None, spectrumStep=1):
+        self.quality = (pitchModeCap, windowChunks, spectrumStep)
+
+
+class FakeWorker:
+    def __init__(self):
+        self.busyTime = 0.0
+        self.rate = None
+
+    def setRate(self, rate):
+        self.rate = rate
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(quality_scheduler.time, "perf_counter", clock)
+    return clock
+
+
+def playUntilChange(scheduler, clock, frameTime, analysisShare=0.0, limit=120.0):
+    """
+    Frames at FPS, each taking frameTime with the worker that busy, until the
+    tier changes. Returns the seconds that took.
+    """
+    tier = scheduler.tier
+    for frame in range(1, int(limit * FPS)):
+        clock.frames += 1
+        scheduler.worker.busyTime += analysisShare / FPS
+        scheduler.markFrame(frameTime)
+        if scheduler.tier != tier:
+            return frame / FPS
+    return None
+
+
+def test_starts_at_the_best_tier(clock):
+    analyzer, worker = FakeAnalyzer(), FakeWorker()
+    scheduler = QualityScheduler(analyzer, worker)
+    best = QUALITY_TIERS[0]
+    assert scheduler.tier == 0
+    assert analyzer.quality == (best["pitchMode"], best["windowChunks"], best["spectrumStep"])
+    assert worker.rate == best["rate"]
+
+
+def test_slow_frames_step_down_one_tier_at_a_time(clock):
+    scheduler = QualityScheduler(FakeAnalyzer(), FakeWorker())
+    for tier in range(1, len(QUALITY_TIERS)):
+        seconds = playUntilChange(scheduler, clock, BUDGET)
+        assert seconds == pytest.approx(QUALITY_DOWN_DELAY, abs=QUALITY_CHECK_INTERVAL)
+        assert scheduler.tier == tier
+        assert scheduler.worker.rate == QUALITY_TIERS[tier]["rate"]
+    # nowhere further down to go
+    assert playUntilChange(scheduler, clock, BUDGET, limit=5.0) is None
+
+
+def test_busy_analysis_steps_down(clock):
+    scheduler = QualityScheduler(FakeAnalyzer(), FakeWorker())
+    assert playUntilChange(scheduler, clock, 0.1 * BUDGET, analysisShare=1.0) <= 1.0
+    assert scheduler.tier == 1
+    assert scheduler.getStats()["analysisUsage"] == pytest.approx(1.0)
+
+
+def test_light_load_stays_put(clock):
+    scheduler = QualityScheduler(FakeAnalyzer(), FakeWorker())
+    assert playUntilChange(scheduler, clock, 0.5 * BUDGET, analysisShare=0.2, limit=5.0) is None
+
+
+def test_headroom_steps_back_up(clock):
+    scheduler = QualityScheduler(FakeAnalyzer(), FakeWorker())
+    playUntilChange(scheduler, clock, BUDGET)
+    seconds = playUntilChange(scheduler, clock, 0.1 * BUDGET)
+    assert seconds == pytest.approx(QUALITY_UP_DELAY, abs=QUALITY_CHECK_INTERVAL)
+    assert scheduler.tier == 0
+
+
+def test_failed_step_up_doubles_the_delay(clock):
+    scheduler = QualityScheduler(FakeAnalyzer(), FakeWorker())
+    playUntilChange(scheduler, clock, BUDGET)
+    playUntilChange(scheduler, clock, 0.1 * BUDGET)
+    # the tier it went back up to is still too slow
+    playUntilChange(scheduler, clock, BUDGET)
+    assert scheduler.upDelay == 2 * QUALITY_UP_DELAY
+    seconds = playUntilChange(scheduler, clock, 0.1 * BUDGET)
+    assert seconds == pytest.approx(2 * QUALITY_UP_DELAY, abs=QUALITY_CHECK_INTERVAL)
+
+
+def test_default_pitch_mode_fits_the_best_tier(clock):
+    # the full tier at ANALYSIS_RATE with real passes of the default pitch
+    # mode must not read as overloaded
+    source = SyntheticSource(44100, 1024, speed=0, freqs=[440.0], noise=0.01)
+    analyzer = LibrosaAudioAnalyzer(source)
+    analyzer.spectrumWanted = True
+    analyzer.warmUp()
+    worker = AnalysisWorker(analyzer)
+    scheduler = QualityScheduler(analyzer, worker)
+    source.pump(analyzer._audio_callback, analyzer.recording.numChunks)
+    for frame in range(2 * FPS):
+        clock.frames += 1
+        if frame % (FPS // ANALYSIS_RATE) == 0:
+            source.pump(analyzer._audio_callback, 2)
+            worker.analyzeOnce()
+        scheduler.markFrame(0.1 * BUDGET)
+    assert scheduler.tier == 0
+    assert scheduler.analysisUsage < 0.5
+    source.close()
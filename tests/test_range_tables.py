@@ -0,0 +1,130 @@
+# test_range_tables.py
+# Per-range tables: the bounded on-disk cache and the in-memory ConfigCache
+
+import os
+
+import numpy as np
+import pytest
+
+from cqt_engine import ConstantQEngine
+from pitch_tracker import StreamingPitchTracker
+from range_tables import AnalysisConfig, ConfigCache, loadRangeTables, pruneCacheDir, tablesPath
+
+RATE = 44100
+WINDOW = 4096
+# one octave each, so building is quick
+RANGES = [(60 + 12 * i, 72 + 12 * i) for i in range(4)]
+
+
+def cachedRanges(cacheDir):
+    return {r for r in RANGES if os.path.exists(tablesPath(*r, RATE, WINDOW, cacheDir))}
+
+
+def test_second_load_comes_from_disk(tmp_path):
+    built = loadRangeTables(60, 72, RATE, WINDOW, str(tmp_path))
+    assert cachedRanges(str(tmp_path)) == {(60, 72)}
+    loaded = loadRangeTables(60, 72, RATE, WINDOW, str(tmp_path))
+    assert set(loaded) == set(built)
+    for key in built:
+        np.testing.assert_array_equal(loaded[key], built[key])
+
+
+def test_directory_stays_under_its_budget(tmp_path):
+    cacheDir = str(tmp_path)
+    loadRangeTables(*RANGES[0], RATE, WINDOW, cacheDir)
+    size = os.path.getsize(tablesPath(*RANGES[0], RATE, WINDOW, cacheDir))
+    budget = int(2.5 * size)
+    for r in RANGES:
+        loadRangeTables(*r, RATE, WINDOW, cacheDir, maxBytes=budget)
+    assert cachedRanges(cacheDir) == set(RANGES[-2:])
+    total = sum(entry.stat().st_size for entry in os.scandir(cacheDir))
+    assert total <= budget
+
+
+def test_loading_marks_a_file_recently_used(tmp_path):
+    cacheDir = str(tmp_path)
+    for r in RANGES[:2]:
+        loadRangeTables(*r, RATE, WINDOW, cacheDir)
+    size = os.path.getsize(tablesPath(*RANGES[0], RATE, WINDOW, cacheDir))
+    # the oldest file is used again, so the other one is the one to go
+    loadRangeTables(*RANGES[0], RATE, WINDOW, cacheDir)
+    loadRangeTables(*RANGES[2], RATE, WINDOW, cacheDir, maxBytes=int(2.5 * size))
+    assert cachedRanges(cacheDir) == {RANGES[0], RANGES[2]}
+
+
+def test_prune_keeps_the_newest_file_and_ignores_others(tmp_path):
+    cacheDir = str(tmp_path)
+    loadRangeTables(*RANGES[0], RATE, WINDOW, cacheDir)
+    (tmp_path / "notes.txt").write_text("not a cache file")
+    assert pruneCacheDir(cacheDir, maxBytes=1) == 0
+    assert cachedRanges(cacheDir) == {RANGES[0]}
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_missing_directory_is_not_fatal(tmp_path):
+    assert pruneCacheDir(str(tmp_path / "missing")) == 0
+
+
+def makeConfig(midiMin, midiMax, cacheDir):
+    tables = loadRangeTables(midiMin, midiMax, RATE, WINDOW, cacheDir)
+    freqs = tables["note_freqs"]
+    cqt = ConstantQEngine(RATE, freqs[0], len(freqs), WINDOW, kernels=tables["cqt_kernels"])
+    tracker = StreamingPitchTracker(RATE, 1024, freqs[0], freqs[-1])
+    return AnalysisConfig(str(midiMin), str(midiMax), midiMin, midiMax, freqs[0], tables, cqt, tracker)
+
+
+@pytest.fixture
+def configs(tmp_path):
+    return {r: makeConfig(*r, str(tmp_path)) for r in RANGES}
+
+
+def test_config_cache_hits_and_misses(configs):
+    cache = ConfigCache()
+    builds = []
+
+    def build(r):
+        builds.append(r)
+        return configs[r]
+
+    for r in [RANGES[0], RANGES[1], RANGES[0], RANGES[0]]:
+        assert cache.get(r, lambda: build(r)) is configs[r]
+    assert builds == RANGES[:2]
+    stats = cache.getStats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+
+
+def test_config_cache_evicts_least_recently_used(configs):
+    size = configs[RANGES[0]].nbytes()
+    cache = ConfigCache(maxBytes=int(2.5 * size))
+    cache.get(RANGES[0], lambda: configs[RANGES[0]])
+    cache.get(RANGES[1], lambda: configs[RANGES[1]])
+    cache.get(RANGES[0], lambda: configs[RANGES[0]])
+    cache.get(RANGES[2], lambda: configs[RANGES[2]])
+    assert list(cache.entries) == [RANGES[0], RANGES[2]]
+    assert cache.evictions == 1
+    assert cache.bytes <= cache.maxBytes
+
+
+def test_config_cache_keeps_one_entry_over_budget(configs):
+    cache = ConfigCache(maxBytes=1)
+    cache.get(RANGES[0], lambda: configs[RANGES[0]])
+    assert list(cache.entries) == [RANGES[0]]
+    cache.get(RANGES[1], lambda: configs[RANGES[1]])
+    assert list(cache.entries) == [RANGES[1]]
+
+
+def test_config_cache_bytes_follow_decimated_banks(configs):
+    cache = ConfigCache()
+    for r in RANGES[:3]:
+        cache.get(r, lambda: configs[r])
+    before = cache.bytes
+    # a spectrumStep builds a decimated bank inside a cached engine
+    configs[RANGES[1]].cqt.transform(np.zeros(WINDOW), 2)
+    assert cache.bytes == sum(config.nbytes() for config in cache.entries.values())
+    assert cache.bytes > before
+
+    # the budget counts the grown entry; a hit is enough to enforce it
+    cache.maxBytes = cache.bytes - 1
+    cache.get(RANGES[2], lambda: configs[RANGES[2]])
+    assert list(cache.entries) == RANGES[1:3]
+    assert 0 < cache.bytes == sum(config.nbytes() for config in cache.entries.values()) <= cache.maxBytes
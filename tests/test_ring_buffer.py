@@ -0,0 +1,92 @@
+# test_ring_buffer.py
+# CircularBuffer's zero-copy views and seq / isIntact protocol
+
+import numpy as np
+import pytest
+
+from ring_buffer import CircularBuffer
+
+CHUNK = 4
+NUM_CHUNKS = 3
+SLACK = 2
+
+
+def chunk(i, channels=1):
+    # every sample of chunk i is i, so a view shows which chunks it holds
+    block = np.full(CHUNK, float(i))
+    return block if channels == 1 else np.tile(block[:, None], (1, channels)) * (1 + np.arange(channels))
+
+
+@pytest.fixture
+def ring():
+    return CircularBuffer(CHUNK, NUM_CHUNKS, slackChunks=SLACK)
+
+
+def test_latest_window_in_order_across_wraps(ring):
+    for i in range(25):
+        ring.add_chunk(chunk(i))
+        newest = np.arange(max(0, i + 1 - NUM_CHUNKS), i + 1)
+        window = ring.getFlat()
+        np.testing.assert_array_equal(window[-len(newest) * CHUNK:], np.repeat(newest, CHUNK))
+        np.testing.assert_array_equal(ring.getLatest(CHUNK), np.full(CHUNK, i))
+    assert ring.seq == 25
+    assert ring.full
+
+
+def test_views_are_read_only_and_zero_copy(ring):
+    for i in range(7):
+        ring.add_chunk(chunk(i))
+    view = ring.getFlat()
+    assert np.shares_memory(view, ring.buffer)
+    with pytest.raises(ValueError):
+        view[0] = 1.0
+
+
+def test_view_at_an_older_seq(ring):
+    for i in range(6):
+        ring.add_chunk(chunk(i))
+    seq, view = ring.read()
+    ring.add_chunk(chunk(6))
+    np.testing.assert_array_equal(ring.getLatest(seq=seq), view)
+    np.testing.assert_array_equal(view, np.repeat([3, 4, 5], CHUNK))
+
+
+def test_intact_until_slack_is_used_up(ring):
+    for i in range(NUM_CHUNKS):
+        ring.add_chunk(chunk(i))
+    seq, view = ring.read()
+    expected = view.copy()
+    for _ in range(SLACK - 1):
+        ring.add_chunk(chunk(99))
+        assert ring.isIntact(seq)
+        np.testing.assert_array_equal(view, expected)
+
+
+def test_torn_once_slack_chunks_are_written(ring):
+    # The next chunk goes into the view's oldest slot, and seq only counts it
+    # once it is in, so after slackChunks the view can't be trusted any more
+    for i in range(NUM_CHUNKS):
+        ring.add_chunk(chunk(i))
+    seq, view = ring.read()
+    for _ in range(SLACK):
+        ring.add_chunk(chunk(99))
+    assert not ring.isIntact(seq)
+    ring.add_chunk(chunk(99))
+    assert not ring.isIntact(seq)
+    assert (view == 99).any()
+
+
+def test_channels_get_their_own_lanes():
+    ring = CircularBuffer(CHUNK, NUM_CHUNKS, slackChunks=SLACK, channels=2)
+    for i in range(8):
+        ring.add_chunk(chunk(i, channels=2))
+    window = ring.getFlat()
+    assert window.shape == (2, NUM_CHUNKS * CHUNK)
+    np.testing.assert_array_equal(window[1], 2 * window[0])
+    np.testing.assert_array_equal(window[0], np.repeat([5, 6, 7], CHUNK))
+
+
+def test_float32_ring_keeps_its_dtype():
+    ring = CircularBuffer(CHUNK, NUM_CHUNKS, dtype=np.float32)
+    ring.add_chunk(chunk(1).astype(np.float32))
+    assert ring.getFlat().dtype == np.float32
@@ -0,0 +1,103 @@
+# test_scene_registry.py
+# SceneRegistry's on-demand builds, background preloads and transitions
+
+import threading
+
+import pytest
+
+from scene_registry import SceneRegistry
+
+
+class Factory:
+    """Counts builds, records the building thread, and can be held back."""
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.builds = 0
+        self.threads = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5.0)
+        self.builds += 1
+        self.threads.append(threading.current_thread().name)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return f"{self.name} scene {self.builds}"
+
+
+@pytest.fixture
+def factories():
+    return {name: Factory(name) for name in ("title", "game", "tuning")}
+
+
+@pytest.fixture
+def registry(factories):
+    registry = SceneRegistry()
+    registry.register("title", factories["title"], next=("game", "tuning"))
+    registry.register("game", factories["game"], next=("title",))
+    registry.register("tuning", factories["tuning"], next=("title",))
+    return registry
+
+
+def test_built_on_first_use_only(registry, factories):
+    assert "game" in registry and "credits" not in registry
+    assert registry.status("game") == "cold"
+    scene = registry["game"]
+    assert registry["game"] is scene
+    assert factories["game"].builds == 1
+    assert factories["game"].threads == ["MainThread"]
+    assert registry.status("game") == "ready"
+
+
+def test_enter_preloads_the_next_scenes(registry, factories):
+    game = factories["game"]
+    game.release.clear()
+    registry.enter("title")
+    assert registry.status("game") == "loading"
+    game.release.set()
+    assert registry.get("game") == "game scene 1"
+    registry.get("tuning")
+    assert game.threads == ["SceneLoader"]
+    assert factories["tuning"].threads == ["SceneLoader"]
+    assert factories["title"].builds == 0
+
+
+def test_preload_skips_built_and_unknown_scenes(registry, factories):
+    registry.get("game")
+    registry.preload(["game", "credits"])
+    assert registry.status("game") == "ready"
+    assert factories["game"].builds == 1
+
+
+def test_failed_preload_raises_when_asked_for():
+    registry = SceneRegistry()
+    registry.register("broken", Factory("broken", fail=True))
+    registry.preload(["broken"])
+    with pytest.raises(RuntimeError, match="broken failed"):
+        registry.get("broken")
+    assert registry.status("broken") == "cold"
+
+
+def test_discard_builds_afresh(registry, factories):
+    first = registry.get("game")
+    registry.discard("game")
+    assert registry.status("game") == "cold"
+    assert registry.get("game") != first
+    assert factories["game"].builds == 2
+
+
+def test_transitions_end_at_the_next_frame(registry):
+    registry.markFrame()
+    assert registry.transitions == []
+    registry.beginTransition("title", "game", "ready", 0.0)
+    registry.markFrame()
+    registry.markFrame()
+    [(fromName, name, seconds, how)] = registry.transitions
+    assert (fromName, name, how) == ("title", "game", "ready")
+    assert seconds > 0
+    registry.get("game")
+    stats = registry.getStats()
+    assert stats["built"] == ["game"]
+    assert stats["transitions"][0]["how"] == "ready"
@@ -0,0 +1,65 @@
+# test_session_log.py
+# SessionRecorder logs replayed through SessionReplay, and SessionLog lookups
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from headless import runSession
+from session_log import SessionLog, SessionReplay
+
+RATE = 44100
+
+
+@pytest.fixture
+def melody(tmp_path):
+    """Three seconds of notes a half second each, with gaps, as a WAV file."""
+    rng = np.random.default_rng(0)
+    t = np.arange(RATE // 2) / RATE
+    notes = []
+    for freq in (220.0, 261.63, 329.63, 392.0, 440.0, 293.66):
+        note = 0.4 * np.sin(2 * np.pi * freq * t) * np.minimum(1.0, (t[::-1]) * 20)
+        notes.append(note + 0.005 * rng.standard_normal(len(t)))
+    path = tmp_path / "melody.wav"
+    sf.write(path, np.concatenate(notes).astype(np.float32), RATE)
+    return str(path)
+
+
+def checkReplay(report, ticks):
+    assert report["ticks"] == ticks
+    assert report["analysisMismatches"] == 0
+    assert report["firstDivergentTick"] is None
+    assert report["maxBallError"] == 0.0
+    assert report["maxPaddleError"] == 0.0
+
+
+def test_recorded_audio_replays_without_divergence(melody, tmp_path):
+    directory = str(tmp_path / "session")
+    result = runSession(wav=melody, duration=3.0, recordDir=directory)
+    replay = SessionReplay(directory)
+    report = replay.run()
+    checkReplay(report, result["ticks"])
+    assert report["analyses"] > 0
+
+
+def test_scripted_session_replays_without_divergence(tmp_path):
+    directory = str(tmp_path / "session")
+    result = runSession(duration=5.0, seed=4, recordDir=directory)
+    checkReplay(SessionReplay(directory).run(), result["ticks"])
+
+
+def test_log_lookups(melody, tmp_path):
+    directory = str(tmp_path / "session")
+    runSession(wav=melody, duration=3.0, recordDir=directory)
+    log = SessionLog(directory)
+    info = log.describe()
+    assert info["rate"] == RATE and info["channels"] == 1
+    assert info["ticks"] == len(log.ticks) and info["chunks"] == len(log.audio)
+    assert log.duration > 0
+    assert log.analysisAt(-1.0) is None
+    t = float(log.analysis["time"][2] - log.start)
+    assert log.analysisAt(t)["seq"] == log.analysis["seq"][2]
+    assert log.tickAt(log.duration)["tick"] == log.ticks["tick"][-1]
+    samples = log.audioBetween(0.0, log.duration + 1.0)
+    assert samples.shape == (int(log.audio["frames"].sum()), 1)
+    assert samples.dtype == np.float32
@@ -0,0 +1,66 @@
+# test_spectrum_view.py
+# SpectrumRenderer's pixels, and that it only repaints the bars that changed
+
+import numpy as np
+import pygame
+import pytest
+
+from spectrum_view import SpectrumRenderer
+
+WIDTH = 200
+HEIGHT = 100
+FREQS = 65.4 * 2.0 ** (np.arange(25) / 12)
+
+
+@pytest.fixture
+def renderer():
+    pygame.display.init()
+    pygame.display.set_mode((WIDTH, HEIGHT))
+    yield SpectrumRenderer(WIDTH, HEIGHT, None)
+    pygame.display.quit()
+
+
+def expected(renderer, freqs, mags, minMag, maxMag):
+    """Bars drawn one by one from scratch, in bin order, so higher bins overdraw."""
+    normalized = np.clip((np.asarray(mags) - minMag) / (maxMag - minMag), 0.0, 1.0)
+    pixels = np.zeros((WIDTH, HEIGHT), dtype=np.uint32)
+    for x, level in zip(renderer.mapFreqToX(freqs), normalized):
+        top = HEIGHT - int(level * HEIGHT)
+        pixels[x:x + renderer.barWidth] = 0
+        pixels[x:x + renderer.barWidth, top:] = renderer.lut[int(level * (len(renderer.lut) - 1))]
+    return pixels
+
+
+@pytest.mark.parametrize("binsPerOctave", [12, 96])
+def test_bars_match_a_full_redraw(renderer, binsPerOctave):
+    # at 96 bins an octave bars overlap and share columns
+    freqs = 65.4 * 2.0 ** (np.arange(2 * binsPerOctave + 1) / binsPerOctave)
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        mags = rng.uniform(-60, 0, len(freqs))
+        surface = renderer.render(freqs, mags, -50, -10)
+        np.testing.assert_array_equal(pygame.surfarray.array2d(surface), expected(renderer, freqs, mags, -50, -10))
+
+
+def test_held_spectrum_repaints_nothing(renderer, monkeypatch):
+    mags = np.linspace(-60, 0, len(FREQS))
+    renderer.render(FREQS, mags, -50, -10)
+    fills = []
+    surface = renderer.surface
+    monkeypatch.setattr(renderer, "surface", type("Recorder", (), {
+        "fill": lambda self, colour, rect: fills.append(rect)})())
+    renderer.render(FREQS, mags, -50, -10)
+    assert fills == []
+    # one bar up: only that bar's new band is painted
+    mags[10] += 5
+    renderer.render(FREQS, mags, -50, -10)
+    assert len(fills) == 1
+    renderer.surface = surface
+
+
+def test_range_change_clears_old_bars(renderer):
+    renderer.render(FREQS, np.zeros(len(FREQS)), -50, -10)
+    freqs = FREQS[:13]
+    mags = np.full(len(freqs), -60.0)
+    surface = renderer.render(freqs, mags, -50, -10)
+    assert not pygame.surfarray.array2d(surface).any()
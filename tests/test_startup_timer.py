@@ -0,0 +1,27 @@
+# test_startup_timer.py
+# StartupTimer's milestones and report
+
+import threading
+
+from startup_timer import StartupTimer
+
+
+def test_marks_and_report(capsys):
+    timer = StartupTimer()
+    timer.mark("window")
+    thread = threading.Thread(target=timer.mark, args=("analyzer",), name="Loader")
+    thread.start()
+    thread.join()
+    timer.mark("title")
+    assert [(name, thread) for name, _, thread in timer.marks] == [
+        ("window", "MainThread"), ("analyzer", "Loader"), ("title", "MainThread")]
+    times = [at for _, at, _ in timer.marks]
+    assert times == sorted(times) and times[0] >= 0
+
+    timer.report()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Startup timing (ms since launch):"
+    assert [line.split()[-2] for line in lines[1:]] == ["window", "analyzer", "title"]
+    # printed once
+    timer.report()
+    assert capsys.readouterr().out == ""
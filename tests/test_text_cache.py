@@ -0,0 +1,58 @@
+# test_text_cache.py
+# The fonts and rendered text shared by every scene
+
+import pygame
+import pytest
+
+from scenes import TextCache
+
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+
+
+@pytest.fixture
+def cache():
+    pygame.font.init()
+    cache = TextCache(maxEntries=3)
+    yield cache
+    cache.clear()
+    pygame.font.quit()
+
+
+def test_fonts_load_once(cache):
+    font = cache.font(24)
+    assert cache.font(24) is font
+    assert cache.font(30) is not font
+    assert cache.getStats()["fonts"] == 2
+
+
+def test_same_text_is_the_same_surface(cache):
+    font = cache.font(24)
+    surface = cache.render("Score", font, WHITE)
+    assert cache.render("Score", font, list(WHITE)) is surface
+    assert cache.render("Score", font, RED) is not surface
+    assert cache.render("Score", font, WHITE, antialias=False) is not surface
+    stats = cache.getStats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 3, 3)
+
+
+def test_least_recently_used_text_is_evicted(cache):
+    font = cache.font(24)
+    first = cache.render("a", font, WHITE)
+    cache.render("b", font, WHITE)
+    cache.render("c", font, WHITE)
+    assert cache.render("a", font, WHITE) is first  # "b" is now the oldest
+    cache.render("d", font, WHITE)
+    assert cache.getStats()["evictions"] == 1
+    assert cache.render("a", font, WHITE) is first
+    misses = cache.misses
+    cache.render("b", font, WHITE)
+    assert cache.misses == misses + 1
+
+
+def test_uncached_text_is_not_kept(cache):
+    font = cache.font(24)
+    surface = cache.renderUncached("fps 60", font, WHITE)
+    assert surface.get_width() > 0
+    assert cache.getStats()["entries"] == 0
+    assert cache.renderUncached("fps 60", font, WHITE) is not surface